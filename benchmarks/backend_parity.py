@@ -0,0 +1,244 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(1, os.getcwd())
+
+import kernels
+from env import Volunteers_Dilemma, mix_rewards
+from env_benchmark import BASE_CONFIG, SCENARIOS
+
+
+def make_envs(
+    overrides,
+    seed,
+    ):
+    """
+    Returns the same environment with the numpy and the numba backend
+    """
+    config = dict(BASE_CONFIG, generator_seed=seed)
+    config.update(overrides)
+
+    return Volunteers_Dilemma(dict(config, backend='numpy')), Volunteers_Dilemma(dict(config, backend='numba'))
+
+
+def difference(
+    reference,
+    compiled,
+    ):
+    """
+    Largest absolute difference; nan matches nan (e.g. clearing a bank without liabilities) but no number
+    """
+    reference, compiled = np.atleast_1d(np.asarray(reference, dtype=float)), np.atleast_1d(np.asarray(compiled, dtype=float))
+    mismatched_nans = np.isnan(reference) != np.isnan(compiled)
+    if mismatched_nans.any():
+        return np.inf
+
+    both = ~np.isnan(reference)
+    return float(np.abs(reference[both] - compiled[both]).max()) if both.any() else 0.
+
+
+def check_env_parity(
+    overrides,
+    n_graphs,
+    seed,
+    ):
+    """
+    Compares clearing, net positions and final round rewards of both backends on the same graphs
+    :output errors  largest absolute difference per quantity
+    """
+    reference, compiled = make_envs(overrides, seed)
+    rng = np.random.RandomState(seed)
+
+    errors = {'clear': 0., 'net_position': 0., 'rewards': 0., 'system_value': 0.}
+
+    for _ in range(n_graphs):
+        reference.reset()
+        compiled.position           = reference.position.copy()
+        compiled.adjacency_matrix   = reference.adjacency_matrix.copy()
+
+        if reference.config['discrete']:
+            actions = {agent: int(rng.randint(reference.position[agent] + 1)) for agent in range(reference.config['n_agents'])}
+        else:
+            actions = {agent: float(rng.uniform()) for agent in range(reference.config['n_agents'])}
+
+        final_round = reference.config['number_of_negotiation_rounds']
+        reference_rewards, reference_value  = reference.compute_reward(actions, round=final_round)
+        compiled_rewards, compiled_value    = compiled.compute_reward(actions, round=final_round)
+
+        entities = range(reference.position.shape[0])
+        agents = sorted(reference_rewards)
+
+        errors['clear'] = max(errors['clear'], difference(reference.clear(), compiled.clear()))
+        errors['net_position'] = max(errors['net_position'], difference(
+            [reference.get_net_position(entity) for entity in entities],
+            [compiled.get_net_position(entity) for entity in entities],
+        ))
+        errors['rewards'] = max(errors['rewards'], difference(
+            [reference_rewards[agent] for agent in agents],
+            [compiled_rewards[agent] for agent in agents],
+        ))
+        errors['system_value'] = max(errors['system_value'], difference(reference_value, compiled_value))
+
+        # The positions are restored after computing the rewards
+        assert (reference.position == compiled.position).all()
+
+    return errors
+
+
+def check_sampling_parity(
+    n_samples,
+    rescue_amount,
+    seed,
+    ):
+    """
+    Compares the compiled position sampler against the interpreted kernel, which draws from numpy's random state
+    The random states differ, thus the distributions rather than the draws are compared
+    :output compiled_mean           mean position drawn by the compiled kernel
+    :output interpreted_mean        mean position drawn by the interpreted kernel
+    :output standard_error          standard error of the difference of the means
+    """
+    config = BASE_CONFIG
+
+    np.random.seed(seed)
+    kernels.seed(seed)
+
+    draws = {}
+    for name, sampler in [('compiled', kernels.sample_positions_above), ('interpreted', kernels.sample_positions_above.py_func)]:
+        positions = np.array([
+            sampler(config['max_system_value'], config['n_agents'] + 1, rescue_amount, config['n_agents'])[0]
+            for _ in range(n_samples)
+        ])
+        assert (positions[:, :config['n_agents']] >= rescue_amount).all(), f'{name} sampler violates the rescue amount'
+        draws[name] = positions
+
+    standard_error = np.sqrt((draws['compiled'].var(0) + draws['interpreted'].var(0)) / n_samples)
+
+    return draws['compiled'].mean(0), draws['interpreted'].mean(0), standard_error
+
+
+def time_backends(
+    n_calls,
+    seed,
+    ):
+    """
+    Times the kernels of both backends on the volunteers dilemma
+    :output timings     microseconds per call of each method and backend
+    """
+    reference, compiled = make_envs({}, seed)
+    reference.reset()
+    compiled.position, compiled.adjacency_matrix = reference.position.copy(), reference.adjacency_matrix.copy()
+    actions = {0: 1, 1: 1}
+
+    timings = {}
+    for name, env in [('numpy', reference), ('numba', compiled)]:
+        methods = {
+            'clear':            env.clear,
+            'get_net_position': lambda: env.get_net_position(2),
+            'compute_reward':   lambda: env.compute_reward(actions, round=1),
+            'generate_scenario':lambda: env.generator.generate_scenario(env.config),
+        }
+        for method, function in methods.items():
+            function()
+            start = time.perf_counter()
+            for _ in range(n_calls):
+                function()
+            timings[f'{method}|{name}'] = (time.perf_counter() - start) / n_calls * 1e6
+
+    return timings
+
+
+def check_batched_parity(
+    overrides,
+    n_graphs,
+    seed,
+    ):
+    """
+    Compares the final round cleared in batches, as evaluation.GraphSet does, with stepping the environment
+    :output errors  largest absolute difference per quantity
+    """
+    env, _ = make_envs(overrides, seed)
+    rng = np.random.RandomState(seed)
+
+    positions, adjacency_matrices, transfers, rewards, system_values = [], [], [], [], []
+
+    for _ in range(n_graphs):
+        env.reset()
+        actions = {agent: rng.randint(int(env.position[agent]) + 1) for agent in range(env.config['n_agents'])}
+
+        positions.append(env.position.copy())
+        adjacency_matrices.append(env.adjacency_matrix.copy())
+        transfers.append([
+            env.position[agent] - actions[agent] if env.config.get('invert_actions') else actions[agent]
+            for agent in range(env.config['n_agents'])
+        ])
+
+        _, reward, _, info = env.step(actions)
+        rewards.append([reward[agent] for agent in range(env.config['n_agents'])])
+        system_values.append(info[0]['ending_system_value'])
+
+    change_in_position, batched_system_values = kernels.batched_final_round_changes(
+        positions, adjacency_matrices, transfers, env.distressed_node, env.config['haircut_multiplier'],
+    )
+    batched_rewards = mix_rewards(env.config, change_in_position[:, :env.config['n_agents']])
+
+    return {
+        'rewards':      difference(rewards, batched_rewards),
+        'system_value': difference(system_values, batched_system_values),
+    }
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Checks the numba backend and the batched final round against the numpy implementation')
+    parser.add_argument("--graphs",     type=int,   default=500)
+    parser.add_argument("--samples",    type=int,   default=20000)
+    parser.add_argument("--calls",      type=int,   default=2000)
+    parser.add_argument("--seed",       type=int,   default=123)
+    parser.add_argument("--tolerance",  type=float, default=1e-9)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    failures = 0
+
+    for scenario in SCENARIOS:
+        for invert_actions in [False, True]:
+            errors = check_batched_parity({'scenario': scenario, 'invert_actions': invert_actions}, args.graphs, args.seed)
+            passed = all(error <= args.tolerance for error in errors.values())
+            failures += not passed
+
+            print(
+                f'{"PASS" if passed else "FAIL"} {scenario:<28} {"batched":<10} {"inverted" if invert_actions else "":<8} '
+                + ' '.join(f'{quantity}={error:.1e}' for quantity, error in errors.items())
+            )
+
+    if not kernels.NUMBA_AVAILABLE:
+        print('numba is not installed, both backends run the numpy implementation')
+        sys.exit(1 if failures else 0)
+
+    for scenario in SCENARIOS:
+        for discrete in [True, False]:
+            errors = check_env_parity({'scenario': scenario, 'discrete': discrete}, args.graphs, args.seed)
+            passed = all(error <= args.tolerance for error in errors.values())
+            failures += not passed
+
+            print(
+                f'{"PASS" if passed else "FAIL"} {scenario:<28} {"discrete" if discrete else "continuous":<10} '
+                + ' '.join(f'{quantity}={error:.1e}' for quantity, error in errors.items())
+            )
+
+    # Sampled means must agree within 4 standard errors
+    compiled_mean, interpreted_mean, standard_error = check_sampling_parity(args.samples, BASE_CONFIG['maximum_rescue_amount'], args.seed)
+    passed = (np.abs(compiled_mean - interpreted_mean) <= 4 * standard_error + 1e-12).all()
+    failures += not passed
+    print(f'{"PASS" if passed else "FAIL"} position sampling      compiled mean {np.round(compiled_mean, 2)} interpreted mean {np.round(interpreted_mean, 2)}')
+
+    for name, microseconds in time_backends(args.calls, args.seed).items():
+        print(f'{name:<30} {microseconds:>8.2f} us')
+
+    sys.exit(1 if failures else 0)
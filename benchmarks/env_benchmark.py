@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(1, os.getcwd())
+
+from env import Volunteers_Dilemma
+
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Environment configuration matching the defaults of utils.get_args
+BASE_CONFIG = {
+    'n_agents':                     2,
+    'n_entities':                   3,
+    'max_system_value':             100,
+    'haircut_multiplier':           0.50,
+    'alpha':                        1,
+    'beta':                         0,
+    'minimum_rescue_amount':        3,
+    'maximum_rescue_amount':        7,
+    'number_of_negotiation_rounds': 1,
+    'pooled_training':              False,
+    'pool_size':                    2,
+    'discrete':                     True,
+    'scenario':                     'volunteers dilemma',
+}
+
+SCENARIOS = [
+    'volunteers dilemma',
+    'coordination game',
+    'not enough money together',
+    'not in default',
+    'only agent 0 can rescue',
+    'only agent 1 can rescue',
+    'uniformly mixed',
+]
+
+# Observation variants, benchmarked on the discrete volunteers dilemma
+OBSERVATION_VARIANTS = {
+    'full_information':             {'full_information': True},
+    'reveal_other_agents_identity': {'reveal_other_agents_identity': True},
+    'reveal_other_agents_beta':     {'reveal_other_agents_beta': True},
+    'reveal_both':                  {'reveal_other_agents_identity': True, 'reveal_other_agents_beta': True},
+}
+
+
+def benchmark_cases():
+    """
+    Enumerates the benchmarked environment configurations
+    :output cases   dictionary mapping the name of a case to its config overrides
+    """
+    cases = {}
+
+    for scenario in SCENARIOS:
+        for discrete in [True, False]:
+            for rounds in [1, 3]:
+                name = f'{scenario}|{"discrete" if discrete else "continuous"}|rounds={rounds}'
+                cases[name] = {
+                    'scenario':                     scenario,
+                    'discrete':                     discrete,
+                    'number_of_negotiation_rounds': rounds,
+                }
+
+    for variant, overrides in OBSERVATION_VARIANTS.items():
+        for rounds in [1, 3]:
+            cases[f'volunteers dilemma|discrete|rounds={rounds}|{variant}'] = dict(
+                scenario                        = 'volunteers dilemma',
+                discrete                        = True,
+                number_of_negotiation_rounds    = rounds,
+                **overrides,
+            )
+
+    return cases
+
+
+def make_env(
+    overrides,
+    seed,
+    ):
+    config = dict(BASE_CONFIG, generator_seed=seed)
+    config.update(overrides)
+    return Volunteers_Dilemma(config)
+
+
+def sample_actions(
+    env,
+    fractions,
+    ):
+    """
+    Maps pre-drawn uniform fractions onto valid actions, so action sampling costs almost nothing
+    """
+    if env.config['discrete']:
+        return {
+            agent: int(fractions[agent] * (env.position[agent] + 1))
+            for agent in range(env.config['n_agents'])
+        }
+    return {agent: float(fractions[agent]) for agent in range(env.config['n_agents'])}
+
+
+def enter_final_round(
+    env
+    ):
+    """
+    Moves the environment to the last negotiation round, so a step can be timed repeatedly
+    """
+    final_round = env.config['number_of_negotiation_rounds']
+    env.timestep = final_round - 1
+    env.negotiation.round = final_round - 1
+
+
+def time_episodes(
+    env,
+    n_episodes,
+    fractions,
+    ):
+    """
+    Runs complete episodes of reset and step calls
+    :output episodes_per_second
+    :output steps_per_second
+    """
+    steps = 0
+    start = time.perf_counter()
+
+    for episode in range(n_episodes):
+        env.reset()
+        done = {'__all__': False}
+        while not done['__all__']:
+            _, _, done, _ = env.step(sample_actions(env, fractions[steps % len(fractions)]))
+            steps += 1
+
+    elapsed = time.perf_counter() - start
+
+    return n_episodes / elapsed, steps / elapsed
+
+
+def time_call(
+    function,
+    n_calls,
+    ):
+    """
+    Returns the mean duration of a call in microseconds
+    """
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        function()
+    return (time.perf_counter() - start) / n_calls * 1e6
+
+
+def time_methods(
+    env,
+    n_calls,
+    fractions,
+    ):
+    """
+    Times the hot path methods of the environment on a freshly reset graph
+    """
+    env.reset()
+    actions = sample_actions(env, fractions[0])
+    final_round = env.config['number_of_negotiation_rounds']
+
+    def step():
+        enter_final_round(env)
+        env.step(actions)
+
+    return {
+        'reset_us':             time_call(env.reset, n_calls),
+        'step_us':              time_call(step, n_calls),
+        'clear_us':             time_call(env.clear, n_calls),
+        'compute_reward_us':    time_call(lambda: env.compute_reward(actions, round=final_round), n_calls),
+        'get_observation_us':   time_call(lambda: env.get_observation(0, reset=False, actions=actions), n_calls),
+    }
+
+
+def measure_allocations(
+    env,
+    n_steps,
+    fractions,
+    ):
+    """
+    Measures the memory allocated within a step with tracemalloc
+    :output allocated_kib_per_step  mean peak of the memory allocated during a step
+    """
+    env.reset()
+
+    tracemalloc.start()
+    peaks = []
+
+    for step in range(n_steps):
+        enter_final_round(env)
+        actions = sample_actions(env, fractions[step % len(fractions)])
+
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        env.step(actions)
+
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - current)
+
+    tracemalloc.stop()
+
+    return {
+        'allocated_kib_per_step':   float(np.mean(peaks)) / 1024,
+    }
+
+
+def run_case(
+    overrides,
+    n_episodes,
+    n_calls,
+    n_allocation_steps,
+    repeats,
+    seed,
+    ):
+    """
+    Benchmarks a single environment configuration
+    Throughput is the best of several repeats, which is the least noisy estimate
+    """
+    env = make_env(overrides, seed)
+    fractions = np.random.RandomState(seed).uniform(0, 1, size=(1024, env.config['n_agents']))
+
+    # Warm up
+    time_episodes(env, max(1, n_episodes // 10), fractions)
+
+    throughputs = [time_episodes(env, n_episodes, fractions) for _ in range(repeats)]
+    episodes_per_second, steps_per_second = max(throughputs)
+
+    result = {
+        'episodes_per_second':  episodes_per_second,
+        'steps_per_second':     steps_per_second,
+    }
+    result.update(time_methods(env, n_calls, fractions))
+    result.update(measure_allocations(env, n_allocation_steps, fractions))
+
+    return result
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit':   commit,
+        'python':   platform.python_version(),
+        'numpy':    np.__version__,
+        'machine':  platform.machine(),
+        'platform': platform.platform(),
+        'time':     time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+# Metrics where a higher value is better; for every other metric lower is better
+HIGHER_IS_BETTER = ['episodes_per_second', 'steps_per_second']
+
+
+def compare(
+    results,
+    baseline,
+    tolerance,
+    ):
+    """
+    Compares results against a baseline
+    :args   tolerance       relative change tolerated before a metric counts as regressed
+    :output regressions     list of (case, metric, baseline value, current value)
+    """
+    regressions = []
+
+    for case, metrics in results.items():
+        if case not in baseline['results']:
+            continue
+
+        for metric, value in metrics.items():
+            reference = baseline['results'][case].get(metric)
+            if reference is None or reference == 0:
+                continue
+
+            change = (value - reference) / reference
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+
+            if change > tolerance:
+                regressions.append((case, metric, reference, value))
+
+    return regressions
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Benchmarks the reset/step/clear hot path of Volunteers_Dilemma')
+    parser.add_argument("--save",               type=str,   help="store the results as benchmarks/baselines/<name>.json")
+    parser.add_argument("--compare",            type=str,   help="compare the results against benchmarks/baselines/<name>.json")
+    parser.add_argument("--filter",             type=str,   default="",     help="only run the cases containing this string")
+    parser.add_argument("--episodes",           type=int,   default=2000)
+    parser.add_argument("--calls",              type=int,   default=2000)
+    parser.add_argument("--allocation-steps",   type=int,   default=200)
+    parser.add_argument("--repeats",            type=int,   default=3)
+    parser.add_argument("--seed",               type=int,   default=123)
+    parser.add_argument("--tolerance",          type=float, default=0.20)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    cases = {name: overrides for name, overrides in benchmark_cases().items() if args.filter in name}
+
+    results = {}
+    for name, overrides in cases.items():
+        results[name] = run_case(
+            overrides,
+            n_episodes          = args.episodes,
+            n_calls             = args.calls,
+            n_allocation_steps  = args.allocation_steps,
+            repeats             = args.repeats,
+            seed                = args.seed,
+        )
+        print(
+            f'{name:<70} '
+            f'{results[name]["episodes_per_second"]:>10.1f} episodes/s '
+            f'{results[name]["step_us"]:>8.1f} us/step '
+            f'{results[name]["allocated_kib_per_step"]:>8.2f} KiB/step'
+        )
+
+    if args.save:
+        if not os.path.exists(BASELINES_DIR):
+            os.makedirs(BASELINES_DIR)
+
+        with open(f'{BASELINES_DIR}/{args.save}.json', 'w') as f:
+            json.dump({'metadata': metadata(), 'results': results}, f, indent=4)
+
+    if args.compare:
+        with open(f'{BASELINES_DIR}/{args.compare}.json') as f:
+            baseline = json.load(f)
+
+        regressions = compare(results, baseline, args.tolerance)
+
+        for case, metric, reference, value in regressions:
+            print(f'REGRESSION {case}: {metric} {reference:.2f} -> {value:.2f}')
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        print(f'No regressions against {args.compare} (tolerance {args.tolerance:.0%})')
@@ -0,0 +1,179 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(1, os.getcwd())
+
+from enumeration import scenario_distribution
+from evaluation import GraphSet
+from generator import Generator
+from env_benchmark import BASE_CONFIG, OBSERVATION_VARIANTS
+
+
+# Scenarios whose enumeration is compared with the generator, at one rescue amount each
+DISTRIBUTION_CASES = [
+    ('volunteers dilemma',          6),
+    ('coordination game',           4),
+    ('not enough money together',   5),
+    ('not in default',              0),
+    ('only agent 0 can rescue',     3),
+    ('only agent 1 can rescue',     6),
+    ('merged only agent 0 can rescue and only agent 1 can rescue', 4),
+]
+
+
+def graph_columns(
+    positions,
+    adjacency_matrices,
+    ):
+    """
+    Returns the integer positions and debts owed to the agents, which identify a graph
+    """
+    return np.stack([
+        positions[:, 0],
+        positions[:, 1],
+        positions[:, 2],
+        adjacency_matrices[:, 2, 0],
+        adjacency_matrices[:, 2, 1],
+    ], axis=1).astype(np.int64)
+
+
+def chi_squared_p_value(
+    keys,
+    probabilities,
+    sampled_keys,
+    ):
+    """
+    Tests whether the sampled keys follow the distribution of the keys
+    Keys expected less than 5 times are pooled into a single cell
+    :args   keys            (n,) keys, which may repeat, and their probabilities
+    :output p_value         p-value of the chi-squared test; nan if there are too few cells
+    """
+    from scipy.stats import chi2
+
+    keys, inverse = np.unique(keys, return_inverse=True)
+    expected = np.bincount(inverse.ravel(), weights=probabilities, minlength=len(keys)) * len(sampled_keys)
+
+    sampled, counts = np.unique(sampled_keys, return_counts=True)
+    observed = np.zeros(len(keys))
+    observed[np.searchsorted(keys, sampled)] = counts
+
+    cells = expected >= 5
+    statistic = ((observed[cells] - expected[cells])**2 / expected[cells]).sum()
+    if (~cells).any():
+        statistic += (observed[~cells].sum() - expected[~cells].sum())**2 / max(expected[~cells].sum(), 1e-12)
+
+    degrees_of_freedom = cells.sum() + (~cells).any() - 1
+    return chi2.sf(statistic, degrees_of_freedom) if degrees_of_freedom > 0 else np.nan
+
+
+def check_distribution(
+    scenario,
+    rescue_amount,
+    n_samples,
+    seed,
+    ):
+    """
+    Compares the enumerated distribution of a scenario with graphs drawn by the generator
+    The graphs must all be enumerated, and the graphs and each of their positions and debts must
+    pass chi-squared tests; the smallest p-value is Bonferroni corrected.
+    :output result  number of graphs, samples outside of the enumeration, p-value and timings
+    """
+    config = dict(BASE_CONFIG, scenario=scenario, rescue_amount=rescue_amount)
+
+    start = time.perf_counter()
+    positions, adjacency_matrices, probabilities = scenario_distribution(config, scenario, rescue_amount)
+    enumeration_seconds = time.perf_counter() - start
+
+    generator = Generator(seed=seed)
+    start = time.perf_counter()
+    samples = [generator.generate_scenario(dict(config)) for _ in range(n_samples)]
+    sampling_seconds = time.perf_counter() - start
+
+    columns = graph_columns(positions, adjacency_matrices)
+    sampled_columns = graph_columns(
+        np.array([position for position, _ in samples]),
+        np.array([adjacency_matrix for _, adjacency_matrix in samples]),
+    )
+
+    # Graphs are keyed by their columns, each below 256
+    keys, sampled_keys = columns @ 256**np.arange(5)[::-1], sampled_columns @ 256**np.arange(5)[::-1]
+    enumerated = np.isin(sampled_keys, keys)
+
+    p_values = [chi_squared_p_value(keys, probabilities, sampled_keys[enumerated])]
+    p_values += [chi_squared_p_value(columns[:, i], probabilities, sampled_columns[enumerated, i]) for i in range(columns.shape[1])]
+    p_values = [p_value for p_value in p_values if not np.isnan(p_value)]
+
+    return {
+        'graphs':               len(keys),
+        'missing':              int((~enumerated).sum()),
+        'p_value':              min(1.0, min(p_values) * len(p_values)),
+        'enumeration_seconds':  enumeration_seconds,
+        'sampling_seconds':     sampling_seconds,
+    }
+
+
+def check_observation_parity(
+    overrides,
+    n_graphs,
+    seed,
+    ):
+    """
+    Compares the batched observations of a graph set with the environment's observations of each graph
+    :output mismatches  number of (graph, seat) observations which differ
+    """
+    graphs = GraphSet(dict(BASE_CONFIG, **overrides), n_graphs, seed=seed)
+    context = {'agent_0_policy': 'policy_0', 'agent_0_beta': 0.25, 'agent_1_policy': 'policy_1', 'agent_1_beta': 0.75}
+
+    mismatches = 0
+    for seat in range(graphs.n_agents):
+        batch = graphs.observations(seat, context)
+
+        for graph in range(graphs.n_graphs):
+            graphs.load(graph, context)
+            observation = graphs.env.get_observation(seat, reset=True)
+
+            mismatches += set(observation) != set(batch) or any(
+                not np.array_equal(np.ravel(observation[feature]).astype(float), batch[feature][graph])
+                for feature in observation
+            )
+
+    return mismatches
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Checks the enumerated graph distributions of the exact evaluation against the generator')
+    parser.add_argument("--samples",    type=int,   default=50000,  help="graphs drawn from the generator per scenario")
+    parser.add_argument("--graphs",     type=int,   default=200,    help="graphs on which the batched observations are checked")
+    parser.add_argument("--seed",       type=int,   default=123)
+    parser.add_argument("--alpha",      type=float, default=1e-3,   help="significance level of the chi-squared tests")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    failures = 0
+
+    for scenario, rescue_amount in DISTRIBUTION_CASES:
+        result = check_distribution(scenario, rescue_amount, args.samples, args.seed)
+        passed = result['missing'] == 0 and result['p_value'] >= args.alpha
+        failures += not passed
+
+        print(
+            f'{"PASS" if passed else "FAIL"} {scenario[:28]:<28} rescue amount {rescue_amount} '
+            f'{result["graphs"]:>9} graphs  missing={result["missing"]}  p={result["p_value"]:.3f}  '
+            f'enumerated in {result["enumeration_seconds"]:.2f} s, {args.samples} samples in {result["sampling_seconds"]:.2f} s'
+        )
+
+    for name, overrides in dict({'default': {}}, **OBSERVATION_VARIANTS).items():
+        for scenario in ['volunteers dilemma', 'uniformly mixed']:
+            mismatches = check_observation_parity(dict(overrides, scenario=scenario), args.graphs, args.seed)
+            failures += mismatches > 0
+
+            print(f'{"PASS" if mismatches == 0 else "FAIL"} observations {name:<28} {scenario:<20} mismatches={mismatches}')
+
+    sys.exit(1 if failures else 0)
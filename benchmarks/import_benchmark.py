@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, 'data')
+
+# Modules whose import costs a substantial fraction of a second or more
+HEAVY_MODULES = ['ray', 'torch', 'tensorflow', 'pandas', 'seaborn', 'matplotlib', 'scipy', 'numba', 'prettytable']
+
+# Modules imported by the analysis and generator paths, which are expected to start fast
+FAST_MODULES = [
+    'utils',
+    'generator',
+    'negotiation',
+    'kernels',
+    'profiler',
+    'evaluation_storage',
+    'results_index',
+    'cli',
+    'experiment_statistics',
+    'render',
+    'plot_utils',
+    'cache',
+    'enumeration',
+    'policy_table',
+]
+
+# Modules of the training and evaluation paths, reported for reference
+TRAINING_MODULES = [
+    'env',
+    'custom_model',
+    'callbacks',
+    'evaluation',
+    'trainer',
+    'trainer_pooled',
+]
+
+# Run in a fresh interpreter: times the import and lists the heavy modules it loaded
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{'seconds': elapsed, 'heavy': heavy}}))
+"""
+
+
+def time_import(
+    module,
+    repeats,
+    ):
+    """
+    Imports a module in fresh interpreters
+    :output result  best import time in seconds, wall time of the process and heavy modules loaded,
+                    or the error when the module cannot be imported
+    """
+    script = IMPORT_SCRIPT.format(paths=[ROOT_DIR, DATA_DIR], module=module, heavy=HEAVY_MODULES)
+    imports, processes = [], []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', script], cwd=ROOT_DIR, capture_output=True, text=True)
+        processes.append(time.perf_counter() - start)
+
+        if completed.returncode != 0:
+            return {'error': completed.stderr.strip().splitlines()[-1]}
+
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        imports.append(result['seconds'])
+
+    return {
+        'seconds':          min(imports),
+        'process_seconds':  min(processes),
+        'heavy':            result['heavy'],
+    }
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Measures the import time of the modules of the repository')
+    parser.add_argument("--repeats",    type=int,   default=5,      help="imports per module, the best is reported")
+    parser.add_argument("--budget",     type=float, default=1.0,    help="seconds allowed for importing a module of the fast paths")
+    parser.add_argument("--training",   action="store_true",        help="also measure the modules of the training path")
+    parser.add_argument("--output",     type=str,   default=None,   help="store the results as json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    modules = FAST_MODULES + (TRAINING_MODULES if args.training else [])
+
+    results = {}
+    over_budget = []
+
+    for module in modules:
+        results[module] = time_import(module, args.repeats)
+        result = results[module]
+
+        if 'error' in result:
+            print(f'{module:<24} {"failed":>10}   {result["error"]}')
+            continue
+
+        print(
+            f'{module:<24} '
+            f'{result["seconds"]:>8.3f} s '
+            f'{result["process_seconds"]:>8.3f} s process   '
+            f'{", ".join(result["heavy"]) or "-"}'
+        )
+
+        if module in FAST_MODULES and result['seconds'] > args.budget:
+            over_budget.append(module)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    for module in over_budget:
+        print(f'OVER BUDGET {module}: {results[module]["seconds"]:.3f} s > {args.budget:.3f} s')
+
+    if len(over_budget) > 0:
+        sys.exit(1)
+
+    print(f'Every fast path module imports within {args.budget:.3f} s')
@@ -0,0 +1,126 @@
+import argparse
+import copy
+import itertools
+import os
+import sys
+import time
+
+import pandas as pd
+import ray
+from ray.tune.registry import get_trainable_cls
+
+sys.path.insert(1, os.getcwd())
+
+from trainer import get_trainable
+from utils import get_args
+
+
+def get_sweep_args():
+    """
+    Parses the sweep options; every other option is passed on to utils.get_args
+    """
+    parser = argparse.ArgumentParser(description='Sweeps the sampling layout of an experiment and reports its throughput')
+    parser.add_argument("--sweep-workers",                  type=int,   nargs='+',  default=[1, 2, 4])
+    parser.add_argument("--sweep-envs-per-worker",          type=int,   nargs='+',  default=[1, 4, 16])
+    parser.add_argument("--sweep-rollout-fragment-lengths", type=int,   nargs='+',  default=[1, 4, 16])
+    parser.add_argument("--sweep-batch-modes",              type=str,   nargs='+',  default=["truncate_episodes", "complete_episodes"])
+    parser.add_argument("--warmup-iterations",              type=int,   default=2)
+    parser.add_argument("--iterations",                     type=int,   default=5)
+    parser.add_argument("--num-cpus",                       type=int,   default=None)
+    parser.add_argument("--output",                         type=str,   default=None)
+    sweep_args, remaining = parser.parse_known_args()
+
+    # utils.get_args parses sys.argv
+    sys.argv = sys.argv[:1] + remaining
+
+    return sweep_args, get_args()
+
+
+def measure(
+    trainer,
+    warmup_iterations,
+    iterations,
+    ):
+    """
+    Trains for a few iterations and measures the sampling and learning throughput
+    :output metrics     sampled and trained timesteps per second of wall time, and RLlib's learner throughput
+    """
+    # At least one unmeasured iteration, which also gives the counters to start from
+    for _ in range(max(1, warmup_iterations)):
+        result = trainer.train()
+
+    sampled_before = result['info']['num_steps_sampled']
+    trained_before = result['info']['num_steps_trained']
+    learn_throughputs = []
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = trainer.train()
+        learn_throughputs.append(result.get('timers', {}).get('learn_throughput', float('nan')))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'sampled_timesteps_per_second': (result['info']['num_steps_sampled'] - sampled_before) / elapsed,
+        'trained_timesteps_per_second': (result['info']['num_steps_trained'] - trained_before) / elapsed,
+        'learn_throughput':             float(pd.Series(learn_throughputs).mean()),
+        'episodes_per_iteration':       result.get('episodes_this_iter'),
+    }
+
+
+if __name__ == "__main__":
+    sweep_args, args = get_sweep_args()
+
+    # Sampling is measured without evaluation rollouts
+    args.evaluate_during_training = False
+
+    if args.pooled_training:
+        from trainer_pooled import setup
+    else:
+        from trainer import setup
+
+    # A local cluster, so the workers run as separate processes as they do in training
+    ray.init(num_cpus=sweep_args.num_cpus)
+
+    trainable = get_trainable(args)
+    trainer_class = get_trainable_cls(trainable) if isinstance(trainable, str) else trainable
+    results = []
+
+    layouts = itertools.product(
+        sweep_args.sweep_workers,
+        sweep_args.sweep_envs_per_worker,
+        sweep_args.sweep_rollout_fragment_lengths,
+        sweep_args.sweep_batch_modes,
+    )
+
+    for n_workers, n_envs_per_worker, rollout_fragment_length, batch_mode in layouts:
+
+        layout_args = copy.deepcopy(args)
+        layout_args.n_workers                   = n_workers
+        layout_args.n_envs_per_worker           = n_envs_per_worker
+        layout_args.rollout_fragment_length     = rollout_fragment_length
+        layout_args.batch_mode                  = batch_mode
+
+        config, stop = setup(layout_args)
+        trainer = trainer_class(config=config)
+
+        metrics = measure(trainer, sweep_args.warmup_iterations, sweep_args.iterations)
+        trainer.stop()
+
+        results.append(dict(
+            n_workers               = n_workers,
+            n_envs_per_worker       = n_envs_per_worker,
+            rollout_fragment_length = rollout_fragment_length,
+            batch_mode              = batch_mode,
+            **metrics,
+        ))
+        print(results[-1])
+
+    ray.shutdown()
+
+    df = pd.DataFrame.from_records(results).sort_values('sampled_timesteps_per_second', ascending=False)
+    print(df.to_string(index=False))
+
+    output = sweep_args.output or f'./benchmarks/results/sampling_{args.experiment_number}.csv'
+    if not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    df.to_csv(output, index=False)
@@ -0,0 +1,242 @@
+from ray.rllib.agents.callbacks import DefaultCallbacks
+from ray.rllib.evaluation import MultiAgentEpisode, RolloutWorker
+from ray.rllib.env import BaseEnv
+from ray.rllib.policy import Policy
+from ray.rllib.utils.typing import PolicyID
+from typing import Dict, Optional
+import numpy as np
+import time
+
+from profiler import PROFILER
+
+
+class MyCallbacks(DefaultCallbacks):
+
+    def on_episode_start(self,
+                         *,
+                         worker: "RolloutWorker",
+                         base_env: BaseEnv,
+                         policies: Dict[PolicyID, Policy],
+                         episode: MultiAgentEpisode,
+                         env_index: Optional[int] = None,
+                         **kwargs):
+        """
+        Callback run on the rollout worker before each episode starts.
+
+        Args:
+            worker (RolloutWorker): Reference to the current rollout worker.
+            base_env (BaseEnv): BaseEnv running the episode. The underlying
+                env object can be gotten by calling base_env.get_unwrapped().
+            policies (dict): Mapping of policy id to policy objects. In single
+                agent mode there will only be a single "default" policy.
+            episode (MultiAgentEpisode): Episode object which contains episode
+                state. You can use the `episode.user_data` dict to store
+                temporary data, and `episode.custom_metrics` to store custom
+                metrics for the episode.
+            env_index (EnvID): Obsoleted: The ID of the environment, which the
+                episode belongs to.
+            kwargs: Forward compatibility placeholder.
+        """
+
+        # Time the episode to separate the profiled phases from the RLlib overhead
+        if PROFILER.enabled:
+            episode.user_data['profile_start'] = time.perf_counter()
+
+        pass
+
+
+    def on_episode_step(self,
+                        *,
+                        worker: "RolloutWorker",
+                        base_env: BaseEnv,
+                        episode: MultiAgentEpisode,
+                        env_index: Optional[int] = None,
+                        **kwargs):
+        """Runs on each episode step.
+
+        Args:
+            worker (RolloutWorker): Reference to the current rollout worker.
+            base_env (BaseEnv): BaseEnv running the episode. The underlying
+                env object can be gotten by calling base_env.get_unwrapped().
+            episode (MultiAgentEpisode): Episode object which contains episode
+                state. You can use the `episode.user_data` dict to store
+                temporary data, and `episode.custom_metrics` to store custom
+                metrics for the episode.
+            env_index (EnvID): Obsoleted: The ID of the environment, which the
+                episode belongs to.
+            kwargs: Forward compatibility placeholder.
+        """
+
+        # The episode's env, as workers may hold several envs
+        env = base_env.get_unwrapped()[env_index if env_index is not None else 0]
+
+        # A policy shared by the pool has no beta of its own, the env draws the pool members
+        if env.config.get('shared_pooled_policy'):
+            return
+
+        # Set the beta and policy of every agent
+        for agent_identifier, policy in episode._agent_to_policy.items():
+            beta = episode._policies[policy].config.get('beta')
+
+            env.config[f'agent_{agent_identifier}_beta']           = beta
+            env.config[f'agent_{agent_identifier}_policy']         = policy
+            worker.env.config[f'agent_{agent_identifier}_beta']    = beta
+            worker.env.config[f'agent_{agent_identifier}_policy']  = policy
+
+        pass
+
+
+
+    def on_episode_end(self, *, worker: RolloutWorker, base_env: BaseEnv,
+                       policies: Dict[str, Policy], episode: MultiAgentEpisode,
+                       env_index: int, **kwargs):
+
+        # if worker.env_context['discrete']:
+        #     episode.custom_metrics[f'current_epsilon'] = policies['policy_0'].exploration.get_info()['cur_epsilon']
+        
+        # episode.custom_metrics[f'starting_system_value'] = episode.last_info_for(0)['starting_system_value']
+        # episode.custom_metrics[f'ending_system_value'] = episode.last_info_for(0)['ending_system_value']
+        # # episode.custom_metrics[f'percentage_of_optimal_allocation'] = episode.last_info_for(0)['percentage_of_optimal_allocation']
+        # episode.custom_metrics[f'optimal_allocation'] = episode.last_info_for(0)['optimal_allocation']
+
+        # for i in range(base_env.envs[0].config['n_agents']):
+        #     episode.custom_metrics[f'{i}_actual_allocation'] = episode.last_info_for(i)['actual_allocation']
+
+
+        # # log_dir = worker._original_kwargs.get('log_dir')
+
+        # Report how hard the episode's graph was to generate
+        env = base_env.get_unwrapped()[env_index if env_index is not None else 0]
+        if env.config.get('log_generator_statistics') and env.generator.last_graph is not None:
+            last_graph  = env.generator.last_graph
+            key         = f'{last_graph["scenario"]}|{last_graph["rescue_amount"]}'
+
+            episode.custom_metrics['generator_attempts']                = last_graph['attempts']
+            episode.custom_metrics['generator_milliseconds']            = 1e3 * last_graph['seconds']
+            episode.custom_metrics[f'generator_attempts/{key}']         = last_graph['attempts']
+            episode.custom_metrics[f'generator_milliseconds/{key}']     = 1e3 * last_graph['seconds']
+
+            # Reasons absent from this graph are reported as 0 so the means are taken over every episode
+            reasons = set(
+                reason
+                for counters in env.generator.statistics.values()
+                for reason in counters['rejections']
+            )
+            for reason in reasons:
+                episode.custom_metrics[f'generator_rejections/{reason}'] = last_graph['rejections'].get(reason, 0)
+
+        # Report the time spent per phase by this worker since the previous episode ended
+        if PROFILER.enabled:
+            if 'profile_start' in episode.user_data:
+                PROFILER.record('episode', episode.user_data['profile_start'], time.perf_counter())
+            episode.custom_metrics.update(PROFILER.drain_metrics())
+            PROFILER.dump_trace()
+
+        pass
+
+
+    def on_train_result(self, *, trainer, result: dict, **kwargs):
+        """
+        Reports the phases timed in the driver, e.g. the model forwards of the learner
+        """
+        if PROFILER.enabled:
+            result['profile_learner'] = PROFILER.drain_metrics()
+            PROFILER.dump_trace()
+
+
+# Graphs played by the evaluation during training
+EVALUATION_GRAPHS = 1000
+
+
+def training_metrics(
+    graphs,
+    actions,
+    rewards,
+    system_values,
+    context = None,
+    ):
+    """
+    Summarizes the greedy play of a pairing on the evaluation graphs
+    :args   actions         (n_graphs, 2) actions of both agents
+    :args   context         config entries of the pairing, see GraphSet.load
+    :output metrics         percentage saved, contributions, rewards and distance to equilibrium
+    """
+    from evaluation import weighted_summary, best_response_gains
+
+    # The summary over all graphs
+    summary = weighted_summary(graphs, actions, rewards, system_values)[-1]
+    metrics = {
+        key.replace(' ', '_'): summary[key] for key in [
+            'percentage_saved',
+            'average_percentage_of_rescue_amount',
+            'average_dominant_contribution',
+            'agent 0 contribution',
+            'agent 1 contribution',
+            'agent 0 reward',
+            'agent 1 reward',
+            'system value',
+        ]
+    }
+
+    # The equilibrium distance sums what both agents would gain by best responding to each other
+    gains = best_response_gains(graphs, actions, context)
+    metrics['equilibrium_distance']         = graphs.mean(gains.sum(axis=1))
+    metrics['percentage_at_equilibrium']    = graphs.mean(gains.max(axis=1) <= 0)
+    metrics['agent_0_best_response_gain']   = graphs.mean(gains[:, 0])
+    metrics['agent_1_best_response_gain']   = graphs.mean(gains[:, 1])
+
+    return metrics
+
+
+def custom_eval_function(
+    trainer, 
+    eval_workers
+    ):
+    """
+    Evaluates the current greedy policies of the trainer on a fixed batch of graphs, in the driver
+
+    The graphs are generated once and kept by the trainer, so every iteration is evaluated on the same
+    graphs.  Each policy takes one batched forward pass per seat with the learner's weights, thus no
+    evaluation worker samples episodes.  Pooled members play every ordered pairing and the metrics are
+    averaged over the pairings.
+    Args:
+        trainer (Trainer): trainer class to evaluate.
+        eval_workers (WorkerSet): evaluation workers, unused.
+    Returns:
+        metrics (dict): evaluation metrics dict.
+    """
+    from evaluation import GraphSet, cross_play, pairing_context, policy_actions
+
+    env_config = dict(trainer.config['env_config'], **trainer.config['evaluation_config'].get('env_config', {}))
+
+    graphs = getattr(trainer, 'evaluation_graphs', None)
+    if graphs is None:
+        graphs = GraphSet(env_config, EVALUATION_GRAPHS, seed=env_config.get('seed', 0))
+        trainer.evaluation_graphs = graphs
+
+    graph_ids = np.arange(graphs.n_graphs)
+
+    if not env_config.get('pooled_training'):
+        actions = np.stack([policy_actions(trainer, f'policy_{seat}', graphs, seat) for seat in range(graphs.n_agents)], axis=-1)
+        rewards, system_values = graphs.play(graph_ids, actions)
+
+        return training_metrics(graphs, actions, rewards, system_values)
+
+    # A shared pooled policy is the only policy of the trainer
+    members         = env_config['policies']
+    shared_policy   = list(trainer.config['multiagent']['policies'])[0] if env_config.get('shared_pooled_policy') else None
+
+    actions, rewards, system_values = cross_play(trainer, graphs, members, shared_policy)
+
+    pairings = []
+    for m0, agent_0_member in enumerate(members):
+        for m1, agent_1_member in enumerate(members):
+            pairings.append(training_metrics(
+                graphs,
+                actions[m0, m1],
+                rewards[m0, m1],
+                system_values[m0, m1],
+                pairing_context(members, agent_0_member, agent_1_member),
+            ))
+
+    return {key: np.nanmean([metrics[key] for metrics in pairings]) for key in pairings[0]}
@@ -0,0 +1,81 @@
+"""
+Single entry point of the experiment scripts
+
+    python cli.py <command> [options]
+
+The options following the command are passed on to its script, which parses them with
+utils.get_args as when it is run directly.  Nothing but the standard library is imported
+before a command is chosen, so each command only pays for its own imports: the analysis,
+table and generator commands never import Ray or torch.
+"""
+import argparse
+import os
+import runpy
+import sys
+
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Script run by each command, relative to the root of the repository, and its description
+COMMANDS = {
+    'train':                    ('trainer.py',                                  'trains independent agents'),
+    'train-pooled':             ('trainer_pooled.py',                           'trains agents drawn from a pool'),
+    'evaluate':                 ('evaluator.py',                                'evaluates the trained agents of an experiment'),
+    'evaluate-pooled':          ('evaluator_pooled.py',                         'evaluates the trained agents of a pooled experiment'),
+    'evaluate-checkpoints':     ('evaluator_checkpoints.py',                    'evaluates every checkpoint of an experiment, giving learning curves'),
+    'tournament':               ('tournament.py',                               'plays a round robin tournament between checkpoints'),
+    'compile-tables':           ('policy_table.py',                             'compiles the greedy policies of an experiment into lookup tables'),
+    'plot':                     ('data/plot_results.py',                        'computes the statistics and figures of an experiment'),
+    'plot-pooled':              ('data/plot_results_pooled.py',                 'computes the statistics and figures of a pooled experiment'),
+    'tables':                   ('data/generate_experiment_tables.py',          'writes the latex tables of the experiments'),
+    'tables-pooled':            ('data/generate_pooled_experiment_tables.py',   'writes the latex tables of the pooled experiments'),
+    'tables-uniformly-mixed':   ('data/generate_uniformly_mixed_tables.py',     'writes the latex tables of the uniformly mixed experiments'),
+    'generate':                 ('generator.py',                                'prints graphs generated for the configured scenario'),
+    'enumerate':                ('utils.py',                                    'counts the unique graphs generated for each scenario'),
+}
+
+
+def get_cli_args(
+    argv,
+    ):
+    """
+    Parses the command; the remaining options are left to the command's script
+    :output command     name of the command
+    :output options     options passed on to the command
+    """
+    parser = argparse.ArgumentParser(
+        description = 'Runs the experiment scripts',
+        epilog      = 'Options following the command are passed on to it, e.g. cli.py train --experiment-number 39',
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    for command, (_, description) in COMMANDS.items():
+        subparsers.add_parser(command, help=description, add_help=False)
+
+    args, options = parser.parse_known_args(argv)
+
+    return args.command, options
+
+
+def run(
+    command,
+    options,
+    ):
+    """
+    Runs the script of a command as __main__, as if it were started with python <script> <options>
+    """
+    script = os.path.join(ROOT_DIR, COMMANDS[command][0])
+
+    # The scripts import their neighbours and the modules at the root of the repository
+    for path in [ROOT_DIR, os.path.dirname(script)]:
+        if path not in sys.path:
+            sys.path.insert(1, path)
+
+    sys.argv = [script] + options
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == "__main__":
+    command, options = get_cli_args(sys.argv[1:])
+    run(command, options)
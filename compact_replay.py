@@ -0,0 +1,324 @@
+from collections import OrderedDict
+
+import numpy as np
+from gym.spaces import Box, Dict
+from ray.rllib.agents.dqn import dqn
+from ray.rllib.agents.dqn.dqn import DQNTrainer
+from ray.rllib.execution.replay_buffer import LocalReplayBuffer, PrioritizedReplayBuffer
+from ray.rllib.policy.sample_batch import SampleBatch
+
+
+# Columns written by the rollout workers which the DQN loss never reads
+ROLLOUT_ONLY_COLUMNS = ['infos', 'q_values', 'action_dist_inputs', 'action_prob', 'action_logp']
+
+# Columns holding observations, which are encoded by the codec
+OBSERVATION_COLUMNS = [SampleBatch.CUR_OBS, SampleBatch.NEXT_OBS]
+
+
+class ObservationCodec:
+    """
+    Lossless compact encoding of flattened observations with small integer features
+
+    RLlib flattens dict observations into float32 vectors, the sub-spaces concatenated in sorted
+    key order.  From the bounds of the sub-spaces, every column is stored either as a bit
+    (0/1 features such as the action mask), as a small integer or, when unbounded, as a float.
+    """
+
+    def __init__(
+        self,
+        low,
+        high,
+        ) -> None:
+
+        low, high = np.asarray(low, dtype=float).ravel(), np.asarray(high, dtype=float).ravel()
+
+        self.size           = low.size
+        self.binary         = np.flatnonzero((low >= 0) & (high <= 1))
+        bounded             = np.isfinite(low) & np.isfinite(high) & ~((low >= 0) & (high <= 1))
+        self.integer        = np.flatnonzero(bounded)
+        self.real           = np.flatnonzero(~np.isfinite(low) | ~np.isfinite(high))
+
+        # The smallest integer type holding the bounds of every integer column
+        self.integer_dtype  = np.int16
+        if self.integer.size > 0 and low[self.integer].min() >= -128 and high[self.integer].max() <= 127:
+            self.integer_dtype = np.int8
+
+        self.n_bytes        = (self.binary.size + 7) // 8
+
+
+    @classmethod
+    def from_space(
+        cls,
+        space,
+        ):
+        """
+        Builds the codec of a (possibly preprocessed) observation space
+        """
+        if getattr(space, 'original_space', None) is not None:
+            space = space.original_space
+
+        if isinstance(space, Dict):
+            spaces = OrderedDict(sorted(space.spaces.items())).values()
+        else:
+            spaces = [space]
+
+        assert all(isinstance(s, Box) for s in spaces), "only Box observations can be encoded"
+
+        low     = np.concatenate([np.broadcast_to(s.low, s.shape).ravel() for s in spaces])
+        high    = np.concatenate([np.broadcast_to(s.high, s.shape).ravel() for s in spaces])
+
+        return cls(low, high)
+
+
+    def fields(
+        self,
+        prefix,
+        ):
+        """
+        Fields of the structured array storing the encoded observations
+        """
+        return [
+            (f'{prefix}_bits',      np.uint8,           (self.n_bytes,)),
+            (f'{prefix}_integers',  self.integer_dtype, (self.integer.size,)),
+            (f'{prefix}_reals',     np.float32,         (self.real.size,)),
+        ]
+
+
+    def encode(
+        self,
+        observations,
+        ):
+        """
+        :args   observations    (n, size) flattened observations
+        :output bits            (n, n_bytes) packed binary columns
+        :output integers        (n, n_integers) integer columns
+        :output reals           (n, n_reals) unbounded columns
+        :output exact           (n,) whether the observation is recovered exactly when decoded
+        """
+        observations    = np.asarray(observations, dtype=np.float32).reshape(-1, self.size)
+
+        binary          = observations[:, self.binary]
+        integer         = observations[:, self.integer]
+        info            = np.iinfo(self.integer_dtype)
+
+        exact = (
+            ((binary == 0) | (binary == 1)).all(axis=1) &
+            (integer == np.round(integer)).all(axis=1) &
+            ((integer >= info.min) & (integer <= info.max)).all(axis=1)
+        )
+
+        bits        = np.packbits(binary.astype(np.uint8), axis=1)
+        integers    = np.clip(np.round(integer), info.min, info.max).astype(self.integer_dtype)
+        reals       = observations[:, self.real]
+
+        return bits, integers, reals, exact
+
+
+    def decode(
+        self,
+        bits,
+        integers,
+        reals,
+        ):
+        """
+        Inverse of encode
+        :output observations    (n, size) float32 observations
+        """
+        observations = np.empty((bits.shape[0], self.size), dtype=np.float32)
+        observations[:, self.binary]    = np.unpackbits(bits, axis=1, count=self.binary.size)
+        observations[:, self.integer]   = integers
+        observations[:, self.real]      = reals
+
+        return observations
+
+
+class CompactSlot:
+    """
+    Placeholder kept in ReplayBuffer._storage; the transitions live in preallocated rows
+    """
+    __slots__ = ['count', 'n_bytes']
+
+    def __init__(
+        self,
+        n_bytes,
+        ) -> None:
+        self.count      = 1
+        self.n_bytes    = n_bytes
+
+    def size_bytes(
+        self
+        ):
+        return self.n_bytes
+
+
+class CompactPrioritizedReplayBuffer(PrioritizedReplayBuffer):
+    """
+    Prioritized replay buffer storing single transitions in a preallocated structured array
+
+    Observations are encoded with an ObservationCodec and the columns unused by the DQN loss are
+    dropped.  The bookkeeping (circular indices, priorities) is left to RLlib: its storage only
+    holds a shared placeholder per transition.  Transitions which cannot be encoded exactly are
+    kept as they are.
+    """
+
+    def __init__(
+        self,
+        size,
+        alpha,
+        codec,
+        ) -> None:
+
+        PrioritizedReplayBuffer.__init__(self, size, alpha=alpha)
+
+        self.codec      = codec
+        self.rows       = None
+        self.slot       = None
+
+        # Transitions stored as they are, by index
+        self.raw        = {}
+
+
+    def allocate(
+        self,
+        item,
+        ):
+        """
+        Preallocates the rows from the columns of the first transition
+        """
+        fields = []
+        for column, values in item.items():
+            if column in ROLLOUT_ONLY_COLUMNS:
+                continue
+            if column in OBSERVATION_COLUMNS:
+                fields += self.codec.fields(column)
+            else:
+                fields.append((column, values.dtype, values.shape[1:]))
+
+        self.columns    = [column for column in item.keys() if column not in ROLLOUT_ONLY_COLUMNS]
+        self.rows       = np.zeros(self._maxsize, dtype=np.dtype(fields))
+        self.slot       = CompactSlot(self.rows.dtype.itemsize)
+
+
+    def encodable(
+        self,
+        item,
+        ):
+        if self.codec is None or item.count != 1:
+            return False
+        if self.rows is None:
+            self.allocate(item)
+        return sorted(self.columns) == sorted(c for c in item.keys() if c not in ROLLOUT_ONLY_COLUMNS)
+
+
+    def add(
+        self,
+        item,
+        weight,
+        ):
+        index = self._next_idx
+
+        if self.encodable(item):
+            row     = self.rows[index]
+            exact   = True
+
+            for column in self.columns:
+                if column in OBSERVATION_COLUMNS:
+                    bits, integers, reals, encoded_exactly = self.codec.encode(item[column])
+                    row[f'{column}_bits']       = bits[0]
+                    row[f'{column}_integers']   = integers[0]
+                    row[f'{column}_reals']      = reals[0]
+                    exact &= bool(encoded_exactly[0])
+                else:
+                    row[column] = item[column][0]
+
+            if exact:
+                self.raw.pop(index, None)
+                return PrioritizedReplayBuffer.add(self, self.slot, weight)
+
+        self.raw[index] = item
+        return PrioritizedReplayBuffer.add(self, item, weight)
+
+
+    def _encode_sample(
+        self,
+        idxes,
+        ):
+        if self.rows is None:
+            return PrioritizedReplayBuffer._encode_sample(self, idxes)
+
+        idxes   = np.asarray(idxes)
+        rows    = self.rows[idxes]
+
+        batch = {}
+        for column in self.columns:
+            if column in OBSERVATION_COLUMNS:
+                batch[column] = self.codec.decode(
+                    rows[f'{column}_bits'],
+                    rows[f'{column}_integers'],
+                    rows[f'{column}_reals'],
+                )
+            else:
+                batch[column] = rows[column]
+
+        # Transitions stored as they are
+        for position, index in enumerate(idxes):
+            item = self.raw.get(int(index))
+            if item is None:
+                continue
+            for column in self.columns:
+                if column in item:
+                    batch[column][position] = item[column][0]
+
+        return SampleBatch(batch)
+
+
+class CompactLocalReplayBuffer(LocalReplayBuffer):
+    """
+    LocalReplayBuffer creating a compact buffer per policy
+    """
+
+    def __init__(
+        self,
+        codecs,
+        *args,
+        **kwargs,
+        ) -> None:
+
+        LocalReplayBuffer.__init__(self, *args, **kwargs)
+
+        buffer_size = self.buffer_size
+        alpha       = kwargs.get('prioritized_replay_alpha', 0.6)
+
+        class Buffers(dict):
+            def __missing__(buffers, policy_id):
+                buffers[policy_id] = CompactPrioritizedReplayBuffer(buffer_size, alpha, codecs.get(policy_id))
+                return buffers[policy_id]
+
+        self.replay_buffers = Buffers()
+
+
+def compact_execution_plan(
+    workers,
+    config,
+    ):
+    """
+    DQN's execution plan replaying from compact buffers
+    """
+    codecs = {
+        policy_id: ObservationCodec.from_space(policy.observation_space)
+        for policy_id, policy in workers.local_worker().policy_map.items()
+    }
+
+    # DQN's plan builds its LocalReplayBuffer from the dqn module
+    default_buffer = dqn.LocalReplayBuffer
+    dqn.LocalReplayBuffer = lambda *args, **kwargs: CompactLocalReplayBuffer(codecs, *args, **kwargs)
+    try:
+        return dqn.execution_plan(workers, config)
+    finally:
+        dqn.LocalReplayBuffer = default_buffer
+
+
+CompactDQNTrainer = DQNTrainer.with_updates(
+    name            = "CompactDQN",
+    execution_plan  = compact_execution_plan,
+)
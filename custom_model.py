@@ -4,6 +4,8 @@ from ray.rllib.utils.annotations import override
 from ray.rllib.utils.framework import try_import_torch
 from ray.rllib.utils.torch_ops import FLOAT_MIN, FLOAT_MAX
 
+from profiler import profiled
+
 
 torch, nn = try_import_torch()
 
@@ -67,6 +69,7 @@ class Custom_discrete_model_with_masking(TorchModelV2, nn.Module):
         self._value_input           = None
 
     @override(ModelV2)
+    @profiled('model_forward')
     def forward(self, input_dict, state, seq_lens):
 
         action_mask     = input_dict.get('obs').get('action_mask')
@@ -156,19 +159,14 @@ class Generalized_model_with_masking(TorchModelV2, nn.Module):
         self._value_input           = None
 
     @override(ModelV2)
+    @profiled('model_forward')
     def forward(self, input_dict, state, seq_lens):
 
         action_mask     = input_dict.get('obs').pop('action_mask')
 
-        embedded_observations = {}
-        # NOTE: This is parsing from the layers, not from the observations.  
-        # Observations may contain more than used by the model.
-        for observation_key in self.layers.keys():
-            embedded_observations[observation_key] = self.layers[observation_key](input_dict.get('obs').get(observation_key))
-        
         # Concatenate observations into a hidden vector
         # TODO: Consider attention later for continuous actions
-        hidden_vector = torch.cat(list(embedded_observations.values()),-1)
+        hidden_vector = self.embed_observations(input_dict.get('obs'))
 
         hidden_vector = self.combining_network(hidden_vector)
         hidden_vector = nn.functional.relu(hidden_vector)
@@ -184,12 +182,199 @@ class Generalized_model_with_masking(TorchModelV2, nn.Module):
         return logits, []
 
 
+    def embed_observations(self, observations):
+        """
+        Embeds the observations used by the model and concatenates the embeddings
+        """
+        embedded_observations = {}
+        # NOTE: This is parsing from the layers, not from the observations.  
+        # Observations may contain more than used by the model.
+        for observation_key in self.layers.keys():
+            embedded_observations[observation_key] = self.layers[observation_key](observations.get(observation_key))
+
+        return torch.cat(list(embedded_observations.values()),-1)
+
+
     @override(ModelV2)
     def value_function(self):
         assert self.hidden_vector is not None, "must call forward first!"
         return torch.reshape(self.value(self._value_input), [-1])
 
 
+class history_encoder(nn.Module):
+    """
+    Encodes the offers of the previous negotiation rounds
+
+    The whole minibatch is encoded in one call: histories are padded to the number of rounds
+    and the rounds which have not been played yet are masked out by their sequence lengths.
+    """
+    def __init__(self, encoder_type, number_of_rounds, max_system_value, embedding_size):
+        super().__init__()
+        self.encoder_type       = encoder_type
+        self.number_of_rounds   = number_of_rounds
+        self.max_system_value   = max_system_value
+
+        # Each round is the agent's own offer and the sum of the other agents' offers
+        self.offer_embedding    = nn.Linear(2, embedding_size)
+
+        if encoder_type == 'gru':
+            self.encoder = nn.GRU(embedding_size, embedding_size, batch_first=True)
+        elif encoder_type == 'transformer':
+            self.round_embedding = nn.Embedding(number_of_rounds, embedding_size)
+            layer = nn.TransformerEncoderLayer(embedding_size, nhead=2, dim_feedforward=2 * embedding_size, dropout=0.0)
+            self.encoder = nn.TransformerEncoder(layer, num_layers=1)
+        else:
+            assert False, f'"{encoder_type}" is not a valid history encoder'
+
+
+    def forward(self, offer_history, seq_lens):
+        """
+        :args   offer_history   (batch, rounds * 2) offers of every round, 0 for future rounds
+        :args   seq_lens        (batch,) number of rounds played so far
+        :output encoding        (batch, embedding_size) encoding of the history, 0 before the first round
+        """
+        batch_size  = offer_history.shape[0]
+        offers      = offer_history.float().reshape(batch_size, self.number_of_rounds, 2) / self.max_system_value
+        x           = self.offer_embedding(offers)
+
+        seq_lens    = seq_lens.long().clamp(0, self.number_of_rounds)
+        played      = (seq_lens > 0).float().unsqueeze(-1)
+
+        # Empty histories are given a single padded round; their encoding is zeroed below
+        lengths     = seq_lens.clamp(min=1)
+
+        if self.encoder_type == 'gru':
+            packed = nn.utils.rnn.pack_padded_sequence(x, lengths.cpu(), batch_first=True, enforce_sorted=False)
+            _, hidden = self.encoder(packed)
+            encoding = hidden[-1]
+        else:
+            positions   = torch.arange(self.number_of_rounds, device=x.device)
+            padding     = positions.unsqueeze(0) >= lengths.unsqueeze(-1)
+            x           = x + self.round_embedding(positions).unsqueeze(0)
+
+            # nn.TransformerEncoder expects (rounds, batch, features)
+            x = self.encoder(x.transpose(0, 1), src_key_padding_mask=padding).transpose(0, 1)
+
+            # Mean over the rounds played
+            x = x.masked_fill(padding.unsqueeze(-1), 0.)
+            encoding = x.sum(1) / lengths.unsqueeze(-1).float()
+
+        return encoding * played
+
+
+class Negotiation_history_model(Generalized_model_with_masking):
+    """
+    Generalized model which also encodes the offer history of multi-round negotiations
+
+    RLlib's DQN does not replay recurrent states, so the history travels in the observation
+    (offer_history, negotiation_round) and the encoder rebuilds it within every forward pass.
+    """
+
+    def __init__(self, obs_space, action_space, num_outputs, model_config,
+                 name, **kwargs):
+        Generalized_model_with_masking.__init__(self, obs_space, action_space, num_outputs,
+                                                model_config, name, **kwargs)
+
+        assert self.args.number_of_negotiation_rounds > 1, "the offer history requires more than one negotiation round"
+
+        embedding_size          = self.args.embedding_size
+        number_of_layers        = len(self.layers.keys())
+
+        self.history_encoder    = history_encoder(
+            self.args.history_encoder,
+            self.args.number_of_negotiation_rounds,
+            self.args.max_system_value,
+            embedding_size,
+        )
+        self.combining_network  = nn.Linear(embedding_size * (number_of_layers + 1), embedding_size)
+
+
+    @override(ModelV2)
+    @profiled('model_forward')
+    def forward(self, input_dict, state, seq_lens):
+
+        action_mask     = input_dict.get('obs').pop('action_mask')
+        observations    = input_dict.get('obs')
+
+        history = self.history_encoder(
+            observations.get('offer_history'),
+            observations.get('negotiation_round').reshape(-1),
+        )
+
+        # The embeddings of the (batch, 1) observations keep their singleton dimension
+        embedded_observations = self.embed_observations(observations)
+        history = history.reshape(*embedded_observations.shape[:-1], -1)
+
+        hidden_vector = torch.cat([embedded_observations, history], -1)
+
+        hidden_vector = self.combining_network(hidden_vector)
+        hidden_vector = nn.functional.relu(hidden_vector)
+
+        self._value_input = hidden_vector
+
+        logits = self.proposal_network(hidden_vector).squeeze()
+        inf_mask = torch.clamp(torch.log(action_mask),FLOAT_MIN, FLOAT_MAX)
+
+        # Apply the masks
+        logits = logits + inf_mask
+
+        return logits, []
+
+
+class Pooled_model_with_film(Generalized_model_with_masking):
+    """
+    Generalized model shared by every member of a pool
+
+    The trunk is shared and the hidden vector is modulated (FiLM) by the beta of the pool member
+    being played, so the parameters stay constant as the pool grows and the experiences of all
+    members are evaluated in one batched forward pass.
+    """
+
+    def __init__(self, obs_space, action_space, num_outputs, model_config,
+                 name, **kwargs):
+        Generalized_model_with_masking.__init__(self, obs_space, action_space, num_outputs,
+                                                model_config, name, **kwargs)
+
+        embedding_size  = self.args.embedding_size
+
+        # Scale and shift of the hidden vector given the member's beta
+        self.film       = nn.Sequential(
+            nn.Linear(1, embedding_size),
+            nn.ReLU(),
+            nn.Linear(embedding_size, 2 * embedding_size),
+        )
+
+
+    @override(ModelV2)
+    @profiled('model_forward')
+    def forward(self, input_dict, state, seq_lens):
+
+        action_mask     = input_dict.get('obs').pop('action_mask')
+        observations    = input_dict.get('obs')
+
+        hidden_vector = self.embed_observations(observations)
+
+        hidden_vector = self.combining_network(hidden_vector)
+        hidden_vector = nn.functional.relu(hidden_vector)
+
+        # NOTE: Betas are observed in steps of 0.01, i.e. in [0, 100]
+        own_beta        = observations.get('own_beta').float().reshape(-1, 1) / 100
+        scale, shift    = self.film(own_beta).chunk(2, -1)
+        scale           = scale.reshape(hidden_vector.shape)
+        shift           = shift.reshape(hidden_vector.shape)
+        hidden_vector   = (1 + scale) * hidden_vector + shift
+
+        self._value_input = hidden_vector
+
+        logits = self.proposal_network(hidden_vector).squeeze()
+        inf_mask = torch.clamp(torch.log(action_mask),FLOAT_MIN, FLOAT_MAX)
+
+        # Apply the masks
+        logits = logits + inf_mask
+
+        return logits, []
+
+
 class basic_model_with_masking(TorchModelV2, nn.Module):
     """Torch version of FastModel (tf)."""
 
@@ -211,6 +396,7 @@ class basic_model_with_masking(TorchModelV2, nn.Module):
         self._output = None
 
     @override(ModelV2)
+    @profiled('model_forward')
     def forward(self, input_dict, state, seq_lens):
         self._output = input_dict.get('obs').get('real_obs').float()
         x = self.layer1(self._output)
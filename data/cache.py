@@ -0,0 +1,146 @@
+import hashlib
+import inspect
+import json
+import os
+
+
+class ArtifactCache:
+    """
+    Content-hash cache for the artifacts derived in the data pipeline
+
+    An artifact is keyed on the content of its input files, the source code of the
+    function producing it (and of the modules it depends on) and its parameters.
+    The artifact is only recomputed when this key changes or its outputs are missing.
+    """
+
+    def __init__(
+        self,
+        manifest_path,
+        ) -> None:
+
+        self.manifest_path  = manifest_path
+        self.manifest       = {'artifacts': {}, 'files': {}}
+
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+
+
+    def run(
+        self,
+        name,
+        producer,
+        inputs,
+        dependencies    = None,
+        parameters      = None,
+        ):
+        """
+        Runs the producer unless the artifact is up to date
+        :args   name            identifier of the artifact within the manifest
+        :args   producer        function without arguments which writes the artifact and returns the written paths
+        :args   inputs          paths of the files the artifact is derived from
+        :args   dependencies    functions or modules whose source code also determines the artifact
+        :args   parameters      json serializable parameters which determine the artifact
+        :output computed        True if the producer was run
+        """
+        key = self.key(producer, inputs, dependencies, parameters)
+
+        artifact = self.manifest['artifacts'].get(name)
+        if  artifact is not None and\
+            artifact['key'] == key and\
+            all(os.path.exists(path) for path in artifact['outputs']):
+            return False
+
+        outputs = producer() or []
+
+        self.manifest['artifacts'][name] = {
+            'key':      key,
+            'outputs':  list(outputs),
+        }
+        self.save()
+
+        return True
+
+
+    def key(
+        self,
+        producer,
+        inputs,
+        dependencies    = None,
+        parameters      = None,
+        ):
+        """
+        Hashes the inputs, code version and parameters of an artifact
+        """
+        digest = hashlib.sha1()
+
+        for path in sorted(inputs):
+            digest.update(path.encode())
+            digest.update(self.file_hash(path).encode())
+
+        for code in [producer] + list(dependencies or []):
+            digest.update(code_version(code).encode())
+
+        digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+
+        return digest.hexdigest()
+
+
+    def file_hash(
+        self,
+        path,
+        ):
+        """
+        Hashes the content of a file; the hash is reused while the size and modification time are unchanged
+        """
+        if not os.path.exists(path):
+            return 'missing'
+
+        stat    = os.stat(path)
+        known   = self.manifest['files'].get(path)
+        if known is not None and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+            return known['hash']
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+
+        self.manifest['files'][path] = {
+            'size':     stat.st_size,
+            'mtime':    stat.st_mtime,
+            'hash':     digest.hexdigest(),
+        }
+
+        return digest.hexdigest()
+
+
+    def save(
+        self
+        ):
+        manifest_dir = os.path.dirname(self.manifest_path)
+        if manifest_dir and not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+
+        temporary_path = f'{self.manifest_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(temporary_path, self.manifest_path)
+
+
+def code_version(
+    code
+    ):
+    """
+    Hashes the source code of a function, a module or a source file
+    """
+    if isinstance(code, str):
+        with open(code, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    try:
+        source = inspect.getsource(code)
+    except (OSError, TypeError):
+        source = getattr(code, '__qualname__', repr(code))
+
+    return hashlib.sha1(source.encode()).hexdigest()
@@ -1,6 +1,12 @@
 import pandas as pd
 import os
 from plot_utils import line_plot_with_variances
+from experiment_statistics import contribution_dataset
+
+import sys
+sys.path.insert(1, os.getcwd())
+
+from evaluation_storage import read_evaluations
 
 if __name__ == "__main__":
 
@@ -25,12 +31,7 @@ if __name__ == "__main__":
     }
 
     # Pre-allocate storage to collect results
-    scenarios                               = []
-    dominant_contributions                  = []
-    percentage_of_rescue_amount             = []
-    total_as_percentage_of_rescue_amount    = []
-    successful_rescues                      = []
-    experiment_betas                        = []
+    contribution_datasets = []
 
     # Iterate through each Game
     for scenario in dict.keys():
@@ -39,54 +40,16 @@ if __name__ == "__main__":
         for experiment_number in dict.get(scenario).get('experiment_numbers'):
 
             # Load the dataset
-            df = pd.read_csv(f'./data/checkpoints/{experiment_number}/experimental_data.csv')
-
-            # Iterate through the rows in the dataset and collect results
-            for index, row in df.iterrows():
-                agent_0_contribution = row['agent 0 actions']
-                agent_1_contribution = row['agent 1 actions']
-                rescue_amount = row['rescue_amount']
-                total_contribution = agent_0_contribution + agent_1_contribution
-
-                # Statistic: Calculate contributions
-                if agent_1_contribution > agent_0_contribution:
-                    if total_contribution != 0:
-                        dominant_contributions.append(agent_1_contribution / total_contribution)
-                    else:
-                        dominant_contributions.append(0)
-
-                    percentage_of_rescue_amount.append(agent_1_contribution/ rescue_amount)
-                else:
-                    if total_contribution != 0:
-                        dominant_contributions.append(agent_0_contribution / total_contribution)
-                    else:
-                        dominant_contributions.append(0)
-                    
-                    percentage_of_rescue_amount.append(agent_0_contribution/ rescue_amount)
-                
-                # Statistic: Calculate betas
-                experiment_betas.append(row['beta'])
-
-                # Statistics: Calculate the rescue percentage
-                if total_contribution >= rescue_amount: 
-                    successful_rescues.append(1.0)
-                else:
-                    successful_rescues.append(0.0)
-                
-                total_as_percentage_of_rescue_amount.append(total_contribution / rescue_amount)
-
-                # Statistic: Store the scenario
-                scenarios.append(scenario)
+            df = read_evaluations(
+                experiment_number,
+                columns = ['beta', 'rescue_amount', 'agent 0 actions', 'agent 1 actions'],
+            )
+
+            # Compute the contribution statistics of every row with column operations
+            contribution_datasets.append(contribution_dataset(df, scenario))
             
     # Collect the statistics
-    master_data = {
-        'Scenario': scenarios,
-        'Beta': experiment_betas,
-        'Dominant Contributions': dominant_contributions,
-        'Percentage of Rescue Amount': percentage_of_rescue_amount,
-        'Successful Rescues': successful_rescues,
-        'Total Contribution': total_as_percentage_of_rescue_amount,
-        }        
+    master_data = pd.concat(contribution_datasets, ignore_index=True)
 
     # Prepare directory to save results
     root_dir = f'./data/dominant_contributions'
@@ -94,7 +57,7 @@ if __name__ == "__main__":
         os.makedirs(root_dir)
 
     # Convert and save as CSV
-    df = pd.DataFrame(data=master_data)
+    df = master_data
     df.to_csv(
         f'{root_dir}/contribution_dataset.csv', 
         index=False,
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+
+
+def compute_outcomes(
+    data,
+    strict_not_in_default = True,
+    ):
+    """
+    Computes the per-episode outcomes of an evaluation dataset with column operations
+    :args   data                    evaluation dataset containing 'agent 0 actions', 'agent 1 actions' and 'rescue_amount'
+    :args   strict_not_in_default   in 'not in default' the rescue amount is always 0, thus a rescue
+                                    only occurs if the agents allocate more than 0 assets
+    :output outcomes                the dataset extended with the outcome columns
+    """
+    agent_0_contribution    = data['agent 0 actions'].to_numpy(dtype=float)
+    agent_1_contribution    = data['agent 1 actions'].to_numpy(dtype=float)
+    rescue_amount           = data['rescue_amount'].to_numpy(dtype=float)
+    total_contribution      = agent_0_contribution + agent_1_contribution
+
+    # Total_contribution has to be greater than the rescue amount
+    rescued = total_contribution >= rescue_amount
+    if strict_not_in_default:
+        not_in_default = np.zeros(len(data), dtype=bool)
+        for column in ['scenario', 'sub_scenarios']:
+            if column in data.columns:
+                not_in_default |= (data[column] == 'not in default').to_numpy()
+        rescued = np.where(not_in_default, total_contribution > rescue_amount, rescued)
+
+    # TODO: This number breaks in 'not in default" as the rescue amount is always 0
+    saved = (total_contribution >= rescue_amount) & (rescue_amount != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage_of_rescue_amount_if_saved = np.where(saved, total_contribution / rescue_amount, np.nan)
+
+        # If nothing is contributed, the contributions are split equally
+        dominant_contribution       = np.where(
+            total_contribution == 0,
+            0.50,
+            np.maximum(agent_0_contribution, agent_1_contribution) / total_contribution
+        )
+        non_dominant_contribution   = np.where(
+            total_contribution == 0,
+            0.50,
+            np.minimum(agent_0_contribution, agent_1_contribution) / total_contribution
+        )
+
+    outcomes = data.assign(**{
+        'total_contribution':                   total_contribution,
+        'rescued':                              rescued,
+        'saved':                                saved.astype(float),
+        'percentage_of_rescue_amount_if_saved': percentage_of_rescue_amount_if_saved,
+        'dominant_contribution':                dominant_contribution,
+        'non_dominant_contribution':            non_dominant_contribution,
+    })
+
+    return outcomes
+
+
+def summarize(
+    outcomes,
+    keys = None,
+    ):
+    """
+    Aggregates the outcomes per group in a single groupby
+    :args   outcomes    dataset returned by compute_outcomes
+    :args   keys        columns to group by (e.g. sub scenario, trial or policy pairing); None aggregates everything
+    :output summary     one row per group with the statistics reported in the tables
+    """
+    aggregations = {
+        'number_of_samples':                        ('rescued', 'size'),
+        'number_of_rescues':                        ('rescued', 'sum'),
+        'average_percentage_of_rescue_amount':      ('percentage_of_rescue_amount_if_saved', 'mean'),
+        'average_dominant_contribution':            ('dominant_contribution', 'mean'),
+        'average_non_dominant_contribution':        ('non_dominant_contribution', 'mean'),
+    }
+
+    if keys is None:
+        summary = outcomes.assign(_all=0).groupby('_all').agg(**aggregations).reset_index(drop=True)
+    else:
+        summary = outcomes.groupby(keys, sort=True, observed=True).agg(**aggregations).reset_index()
+
+    summary['percentage_saved'] = summary['number_of_rescues'] / summary['number_of_samples']
+
+    return summary
+
+
+def percentage_saved_by_rescue_amount(
+    outcomes,
+    keys = None,
+    ):
+    """
+    Returns the fraction of episodes saved per rescue amount (and per group, if keys are given)
+    """
+    keys = ([] if keys is None else list(keys)) + ['rescue_amount']
+    return outcomes\
+        .groupby(keys, sort=True, observed=True)['saved']\
+        .mean()\
+        .reset_index()\
+        .rename(columns={'saved': 'percentage_saved'})
+
+
+def confusion_matrix(
+    allocations,
+    rescue_amounts,
+    n_rows = 8,
+    n_cols = 8,
+    ):
+    """
+    Counts the joint occurences of (actual allocation, rescue amount)
+    Allocations outside of the matrix are dropped
+    """
+    allocations     = np.asarray(allocations).astype(int)
+    rescue_amounts  = np.asarray(rescue_amounts).astype(int)
+    valid           = (allocations < n_rows) & (rescue_amounts < n_cols)
+
+    flat_index = allocations[valid] * n_cols + rescue_amounts[valid]
+
+    return np.bincount(flat_index, minlength=n_rows * n_cols).reshape(n_rows, n_cols).astype(float)
+
+
+def confusion_matrices(
+    data,
+    keys,
+    allocation_column,
+    n_rows = 8,
+    n_cols = 8,
+    ):
+    """
+    Computes the confusion matrix of every group in one pass
+    :args   data                evaluation dataset
+    :args   keys                columns identifying a group (e.g. ['sub_scenarios', 'trials'])
+    :args   allocation_column   column containing the agent's allocations
+    :output matrices            dictionary mapping the group key to its (n_rows, n_cols) matrix
+    """
+    codes, groups   = pd.MultiIndex.from_frame(data[keys]).factorize()
+    allocations     = data[allocation_column].to_numpy().astype(int)
+    rescue_amounts  = data['rescue_amount'].to_numpy().astype(int)
+    valid           = (allocations < n_rows) & (rescue_amounts < n_cols)
+
+    matrices = np.zeros((len(groups), n_rows, n_cols))
+    np.add.at(matrices, (codes[valid], allocations[valid], rescue_amounts[valid]), 1)
+
+    return {
+        group if len(keys) > 1 else group[0]: matrices[i]
+        for i, group in enumerate(groups)
+    }
+
+
+def contribution_dataset(
+    data,
+    scenario,
+    ):
+    """
+    Computes the contribution statistics used in the dominant contribution plots
+    :args   data        evaluation dataset of one experiment
+    :args   scenario    label of the game the experiment belongs to
+    """
+    agent_0_contribution    = data['agent 0 actions'].to_numpy(dtype=float)
+    agent_1_contribution    = data['agent 1 actions'].to_numpy(dtype=float)
+    rescue_amount           = data['rescue_amount'].to_numpy(dtype=float)
+    total_contribution      = agent_0_contribution + agent_1_contribution
+    dominant                = np.maximum(agent_0_contribution, agent_1_contribution)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({
+            'Scenario':                     np.full(len(data), scenario, dtype=object),
+            'Beta':                         data['beta'].to_numpy(),
+            'Dominant Contributions':       np.where(total_contribution != 0, dominant / total_contribution, 0.0),
+            'Percentage of Rescue Amount':  dominant / rescue_amount,
+            'Successful Rescues':           (total_contribution >= rescue_amount).astype(float),
+            'Total Contribution':           total_contribution / rescue_amount,
+        })
@@ -3,12 +3,76 @@ import numpy as np
 import os
 
 from plot_utils import save_table
+from cache import ArtifactCache
 
 import sys
 sys.path.insert(1, os.getcwd())
 
+from evaluation_storage import read_statistics, statistics_path
+
 np.set_printoptions(precision=2)
 
+def build_table(
+    observation_set,
+    configuration,
+    scenarios,
+    save_dir,
+    ):
+    """
+    Tabulates the percentage saved of the experiments in an observation set
+    :output outputs     paths of the written files
+    """
+    # Storage for saving he percentage saved
+    data = []
+    
+    for scenario in configuration:
+
+        if scenario in scenarios:
+            
+            aggregated_percentage_saved = []
+
+            for experiment_number in configuration.get(scenario):
+                
+                # Read only the percentage saved column of the typed statistics
+                statistics = read_statistics(experiment_number, columns=['percentage_saved'])
+
+                if statistics is not None:
+                    percentage_saved = statistics['percentage_saved'].iloc[0]
+                else:
+                    df = pd.read_csv(f'./data/checkpoints/{experiment_number}/statistics.csv')
+                    percentage_saved = pd.to_numeric(df[df['Description'] == 'Percentage Saved']['Statistic'])[0]
+
+                # Aggregate percentage saved
+                aggregated_percentage_saved.append(percentage_saved.round(2))
+
+            # Collect it in the aggregator
+            data.append(aggregated_percentage_saved)
+
+    # Transpose the data so the pairings are in the rows and the pools are in column 
+    save_table(
+        data = np.array(data),
+        row_labels = np.array(configuration.get('row_labels')).reshape(-1,1),
+        column_labels = configuration.get('columns_labels'),
+        save_dir = f'{save_dir}/{observation_set}.txt',
+    )
+
+    return [f'{save_dir}/{observation_set}.txt']
+
+
+def input_paths(
+    configuration,
+    scenarios,
+    ):
+    """
+    Returns the statistics files a table is derived from
+    """
+    return [
+        statistics_path(experiment_number) or f'./data/checkpoints/{experiment_number}/statistics.csv'
+        for scenario in scenarios if scenario in configuration
+        for experiment_number in configuration.get(scenario)
+    ]
+
+
 if __name__=="__main__":
     
 
@@ -51,41 +115,19 @@ if __name__=="__main__":
         'only bank c can rescue'
         ]
 
-    for observation_set in observation_sets.keys():
-
-        save_dir = f'./data/tables/experiments'
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-
-        # Storage for saving he percentage saved
-        data = []
-        
-        for scenario in observation_sets.get(observation_set):
-
-            if scenario in scenarios:
-                
-                aggregated_percentage_saved = []
-
-                for experiment_number in observation_sets.get(observation_set).get(scenario):
-                    
-                    # Read the dataframe
-                    df = pd.read_csv(f'./data/checkpoints/{experiment_number}/statistics.csv')
+    save_dir = f'./data/tables/experiments'
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
 
-                    # Extract the percentage saved 
-                    percentage_saved = pd.to_numeric(df[df['Description'] == 'Percentage Saved']['Statistic'])[0]
-
-                    # Aggregate percentage saved
-                    aggregated_percentage_saved.append(percentage_saved.round(2))
+    # Tables are only rebuilt when their statistics, the table code or their configuration change
+    cache = ArtifactCache(f'{save_dir}/cache_manifest.json')
 
-                # Collect it in the aggregator
-                data.append(aggregated_percentage_saved)
+    for observation_set, configuration in observation_sets.items():
 
-        # Transpose the data so the pairings are in the rows and the pools are in column 
-        save_table(
-            data = np.array(data),
-            row_labels = np.array(observation_sets.get(observation_set).get('row_labels')).reshape(-1,1),
-            column_labels = observation_sets.get(observation_set).get('columns_labels'),
-            save_dir = f'{save_dir}/{observation_set}.txt',
+        cache.run(
+            name            = observation_set,
+            producer        = lambda: build_table(observation_set, configuration, scenarios, save_dir),
+            inputs          = input_paths(configuration, scenarios),
+            dependencies    = [build_table, save_table],
+            parameters      = configuration,
         )
-
-        del data
\ No newline at end of file
@@ -7,9 +7,79 @@ import os
 import sys
 sys.path.insert(1, os.getcwd())
 
+from evaluation_storage import read_statistics, statistics_path
+from cache import ArtifactCache
+
 np.set_printoptions(precision=2)
 
 
+def build_table(
+    observation_set,
+    configuration,
+    ordering,
+    save_dir,
+    ):
+    """
+    Tabulates the percentage saved of every policy pairing in an observation set
+    :output outputs     paths of the written files
+    """
+    # Storage for saving he percentage saved
+    data = []
+
+    # Insert the pairings
+    pairings = [f'{i},{j}' for i, j in combinations_with_replacement(range(6),2)]
+    data.append(pairings + ['Average'])
+    
+    for scenario in configuration:
+
+        for experiment_number in configuration.get(scenario):
+            
+            # Read only the pairing and percentage saved columns of the typed statistics
+            statistics = read_statistics(
+                experiment_number,
+                columns=['agent_0_policies', 'agent_1_policies', 'percentage_saved']
+            )
+
+            # Extract the percentage saved 
+            if statistics is not None:
+                statistics = statistics.set_index(['agent_0_policies', 'agent_1_policies'])['percentage_saved']
+                policies = sorted(statistics.index.get_level_values(0).unique())
+                percentage_saved = [
+                    statistics.loc[(agent_0_policy, agent_1_policy)]
+                    for agent_0_policy, agent_1_policy in combinations_with_replacement(policies, 2)
+                ]
+            else:
+                df = pd.read_csv(f'./data/checkpoints/{experiment_number}/aggregated_statistics.csv')
+                percentage_saved = df[df['Description'] == 'Percentage Saved']['Statistic'].tolist()
+
+            # Compute mean
+            percentage_saved.append(np.mean(percentage_saved).round(2))
+
+            # Collect it in the aggregator
+            data.append(percentage_saved)
+
+    # Transpose the data so the pairings are in the rows and the pools are in column 
+    data = np.array(data).T
+
+    # Prepare columns
+    columns = ['Agent Pairing'] + ordering
+
+    # Convert into dataframe
+    tabular = pd.DataFrame(data, columns = columns)
+
+    # Generate latex table from dataframe
+    latex_table = tabular.to_latex(
+        index=False,
+        column_format='c'*data.shape[1],
+    )
+
+    file1 = open(f'{save_dir}/{observation_set}.txt', 'w')
+    file1.write(latex_table)
+    file1.close()
+
+    return [f'{save_dir}/{observation_set}.txt']
+
+
 if __name__=="__main__":
     
 
@@ -35,52 +105,23 @@ if __name__=="__main__":
 
     ordering =  ['greedy', 'prosocial', 'mixed #1', 'mixed #2'] * 2 
 
-    for observation_set in observation_sets.keys():
-        
-        # Storage for saving he percentage saved
-        data = []
-
-        # Insert the pairings
-        pairings = [f'{i},{j}' for i, j in combinations_with_replacement(range(6),2)]
-        data.append(pairings + ['Average'])
-        
-        for scenario in observation_sets.get(observation_set):
-
-            for experiment_number in observation_sets.get(observation_set).get(scenario):
-                
-                # Read the dataframe
-                df = pd.read_csv(f'./data/checkpoints/{experiment_number}/aggregated_statistics.csv')
-
-                # Extract the percentage saved 
-                percentage_saved = df[df['Description'] == 'Percentage Saved']['Statistic'].tolist()
-
-                # Compute mean
-                percentage_saved.append(np.mean(percentage_saved).round(2))
-
-                # Collect it in the aggregator
-                data.append(percentage_saved)
-
-        # Transpose the data so the pairings are in the rows and the pools are in column 
-        data = np.array(data).T
-
-        # Prepare columns
-        columns = ['Agent Pairing'] + ordering
-
-        # Convert into dataframe
-        tabular = pd.DataFrame(data, columns = columns)
-
-        # Generate latex table from dataframe
-        latex_table = tabular.to_latex(
-            index=False,
-            column_format='c'*data.shape[1],
+    save_dir = f'./data/tables/pooled_experiment'
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    # Tables are only rebuilt when their statistics, the table code or their configuration change
+    cache = ArtifactCache(f'{save_dir}/cache_manifest.json')
+
+    for observation_set, configuration in observation_sets.items():
+
+        cache.run(
+            name            = observation_set,
+            producer        = lambda: build_table(observation_set, configuration, ordering, save_dir),
+            inputs          = [
+                statistics_path(experiment_number) or f'./data/checkpoints/{experiment_number}/aggregated_statistics.csv'
+                for experiment_numbers in configuration.values()
+                for experiment_number in experiment_numbers
+            ],
+            dependencies    = [build_table],
+            parameters      = {'configuration': configuration, 'ordering': ordering},
         )
-
-        file1 = open(f'./data/tables/pooled_experiment/{observation_set}.txt', 'w')
-        file1.write(latex_table)
-        file1.close()
-
-        del data
-
-
-
-
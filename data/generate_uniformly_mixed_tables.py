@@ -3,12 +3,58 @@ import numpy as np
 import os
 
 from plot_utils import save_table
+from cache import ArtifactCache
 
 import sys
 sys.path.insert(1, os.getcwd())
 
+from evaluation_storage import read_statistics, statistics_path
+
 np.set_printoptions(precision=2)
 
+def build_table(
+    experiment,
+    configuration,
+    save_dir,
+    ):
+    """
+    Tabulates the percentage saved per sub scenario of the uniformly mixed experiments
+    :output outputs     paths of the written files
+    """
+    # Storage for saving he percentage saved
+    data = []
+    
+    for experiment_number in configuration.get('experiment_numbers'):
+        
+        # Read only the sub scenario and percentage saved columns of the typed statistics
+        statistics = read_statistics(experiment_number, columns=['sub_scenarios', 'percentage_saved'])
+
+        # Extract the results
+        if statistics is not None:
+            percentage_saved = statistics\
+                .sort_values('sub_scenarios')['percentage_saved']\
+                .round(2)\
+                .tolist()
+        else:
+            df = pd.read_csv(f'./data/checkpoints/{experiment_number}/subscenario_statistics.csv')
+            percentage_saved = pd.to_numeric(df[df['Description'] == 'Percentage Saved']['Statistic'])\
+                .round(2)\
+                .tolist()    
+
+        # Collect it in the aggregator
+        data.append(percentage_saved)
+
+    # Transpose the data so the pairings are in the rows and the pools are in column 
+    save_table(
+        data = np.array(data).T,
+        row_labels = np.array(configuration.get('row_labels')).reshape(-1,1),
+        column_labels = configuration.get('columns_labels'),
+        save_dir = f'{save_dir}/{experiment}.txt'
+    )
+
+    return [f'{save_dir}/{experiment}.txt']
+
+
 if __name__=="__main__":
     
     uniformly_mixed_experiments = {
@@ -24,34 +70,22 @@ if __name__=="__main__":
         },
     }
 
-    for experiment in uniformly_mixed_experiments.keys():
+    save_dir = f'./data/tables/uniformly_mixed'
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
 
-        save_dir = f'./data/tables/uniformly_mixed'
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-    
-        # Storage for saving he percentage saved
-        data = []
-        
-        for experiment_number in uniformly_mixed_experiments.get(experiment).get('experiment_numbers'):
-            
-            # Read the dataframe
-            df = pd.read_csv(f'./data/checkpoints/{experiment_number}/subscenario_statistics.csv')
-            
-            # Extract the results
-            percentage_saved = pd.to_numeric(df[df['Description'] == 'Percentage Saved']['Statistic'])\
-                .round(2)\
-                .tolist()    
+    # Tables are only rebuilt when their statistics, the table code or their configuration change
+    cache = ArtifactCache(f'{save_dir}/cache_manifest.json')
 
-            # Collect it in the aggregator
-            data.append(percentage_saved)
+    for experiment, configuration in uniformly_mixed_experiments.items():
 
-        # Transpose the data so the pairings are in the rows and the pools are in column 
-        save_table(
-            data = np.array(data).T,
-            row_labels = np.array(uniformly_mixed_experiments.get(experiment).get('row_labels')).reshape(-1,1),
-            column_labels = uniformly_mixed_experiments.get(experiment).get('columns_labels'),
-            save_dir = f'{save_dir}/{experiment}.txt'
+        cache.run(
+            name            = experiment,
+            producer        = lambda: build_table(experiment, configuration, save_dir),
+            inputs          = [
+                statistics_path(experiment_number) or f'./data/checkpoints/{experiment_number}/subscenario_statistics.csv'
+                for experiment_number in configuration.get('experiment_numbers')
+            ],
+            dependencies    = [build_table, save_table],
+            parameters      = configuration,
         )
-
-
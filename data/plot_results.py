@@ -1,243 +1,234 @@
 import numpy as np
-import seaborn as sns
 import pandas as pd
 import os
-sns.set_theme()
 
-from plot_utils import plot_confusion_matrix, plot_confusion_matrix_for_report, plot_confusion_matrix_for_report
+import experiment_statistics
+import render
+from cache import ArtifactCache
+from experiment_statistics import compute_outcomes, summarize, percentage_saved_by_rescue_amount, confusion_matrices
+from render import FigureJob, render_figures
 
 import sys
 sys.path.insert(1, os.getcwd())
 
-from trainer import setup
 from utils import get_args
-
-
-
-if __name__ == "__main__":
-    args = get_args()
-    config, stop = setup(args)
-
-    data = pd.read_csv(f'./data/checkpoints/{args.experiment_number}/experimental_data.csv')
-    root_dir = f'./data/report_images/{args.experiment_number}'
+from evaluation_storage import read_evaluations, write_statistics, evaluation_paths
+
+
+def load_data(
+    experiment_number
+    ):
+    return read_evaluations(
+        experiment_number,
+        columns = ['trials', 'scenario', 'sub_scenarios', 'rescue_amount', 'agent 0 actions', 'agent 1 actions'],
+    )
+
+
+def sub_scenario_dir(
+    root_dir,
+    sub_scenario,
+    ):
+    """
+    Generate the directories for saving results
+    """
+    if sub_scenario != 'not applicable':
+        save_dir = f'{root_dir}/{sub_scenario}'
+    else:
+        save_dir = root_dir
+
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    return save_dir
+
+
+def produce_statistics(
+    data,
+    root_dir,
+    experiment_number,
+    beta,
+    ):
+    """
+    Computes and saves the statistics tables of an experiment
+    :output outputs     paths of the written files
+    """
+    outputs = []
+
+    # Compute the outcome of every episode with column operations
+    outcomes = compute_outcomes(data)
+    scenario = data['scenario'].unique()[0]
+
+    # Statistics of every sub scenario, and of the rescue amounts within it, in one groupby each
+    subscenario_summaries = summarize(outcomes, keys=['sub_scenarios']).set_index('sub_scenarios')
+    rescue_amount_summaries = percentage_saved_by_rescue_amount(outcomes, keys=['sub_scenarios'])
+
+    # Store the typed statistics for the table generators
+    outputs.append(write_statistics(subscenario_summaries.reset_index(), experiment_number))
 
     # Allocate Storage
     subscenario_statistics = []
 
-    aggregated_percentage_of_rescue_amount_if_saved    = []
-    aggregate_percentage_saved_by_rescue_amount        = []
-    aggregated_dominant_contributions                  = []
-    aggregated_non_dominant_contributions              = []
-    aggregated_number_of_rescues                       = 0
-    total_number_of_samples                            = len(data)
-
-    
-
     for sub_scenario in sorted(data['sub_scenarios'].unique()):
 
-        # Generate the directories for saving results
-        if sub_scenario != 'not applicable':
-            save_dir = f'{root_dir}/{sub_scenario}'
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-        else:
-            save_dir = root_dir
-            if not os.path.exists(save_dir):
-                os.makedirs(save_dir)
-
-        subscenario_dataset = data[data['sub_scenarios'] == sub_scenario]
-
-        # Plot Agent 0's confusion matrix
-        plot_confusion_matrix_for_report(
-            allocations     = subscenario_dataset['agent 0 actions'], 
-            rescue_amounts  = subscenario_dataset['rescue_amount'], 
-            save_dir        = save_dir,
-            title           = 'Agent 0 Confusion Matrix',
-            n_rows          = args.maximum_rescue_amount,
-            n_cols          = args.maximum_rescue_amount
-        )
-
-        # Plot Agent 1's confusion matrix
-        plot_confusion_matrix_for_report(
-            allocations     = subscenario_dataset['agent 1 actions'],
-            rescue_amounts  = subscenario_dataset['rescue_amount'],
-            save_dir        = save_dir,
-            title           = 'Agent 1 Confusion Matrix',
-            n_rows          = args.maximum_rescue_amount,
-            n_cols          = args.maximum_rescue_amount
-
-        )
-
-        # Plot confusion matrices per trial
-
-        for trial in sorted(data['trials'].unique()):
-
-            trial_subdataset = subscenario_dataset[subscenario_dataset['trials'] == trial]
-            trial_save_dir = f'{save_dir}/{trial}'
-            if not os.path.exists(trial_save_dir):
-                os.makedirs(trial_save_dir)
-
-            # Plot Agent 0's confusion matrix
-            plot_confusion_matrix_for_report(
-                allocations     = trial_subdataset['agent 0 actions'], 
-                rescue_amounts  = trial_subdataset['rescue_amount'], 
-                save_dir        = trial_save_dir,
-                title           = 'Agent 0 Confusion Matrix',
-                n_rows          = args.maximum_rescue_amount,
-                n_cols          = args.maximum_rescue_amount
-            )
-
-            # Plot Agent 1's confusion matrix
-            plot_confusion_matrix_for_report(
-                allocations     = trial_subdataset['agent 1 actions'],
-                rescue_amounts  = trial_subdataset['rescue_amount'],
-                save_dir        = trial_save_dir,
-                title           = 'Agent 1 Confusion Matrix',
-                n_rows          = args.maximum_rescue_amount,
-                n_cols          = args.maximum_rescue_amount
-
-            )
-
-
-
-        # Prepare the data for the table plotting
-        percentage_of_rescue_amount_if_saved    = []
-        dominant_contributions                  = []
-        non_dominant_contributions              = []
-        percentage_saved_by_rescue_amount       = {}
-
-        # Insert a key per rescue amount
-        for rescue_amount in sorted(subscenario_dataset['rescue_amount'].unique()):
-            percentage_saved_by_rescue_amount[rescue_amount] = []
-
-        number_of_rescues                       = 0
-        scenario                                = data['scenario'].unique()[0]
-        number_of_samples                       = len(subscenario_dataset)
-        agent_0_contribution                    = subscenario_dataset['agent 0 actions']
-        agent_1_contribution                    = subscenario_dataset['agent 1 actions']
-        total_contribution                      = agent_0_contribution + agent_1_contribution
-        
-
-        # Iterate through every row and calculate statistics
-        for index, row in subscenario_dataset.iterrows():
-            agent_0_contribution = row['agent 0 actions']
-            agent_1_contribution = row['agent 1 actions']
-            rescue_amount = row['rescue_amount']
-            total_contribution = agent_0_contribution + agent_1_contribution
-    
-            # In 'not in default' subscenario, the rescue amount is always 0
-            # thus, no rescue occurs unless the agents allocate larger than 0 assets
-            if sub_scenario in 'not in default' or scenario in 'not in default' :
-                if total_contribution > rescue_amount:
-                    number_of_rescues += 1
-            else:
-                # Total_contribution has to be greater than the rescue amount
-                if total_contribution >= rescue_amount:
-                    number_of_rescues += 1
-
-            # TODO: This number breaks in 'not in default" as the rescue amount is always 0
-            if  total_contribution >= rescue_amount and rescue_amount != 0:
-                percentage_of_rescue_amount_if_saved.append( total_contribution / rescue_amount)
-                percentage_saved_by_rescue_amount[rescue_amount].append(1.0)
-            else:
-                percentage_saved_by_rescue_amount[rescue_amount].append(0.0)
-            
-            # Calculate contributions
-            if total_contribution == 0:
-                dominant_contributions.append(0.50)
-                non_dominant_contributions.append(0.50)
-            elif agent_1_contribution > agent_0_contribution:
-                dominant_contributions.append(agent_1_contribution / total_contribution)
-                non_dominant_contributions.append(agent_0_contribution / total_contribution)
-            else:
-                dominant_contributions.append(agent_0_contribution / total_contribution)
-                non_dominant_contributions.append(agent_1_contribution / total_contribution)
-
-            pass    
-
+        save_dir = sub_scenario_dir(root_dir, sub_scenario)
 
         # Prepare percentage saved by rescue amount
-        percentage_saved_by_rescue_amount_table = []
-        for rescue_amount in percentage_saved_by_rescue_amount.keys():
-            percentage_saved_by_rescue_amount_table.append( 
-                [f'{sub_scenario}-{rescue_amount}',np.mean(percentage_saved_by_rescue_amount[rescue_amount])]
-            )
-
-        df = pd.DataFrame.from_records(percentage_saved_by_rescue_amount_table)
-        df.columns = ["Sub scenario - rescue amount", "Percentage Saved"]
+        subscenario_rescue_amounts = rescue_amount_summaries[rescue_amount_summaries['sub_scenarios'] == sub_scenario]
+        df = pd.DataFrame({
+            "Sub scenario - rescue amount": [f'{sub_scenario}-{rescue_amount}' for rescue_amount in subscenario_rescue_amounts['rescue_amount']],
+            "Percentage Saved": subscenario_rescue_amounts['percentage_saved'].to_numpy(),
+        })
 
         df.to_csv(
-            f'{save_dir}/percentage_saved_by_rescue_amount.csv', 
+            f'{save_dir}/percentage_saved_by_rescue_amount.csv',
             index=False,
-        ) 
-
-
-        # Append to aggregated dataset
-        aggregated_number_of_rescues += number_of_rescues
-        aggregated_dominant_contributions.extend(dominant_contributions)
-        aggregated_non_dominant_contributions.extend(non_dominant_contributions)
-        aggregated_percentage_of_rescue_amount_if_saved.extend(percentage_of_rescue_amount_if_saved)
-
+        )
+        outputs.append(f'{save_dir}/percentage_saved_by_rescue_amount.csv')
 
         # Prepare statistics
+        summary = subscenario_summaries.loc[sub_scenario]
         table_data = [
-            ["Percentage Saved", f'{number_of_rescues/ number_of_samples}'],
-            ["Average percentage of rescue amount if rescued", f'{np.mean(percentage_of_rescue_amount_if_saved)}'],
-            ['Average Dominant Contribution', f'{np.mean(dominant_contributions)}'],
-            ['Average Non-Dominant Contribution', f'{np.mean(non_dominant_contributions)}'],
+            ["Percentage Saved", f'{summary["percentage_saved"]}'],
+            ["Average percentage of rescue amount if rescued", f'{summary["average_percentage_of_rescue_amount"]}'],
+            ['Average Dominant Contribution', f'{summary["average_dominant_contribution"]}'],
+            ['Average Non-Dominant Contribution', f'{summary["average_non_dominant_contribution"]}'],
             ['Scenario', f'{scenario}'],
             ['Sub scenario', f'{sub_scenario}'],
-            ['Beta', args.beta],
+            ['Beta', beta],
         ]
-        
+
         df = pd.DataFrame.from_records(table_data)
         df.columns = ["Description", "Statistic"]
 
         df.to_csv(
-            f'{save_dir}/statistics.csv', 
+            f'{save_dir}/statistics.csv',
             index=False,
-        ) 
-
+        )
+        outputs.append(f'{save_dir}/statistics.csv')
 
         # Aggregate statistics
         for name, statistic in table_data:
             subscenario_statistics.append([sub_scenario, name, statistic])
 
 
-        
-    
     if len(data['sub_scenarios'].unique()) > 1:
 
-
         # Svae sub scenario statistics into a csv
         df = pd.DataFrame.from_records(subscenario_statistics)
         df.columns = ["Sub Scenario", "Description", "Statistic"]
 
         df.to_csv(
-            f'{root_dir}/subscenario_statistics.csv', 
+            f'{root_dir}/subscenario_statistics.csv',
             index=False,
-        ) 
+        )
+        outputs.append(f'{root_dir}/subscenario_statistics.csv')
 
         # Prepare, plot, and save aggregated statistics
+        aggregated_summary = summarize(outcomes).iloc[0]
         aggregated_table_data = [
-            ["Aggregated Percentage Saved", f'{aggregated_number_of_rescues/ total_number_of_samples}'],
-            ["Aggregated Average percentage of rescue amount if rescued", f'{np.mean(aggregated_percentage_of_rescue_amount_if_saved)}'],
-            ['Aggregated Average Dominant Contribution', f'{np.mean(aggregated_dominant_contributions)}'],
-            ['Aggregated Average Non-Dominant Contribution', f'{np.mean(aggregated_non_dominant_contributions)}'],
+            ["Aggregated Percentage Saved", f'{aggregated_summary["percentage_saved"]}'],
+            ["Aggregated Average percentage of rescue amount if rescued", f'{aggregated_summary["average_percentage_of_rescue_amount"]}'],
+            ['Aggregated Average Dominant Contribution', f'{aggregated_summary["average_dominant_contribution"]}'],
+            ['Aggregated Average Non-Dominant Contribution', f'{aggregated_summary["average_non_dominant_contribution"]}'],
             ['Scenario', f'{scenario}'],
-            ['Beta', args.beta],
+            ['Beta', beta],
         ]
 
         df = pd.DataFrame.from_records(aggregated_table_data)
         df.columns = ["Description", "Statistic"]
 
         df.to_csv(
-            f'{root_dir}/aggregated_statistics.csv', 
+            f'{root_dir}/aggregated_statistics.csv',
             index=False,
-        ) 
+        )
+        outputs.append(f'{root_dir}/aggregated_statistics.csv')
+
+    return outputs
+
+
+def produce_figures(
+    data,
+    root_dir,
+    maximum_rescue_amount,
+    n_workers,
+    ):
+    """
+    Computes every confusion matrix up front and renders the figures whose matrices changed
+    :output outputs     paths of the rendered files
+    """
+    n_rows = n_cols = maximum_rescue_amount
+    empty_matrix = np.zeros((n_rows, n_cols))
+    subscenario_matrices = {
+        agent: confusion_matrices(data, ['sub_scenarios'], f'agent {agent} actions', n_rows, n_cols)
+        for agent in [0, 1]
+    }
+    trial_matrices = {
+        agent: confusion_matrices(data, ['sub_scenarios', 'trials'], f'agent {agent} actions', n_rows, n_cols)
+        for agent in [0, 1]
+    }
+    jobs = []
 
+    for sub_scenario in sorted(data['sub_scenarios'].unique()):
 
- 
+        save_dir = sub_scenario_dir(root_dir, sub_scenario)
 
+        # Queue the confusion matrices of the sub scenario and of every trial within it
+        for agent in [0, 1]:
+            jobs.append(FigureJob(
+                kind        = 'confusion_matrix_for_report',
+                data        = subscenario_matrices[agent][sub_scenario],
+                save_dir    = save_dir,
+                title       = f'Agent {agent} Confusion Matrix',
+            ))
 
+        for trial in sorted(data['trials'].unique()):
 
+            trial_save_dir = f'{save_dir}/{trial}'
+
+            for agent in [0, 1]:
+                jobs.append(FigureJob(
+                    kind        = 'confusion_matrix_for_report',
+                    data        = trial_matrices[agent].get((sub_scenario, trial), empty_matrix),
+                    save_dir    = trial_save_dir,
+                    title       = f'Agent {agent} Confusion Matrix',
+                ))
+
+    # Render the figures whose confusion matrices changed
+    render_figures(
+        jobs,
+        manifest_path   = f'{root_dir}/render_manifest.json',
+        n_workers       = n_workers,
+    )
+
+    return [path for job in jobs for path in render.output_paths(job)]
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    root_dir = f'./data/report_images/{args.experiment_number}'
+    cache = ArtifactCache(f'{root_dir}/cache_manifest.json')
+    inputs = evaluation_paths(args.experiment_number)
+
+    # The evaluation data is only loaded if an artifact has to be recomputed
+    loaded = {}
+    def data():
+        if 'data' not in loaded:
+            loaded['data'] = load_data(args.experiment_number)
+        return loaded['data']
+
+    cache.run(
+        name            = 'statistics',
+        producer        = lambda: produce_statistics(data(), root_dir, args.experiment_number, args.beta),
+        inputs          = inputs,
+        dependencies    = [produce_statistics, experiment_statistics],
+        parameters      = {'beta': args.beta},
+    )
+
+    cache.run(
+        name            = 'figures',
+        producer        = lambda: produce_figures(data(), root_dir, args.maximum_rescue_amount, args.render_workers),
+        inputs          = inputs,
+        dependencies    = [produce_figures, experiment_statistics, render, render.RENDERER_PATH],
+        parameters      = {'maximum_rescue_amount': args.maximum_rescue_amount},
+    )
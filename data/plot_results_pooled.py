@@ -1,27 +1,68 @@
-import numpy as np
 import pandas as pd
 import os
 
 import sys
 sys.path.insert(1, os.getcwd())
 
-from trainer import setup
 from utils import get_args
+from evaluation_storage import read_evaluations, write_statistics, evaluation_paths
 
-from plot_utils import plot_confusion_matrix, plot_table, plot_confusion_matrix_for_report
+from experiment_statistics import compute_outcomes, summarize, percentage_saved_by_rescue_amount, confusion_matrices, confusion_matrix
+from render import FigureJob, render_figures
+from cache import ArtifactCache
+import experiment_statistics
+import render
 from itertools import combinations_with_replacement
 
-if __name__ == "__main__":
-    args = get_args()
-    config, stop = setup(args)
+def load_data(
+    experiment_number
+    ):
+    return read_evaluations(
+        experiment_number,
+        columns = [
+            'rescue_amount',
+            'agent 0 actions',
+            'agent 1 actions',
+            'agent_0_policies',
+            'agent_1_policies',
+            'agent 0 betas',
+            'agent 1 betas',
+        ],
+    )
 
-    master_dataset = pd.read_csv(f'./data/checkpoints/{args.experiment_number}/experimental_data.csv')
-    root_dir = f'./data/report_images/{args.experiment_number}'
 
+def produce_results(
+    master_dataset,
+    root_dir,
+    experiment_number,
+    maximum_rescue_amount,
+    n_workers,
+    ):
+    """
+    Computes and saves the statistics and figures of every policy pairing
+    :output outputs     paths of the written files
+    """
     # Allocate Storage
     aggregated_statistics   = []
     policies                = pd.unique(master_dataset[['agent_0_policies','agent_1_policies']].values.ravel())
 
+    # Compute the statistics of every policy pairing in one groupby
+    outcomes                = compute_outcomes(master_dataset, strict_not_in_default=False)
+    pairing_keys            = ['agent_0_policies', 'agent_1_policies']
+    summaries               = summarize(outcomes, keys=pairing_keys).set_index(pairing_keys)
+    rescue_amount_summaries = percentage_saved_by_rescue_amount(outcomes, keys=pairing_keys)
+
+    # Store the typed statistics for the table generators
+    outputs = [write_statistics(summaries.reset_index(), experiment_number)]
+
+    # Compute every confusion matrix up front; the figures are rendered together at the end
+    n_rows = n_cols = maximum_rescue_amount
+    pairing_matrices = {
+        agent: confusion_matrices(master_dataset, pairing_keys, f'agent {agent} actions', n_rows, n_cols)
+        for agent in [0, 1]
+    }
+    jobs = []
+
     for agent_0_policy, agent_1_policy in combinations_with_replacement(policies, 2):
         
         data = master_dataset[
@@ -37,71 +78,30 @@ if __name__ == "__main__":
         if not os.path.exists(save_dir):
             os.makedirs(save_dir)
 
-        # Plot Agent 0's confusion matrix
-        plot_confusion_matrix_for_report(
-            allocations     = data['agent 0 actions'], 
-            rescue_amounts  = data['rescue_amount'], 
-            save_dir        = save_dir,
-            title           = f'Agent 0 Confusion Matrix - beta={agent_0_beta}',
-            n_rows          = args.maximum_rescue_amount,
-            n_cols          = args.maximum_rescue_amount
-        )
-
-        # Plot Agent 1's confusion matrix
-        plot_confusion_matrix_for_report(
-            allocations     = data['agent 1 actions'],
-            rescue_amounts  = data['rescue_amount'],
-            save_dir        = save_dir,
-            title           = f'Agent 1 Confusion Matrix - beta={agent_1_beta}',
-            n_rows          = args.maximum_rescue_amount,
-            n_cols          = args.maximum_rescue_amount
-        )
-
-        # Prepare the data for the table plotting
-        percentage_of_rescue_amount_if_saved    = []
-        dominant_contributions                  = []
-        non_dominant_contributions              = []
-        percentage_saved_by_rescue_amount       = {}
-
-        # Insert a key per rescue amount
-        for rescue_amount in sorted(data['rescue_amount'].unique()):
-            percentage_saved_by_rescue_amount[rescue_amount] = []
-
-
-        number_of_samples = len(data)
-        number_of_rescues = ((data['agent 0 actions'] + data['agent 1 actions']) >= data['rescue_amount']).sum()
-
-        # Iterate through every row and calculate statistics
-        for index, row in data.iterrows():
-            agent_0_contribution = row['agent 0 actions']
-            agent_1_contribution = row['agent 1 actions']
-            rescue_amount = row['rescue_amount']
-            total_contribution = agent_0_contribution + agent_1_contribution
-
-            if  total_contribution >= rescue_amount and rescue_amount != 0:
-                percentage_of_rescue_amount_if_saved.append( total_contribution / rescue_amount)
-                percentage_saved_by_rescue_amount[rescue_amount].append(1.0)
-            else:
-                percentage_saved_by_rescue_amount[rescue_amount].append(0.0)
-
-            
-            # Calculate contributions
-            if total_contribution == 0:
-                dominant_contributions.append(0.50)
-                non_dominant_contributions.append(0.50)
-            elif agent_1_contribution > agent_0_contribution:
-                dominant_contributions.append(agent_1_contribution / total_contribution)
-                non_dominant_contributions.append(agent_0_contribution / total_contribution)
-            else:
-                dominant_contributions.append(agent_0_contribution / total_contribution)
-                non_dominant_contributions.append(agent_1_contribution / total_contribution)
+        # Queue the confusion matrices of the pairing
+        jobs.append(FigureJob(
+            kind        = 'confusion_matrix_for_report',
+            data        = pairing_matrices[0][(agent_0_policy, agent_1_policy)],
+            save_dir    = save_dir,
+            title       = f'Agent 0 Confusion Matrix - beta={agent_0_beta}',
+        ))
+        jobs.append(FigureJob(
+            kind        = 'confusion_matrix_for_report',
+            data        = pairing_matrices[1][(agent_0_policy, agent_1_policy)],
+            save_dir    = save_dir,
+            title       = f'Agent 1 Confusion Matrix - beta={agent_1_beta}',
+        ))
 
         # Prepare percentage saved by rescue amount
-        percentage_saved_by_rescue_amount_table = []
-        for rescue_amount in percentage_saved_by_rescue_amount.keys():
-            percentage_saved_by_rescue_amount_table.append( 
-                [f'percentage saved by rescue amount - {rescue_amount}',np.mean(percentage_saved_by_rescue_amount[rescue_amount])]
-            )
+        summary = summaries.loc[(agent_0_policy, agent_1_policy)]
+        pairing_rescue_amounts = rescue_amount_summaries[
+            (rescue_amount_summaries['agent_0_policies'] == agent_0_policy) &\
+            (rescue_amount_summaries['agent_1_policies'] == agent_1_policy) \
+        ]
+        percentage_saved_by_rescue_amount_table = [
+            [f'percentage saved by rescue amount - {rescue_amount}', percentage_saved]
+            for rescue_amount, percentage_saved in zip(pairing_rescue_amounts['rescue_amount'], pairing_rescue_amounts['percentage_saved'])
+        ]
         
         df = pd.DataFrame.from_records(percentage_saved_by_rescue_amount_table)
         df.columns = ["Percentage saved by rescue amount", "Percentage Saved"]
@@ -110,22 +110,24 @@ if __name__ == "__main__":
             f'{save_dir}/percentage_saved_by_rescue_amount.csv', 
             index=False,
         ) 
+        outputs.append(f'{save_dir}/percentage_saved_by_rescue_amount.csv')
 
         # Prepare statistics
         table_data = [
-            ["Percentage Saved", f'{number_of_rescues/ number_of_samples}'],
-            ["Average percentage of rescue amount if rescued", f'{np.mean(percentage_of_rescue_amount_if_saved)}'],
-            ['Average Dominant Contribution', f'{np.mean(dominant_contributions)}'],
-            ['Average Non-Dominant Contribution', f'{np.mean(non_dominant_contributions)}'],
+            ["Percentage Saved", f'{summary["percentage_saved"]}'],
+            ["Average percentage of rescue amount if rescued", f'{summary["average_percentage_of_rescue_amount"]}'],
+            ['Average Dominant Contribution', f'{summary["average_dominant_contribution"]}'],
+            ['Average Non-Dominant Contribution', f'{summary["average_non_dominant_contribution"]}'],
             ['Agent 0 Beta', agent_0_beta],
             ['Agent 1 Beta', agent_1_beta],
         ]
 
-        plot_table(
-            data            = table_data,
-            save_dir        = save_dir,
-            title           = 'Statistics'
-        )
+        jobs.append(FigureJob(
+            kind        = 'table',
+            data        = table_data,
+            save_dir    = save_dir,
+            title       = 'Statistics',
+        ))
 
         # Aggregate statistics
         for name, statistic in table_data:
@@ -154,22 +156,48 @@ if __name__ == "__main__":
         f'{root_dir}/aggregated_statistics.csv', 
         index=False,
     )  
+    outputs.append(f'{root_dir}/aggregated_statistics.csv')
 
     # Plot aggregated table
-    plot_confusion_matrix_for_report(
-        allocations     = master_dataset['agent 0 actions'], 
-        rescue_amounts  = master_dataset['rescue_amount'], 
-        save_dir        = root_dir,
-        title           = 'Aggregated Agent 0 Confusion Matrix',
-        n_rows          = args.maximum_rescue_amount,
-        n_cols          = args.maximum_rescue_amount
+    for agent in [0, 1]:
+        jobs.append(FigureJob(
+            kind        = 'confusion_matrix_for_report',
+            data        = confusion_matrix(
+                master_dataset[f'agent {agent} actions'],
+                master_dataset['rescue_amount'],
+                n_rows,
+                n_cols,
+            ),
+            save_dir    = root_dir,
+            title       = f'Aggregated Agent {agent} Confusion Matrix',
+        ))
+
+    # Render the figures whose inputs changed
+    render_figures(
+        jobs,
+        manifest_path   = f'{root_dir}/render_manifest.json',
+        n_workers       = n_workers,
     )
 
-    plot_confusion_matrix_for_report(
-        allocations     = master_dataset['agent 1 actions'], 
-        rescue_amounts  = master_dataset['rescue_amount'], 
-        save_dir        = root_dir,
-        title           = 'Aggregated Agent 1 Confusion Matrix',
-        n_rows          = args.maximum_rescue_amount,
-        n_cols          = args.maximum_rescue_amount
+    return outputs + [path for job in jobs for path in render.output_paths(job)]
+
+
+if __name__ == "__main__":
+    args = get_args()
+
+    root_dir = f'./data/report_images/{args.experiment_number}'
+    cache = ArtifactCache(f'{root_dir}/cache_manifest.json')
+
+    cache.run(
+        name            = 'results',
+        producer        = lambda: produce_results(
+            load_data(args.experiment_number),
+            root_dir,
+            args.experiment_number,
+            args.maximum_rescue_amount,
+            args.render_workers,
+        ),
+        inputs          = evaluation_paths(args.experiment_number),
+        dependencies    = [produce_results, experiment_statistics, render, render.RENDERER_PATH],
+        parameters      = {'maximum_rescue_amount': args.maximum_rescue_amount},
     )
@@ -1,8 +1,27 @@
-import seaborn as sns
-from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
-sns.set_theme()
+from experiment_statistics import confusion_matrix as compute_confusion_matrix
+
+# Whether seaborn's theme was applied
+THEME_SET = False
+
+
+def plotting():
+    """
+    Imports matplotlib and seaborn on first use, so the table scripts do not pay for them
+    :output plt, sns
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    from matplotlib import pyplot as plt
+
+    global THEME_SET
+    if not THEME_SET:
+        sns.set_theme()
+        THEME_SET = True
+
+    return plt, sns
 
 
 def plot_confusion_matrix(
@@ -11,13 +30,23 @@ def plot_confusion_matrix(
     save_dir,
     title,
     n_rows = 8,
-    n_cols = 8
+    n_cols = 8,
+    with_labels = True,
     ):
 
-    confusion_matrix = np.zeros((n_rows, n_cols))
-    for actual,optimal in zip(allocations, rescue_amounts):
-            if actual < n_rows:
-                confusion_matrix[int(actual),int(optimal)] += 1
+    confusion_matrix = compute_confusion_matrix(allocations, rescue_amounts, n_rows, n_cols)
+
+    render_confusion_matrix(confusion_matrix, save_dir, title, with_labels)
+
+
+def render_confusion_matrix(
+    confusion_matrix,
+    save_dir,
+    title,
+    with_labels = True,
+    ):
+    plt, sns = plotting()
+    n_rows, n_cols = confusion_matrix.shape
 
     df_cm = pd.DataFrame(confusion_matrix, index = [i for i in range(n_rows)],
                       columns = [i for i in range(n_cols)])
@@ -39,9 +68,10 @@ def plot_confusion_matrix(
     sns.heatmap((pd.DataFrame(df_cm.sum(axis=0))).transpose(), ax=ax2,  annot=True, cmap="Blues", cbar=False, xticklabels=False, yticklabels=False)
     sns.heatmap(pd.DataFrame(df_cm.sum(axis=1)), ax=ax3,  annot=True, cmap="Blues", cbar=False, xticklabels=False, yticklabels=False)
 
-    plt.savefig(
-        f'{save_dir}/{title}_with_labels.png',
-    )
+    if with_labels:
+        plt.savefig(
+            f'{save_dir}/{title}_with_labels.png',
+        )
 
     ax1.set(xlabel='', ylabel='')
     ax1.set_title('')
@@ -63,10 +93,18 @@ def plot_confusion_matrix_for_report(
     n_cols = 8
     ):
 
-    confusion_matrix = np.zeros((n_rows, n_cols))
-    for actual,optimal in zip(allocations, rescue_amounts):
-            if actual < n_rows:
-                confusion_matrix[int(actual),int(optimal)] += 1
+    confusion_matrix = compute_confusion_matrix(allocations, rescue_amounts, n_rows, n_cols)
+
+    render_confusion_matrix_for_report(confusion_matrix, save_dir, title)
+
+
+def render_confusion_matrix_for_report(
+    confusion_matrix,
+    save_dir,
+    title,
+    ):
+    plt, sns = plotting()
+    n_rows, n_cols = confusion_matrix.shape
 
     df_cm = pd.DataFrame(confusion_matrix, index = [i for i in range(n_rows)],
                       columns = [i for i in range(n_cols)])
@@ -97,6 +135,7 @@ def plot_table(
         save_dir,
         title, 
     ):
+    plt, sns = plotting()
     fig, ax =plt.subplots(1,1)    
     ax.axis('tight')
     ax.axis('off')
@@ -113,6 +152,8 @@ def line_plot_with_variances(
     save_dir,
     ):
 
+    plt, sns = plotting()
+
     df = pd.DataFrame(data)
     sns.lineplot(data=df, x='Beta', y='Dominant Contributions', hue='Scenario')
     plt.title("Beta x Dominant Contributions")
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# A figure to render: the kind of figure, its precomputed input data, where and under which title it is saved
+FigureJob = namedtuple('FigureJob', ['kind', 'data', 'save_dir', 'title'])
+
+# Files written by each kind of figure
+OUTPUTS = {
+    'confusion_matrix':             ['{title}_with_labels.png', '{title}_without_labels.png'],
+    'confusion_matrix_for_report':  ['{title}_without_labels.png'],
+    'table':                        ['{title}.png'],
+}
+
+
+# Source file of the functions drawing the figures
+RENDERER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plot_utils.py')
+
+
+def figure_hash(
+    job,
+    renderer_version = '',
+    ):
+    """
+    Hashes everything which determines the content of a figure
+    """
+    digest = hashlib.sha1()
+    digest.update(renderer_version.encode())
+    digest.update(job.kind.encode())
+    digest.update(job.title.encode())
+
+    if isinstance(job.data, np.ndarray):
+        digest.update(str(job.data.shape).encode())
+        digest.update(np.ascontiguousarray(job.data, dtype=float).tobytes())
+    else:
+        digest.update(json.dumps(job.data, default=str).encode())
+
+    return digest.hexdigest()
+
+
+def output_paths(
+    job
+    ):
+    return [f'{job.save_dir}/{name.format(title=job.title)}' for name in OUTPUTS[job.kind]]
+
+
+def render_figure(
+    job
+    ):
+    """
+    Renders a single figure; executed in the worker processes
+    """
+    from plot_utils import render_confusion_matrix, render_confusion_matrix_for_report, plot_table
+
+    if not os.path.exists(job.save_dir):
+        os.makedirs(job.save_dir)
+
+    if job.kind == 'confusion_matrix':
+        render_confusion_matrix(job.data, job.save_dir, job.title)
+    elif job.kind == 'confusion_matrix_for_report':
+        render_confusion_matrix_for_report(job.data, job.save_dir, job.title)
+    elif job.kind == 'table':
+        plot_table(job.data, job.save_dir, job.title)
+    else:
+        assert False, f'"{job.kind}" is not a valid figure'
+
+    return output_paths(job)
+
+
+def render_figures(
+    jobs,
+    manifest_path,
+    n_workers = 1,
+    ):
+    """
+    Renders the figures whose input data changed since they were last rendered
+    :args   jobs            list of FigureJobs with precomputed input data
+    :args   manifest_path   json file storing the input hash of every rendered figure
+    :args   n_workers       number of processes rendering figures in parallel
+    :output rendered        number of figures which were rendered
+    """
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    # Figures are also redrawn when the plotting code changes
+    with open(RENDERER_PATH, 'rb') as f:
+        renderer_version = hashlib.sha1(f.read()).hexdigest()
+
+    # Skip figures whose inputs are unchanged and whose outputs exist
+    pending = []
+    for job in jobs:
+        key = output_paths(job)[0]
+        if  manifest.get(key) == figure_hash(job, renderer_version) and\
+            all(os.path.exists(path) for path in output_paths(job)):
+            continue
+        pending.append(job)
+
+    if n_workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(render_figure, pending, chunksize=max(1, len(pending) // (4 * n_workers))))
+    else:
+        for job in pending:
+            render_figure(job)
+
+    # Record the rendered figures
+    for job in pending:
+        manifest[output_paths(job)[0]] = figure_hash(job, renderer_version)
+
+    manifest_dir = os.path.dirname(manifest_path)
+    if manifest_dir and not os.path.exists(manifest_dir):
+        os.makedirs(manifest_dir)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    return len(pending)
@@ -0,0 +1,376 @@
+import numpy as np
+
+
+# Every graph of a scenario is drawn by rejection sampling: a proposal is sampled from uniform and
+# multinomial draws and redrawn until it passes the scenario's verifications.  The distribution of
+# the generated graphs is thus the proposal distribution restricted to the valid graphs, which is
+# enumerated below scenario by scenario, following the generators of generator.py.
+
+
+def log_factorials(
+    n,
+    ):
+    """
+    Returns log(k!) for k = 0, ..., n
+    """
+    return np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, n + 1)))])
+
+
+def multinomial_log_pmf(
+    counts,
+    log_factorial,
+    ):
+    """
+    Log probability of the counts under a multinomial with equal cell probabilities
+    :args   counts          (n, n_cells) counts of each cell
+    :args   log_factorial   table of log_factorials
+    """
+    counts  = np.asarray(counts, dtype=np.int64)
+    total   = counts.sum(axis=1)
+    return log_factorial[total] - log_factorial[counts].sum(axis=1) - total * np.log(counts.shape[1])
+
+
+def compositions(
+    maximum,
+    n_parts,
+    ):
+    """
+    Returns every tuple of n_parts non-negative integers summing to at most maximum
+    """
+    grid = np.stack(np.meshgrid(*[np.arange(maximum + 1)] * n_parts, indexing='ij'), axis=-1).reshape(-1, n_parts)
+    return grid[grid.sum(axis=1) <= maximum]
+
+
+def with_debts(
+    positions,
+    log_probabilities,
+    config,
+    rescue_amount,
+    debts               = None,
+    positive_incentives = True,
+    ):
+    """
+    Expands positions into every split of the distressed bank's debt across the two agents
+    The debt is split with a fair binomial draw, as every generator does; graphs failing the
+    adjacency matrix verifications are dropped.
+    :args   positions           (n, 3) capital of the agents and of the distressed bank
+    :args   log_probabilities   (n,) log probability of the positions
+    :args   debts               (n,) debt owed by the distressed bank; defaults to its capital plus the rescue amount
+    :output positions           (n_graphs, 3) positions
+    :output adjacency_matrices  (n_graphs, 3, 3) debts owed by the row to the column entity
+    :output log_probabilities   (n_graphs,) log probability of the graphs
+    """
+    max_system_value    = config['max_system_value']
+    haircut_multiplier  = config['haircut_multiplier']
+
+    if debts is None:
+        debts = positions[:, 2] + rescue_amount
+    debts = np.asarray(debts, dtype=np.int64)
+
+    # One row per position and amount owed to agent 0
+    rows    = np.repeat(np.arange(len(positions)), debts + 1)
+    starts  = np.repeat(np.cumsum(debts + 1) - (debts + 1), debts + 1)
+    owed    = np.arange(len(rows)) - starts
+    owed    = np.stack([owed, debts[rows] - owed], axis=1).astype(float)
+    del starts
+
+    # 'all entries in adjacency matrix less than system max'
+    valid = (owed < max_system_value).all(axis=1)
+
+    # 'both agents have positive incentives', computed as Generator.verify does
+    if positive_incentives:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            proportion_of_allocation = owed / owed.sum(axis=1, keepdims=True)
+            not_saved_rewards = positions[rows, 2:3].astype(float) * haircut_multiplier * proportion_of_allocation
+            saved_rewards = owed - rescue_amount
+            valid &= (saved_rewards - not_saved_rewards > 0).all(axis=1)
+            del proportion_of_allocation, not_saved_rewards, saved_rewards
+
+    # Only the valid graphs are materialized
+    rows, owed = rows[valid], owed[valid]
+
+    log_factorial = log_factorials(int(debts.max(initial=0)))
+
+    adjacency_matrices = np.zeros((len(rows), 3, 3))
+    adjacency_matrices[:, 2, :2] = owed
+
+    return (
+        positions[rows].astype(float),
+        adjacency_matrices,
+        log_probabilities[rows] + multinomial_log_pmf(owed, log_factorial),
+    )
+
+
+def both_agents_can_rescue(
+    config,
+    rescue_amount,
+    ):
+    """
+    The system's capital is uniform below the maximum system value and split evenly at random across
+    the entities; both agents hold more than the rescue amount
+    """
+    max_system_value = int(config['max_system_value'])
+
+    positions = compositions(max_system_value - 1, 3)
+    positions = positions[(positions[:, 0] > rescue_amount) & (positions[:, 1] > rescue_amount)]
+
+    log_probabilities = multinomial_log_pmf(positions, log_factorials(max_system_value)) - np.log(max_system_value)
+
+    return with_debts(positions, log_probabilities, config, rescue_amount)
+
+
+def not_enough_money_together(
+    config,
+    rescue_amount,
+    ):
+    """
+    The agents split a collective capital between 2 and the rescue amount; the distressed bank's
+    capital is uniform below the remaining system value
+    """
+    max_system_value = int(config['max_system_value'])
+
+    positions, log_probabilities = [], []
+    for collective_capital in range(2, rescue_amount):
+        agent_0 = np.arange(collective_capital + 1)
+        for distressed_capital in range(max_system_value - collective_capital):
+            positions.append(np.stack([
+                agent_0,
+                collective_capital - agent_0,
+                np.full(len(agent_0), distressed_capital),
+            ], axis=1))
+            log_probabilities.append(
+                multinomial_log_pmf(positions[-1][:, :2], log_factorials(collective_capital))
+                - np.log(rescue_amount - 2)
+                - np.log(max_system_value - collective_capital)
+            )
+
+    return with_debts(np.concatenate(positions), np.concatenate(log_probabilities), config, rescue_amount)
+
+
+def not_in_default(
+    config,
+    rescue_amount = 0,
+    ):
+    """
+    The maximum system value is split evenly at random across the entities; the distressed bank owes
+    an amount uniform below its capital.  Positions with a distressed bank without capital are never
+    generated, as they fail the check that all positions are greater than zero.
+    """
+    max_system_value = int(config['max_system_value'])
+
+    positions = compositions(max_system_value, 3)
+    positions = positions[(positions.sum(axis=1) == max_system_value) & (positions > 0).all(axis=1)]
+
+    log_probabilities = multinomial_log_pmf(positions, log_factorials(max_system_value))
+
+    # One row per position and debt
+    rows    = np.repeat(np.arange(len(positions)), positions[:, 2])
+    starts  = np.repeat(np.cumsum(positions[:, 2]) - positions[:, 2], positions[:, 2])
+    debts   = np.arange(len(rows)) - starts
+
+    return with_debts(
+        positions[rows],
+        log_probabilities[rows] - np.log(positions[rows, 2]),
+        config,
+        rescue_amount,
+        debts               = debts,
+        positive_incentives = False,
+    )
+
+
+def only_agent_0_can_rescue(
+    config,
+    rescue_amount,
+    ):
+    """
+    Agent 1's capital is uniform below the rescue amount; the remaining system value is split evenly at
+    random across three cells, the first two being the capital of agent 0 and of the distressed bank
+    """
+    max_system_value = int(config['max_system_value'])
+    log_factorial = log_factorials(max_system_value)
+
+    positions, log_probabilities = [], []
+    for agent_1 in range(rescue_amount):
+        cells = compositions(max_system_value - agent_1, 2)
+        cells = np.concatenate([cells, max_system_value - agent_1 - cells.sum(axis=1, keepdims=True)], axis=1)
+        cells = cells[cells[:, 0] >= rescue_amount]
+
+        positions.append(np.stack([cells[:, 0], np.full(len(cells), agent_1), cells[:, 1]], axis=1))
+        log_probabilities.append(multinomial_log_pmf(cells, log_factorial) - np.log(rescue_amount))
+
+    return with_debts(np.concatenate(positions), np.concatenate(log_probabilities), config, rescue_amount)
+
+
+def only_agent_1_can_rescue(
+    config,
+    rescue_amount,
+    ):
+    """
+    The graphs of 'only agent 0 can rescue' with the agents swapped
+    """
+    positions, adjacency_matrices, log_probabilities = only_agent_0_can_rescue(config, rescue_amount)
+
+    positions[:, [0, 1]] = positions[:, [1, 0]]
+    adjacency_matrices[:, 2, [0, 1]] = adjacency_matrices[:, 2, [1, 0]]
+
+    return positions, adjacency_matrices, log_probabilities
+
+
+def coordination_game(
+    config,
+    rescue_amount,
+    ):
+    """
+    Each agent holds less than the rescue amount, uniformly or splitting the rescue amount evenly at
+    random when agents commit everything; the system's capital is uniform between the agents' capital
+    and the maximum system value
+    """
+    max_system_value = int(config['max_system_value'])
+
+    if config.get('commit_everything'):
+        agents = np.stack([np.arange(rescue_amount + 1), rescue_amount - np.arange(rescue_amount + 1)], axis=1)
+        agents_log_probabilities = multinomial_log_pmf(agents, log_factorials(rescue_amount))
+    else:
+        agents = np.stack(np.meshgrid(np.arange(rescue_amount), np.arange(rescue_amount), indexing='ij'), axis=-1).reshape(-1, 2)
+        agents_log_probabilities = np.full(len(agents), -2 * np.log(rescue_amount))
+
+    # 'the sum of both agents is geq than the rescue amount' and 'both agents cannot rescue by themself'
+    valid = (agents.sum(axis=1) >= rescue_amount) & (agents < rescue_amount).all(axis=1)
+    agents, agents_log_probabilities = agents[valid], agents_log_probabilities[valid]
+
+    positions, log_probabilities = [], []
+    for agent_capital, log_probability in zip(agents, agents_log_probabilities):
+        n_values = max_system_value - agent_capital.sum()
+        positions.append(np.concatenate([np.tile(agent_capital, (n_values, 1)), np.arange(n_values)[:, None]], axis=1))
+        log_probabilities.append(np.full(n_values, log_probability - np.log(n_values)))
+
+    return with_debts(np.concatenate(positions), np.concatenate(log_probabilities), config, rescue_amount)
+
+
+def debug(
+    config,
+    rescue_amount,
+    ):
+    positions = np.array([[35.0, 35.0, 30.0]])
+    adjacency_matrices = np.array([[[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [16.0, 16.0, 0.0]]])
+    return positions, adjacency_matrices, np.zeros(1)
+
+
+def debug_fixed_coordination_game(
+    config,
+    rescue_amount,
+    ):
+    positions = np.array([[2.0, 2.0, 3.0]])
+    adjacency_matrices = np.array([[[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [3.0, 3.0, 0.0]]])
+    return positions, adjacency_matrices, np.zeros(1)
+
+
+# Enumerators of the scenarios drawing a single kind of graph
+SCENARIOS = {
+    'debug':                            debug,
+    'debug fixed coordination game':    debug_fixed_coordination_game,
+    'not enough money together':        not_enough_money_together,
+    'not in default':                   not_in_default,
+    'only agent 0 can rescue':          only_agent_0_can_rescue,
+    'only agent 1 can rescue':          only_agent_1_can_rescue,
+    'both agents can rescue':           both_agents_can_rescue,
+    'volunteers dilemma':               both_agents_can_rescue,
+    'coordination game':                coordination_game,
+}
+
+# Sub scenarios of 'uniformly mixed', in the order Generator.uniformly_mixed draws them
+MIXED_SCENARIOS = [
+    'not enough money together',
+    'not in default',
+    'only agent 0 can rescue',
+    'only agent 1 can rescue',
+    'both agents can rescue',
+    'coordination game',
+]
+
+
+def scenario_distribution(
+    config,
+    scenario,
+    rescue_amount,
+    ):
+    """
+    Returns the valid graphs of a scenario and their probabilities of being generated
+    :output positions           (n_graphs, 3) positions
+    :output adjacency_matrices  (n_graphs, 3, 3) debts owed by the row to the column entity
+    :output probabilities       (n_graphs,) probabilities, summing to one
+    """
+    if scenario == 'merged only agent 0 can rescue and only agent 1 can rescue':
+        graphs = [SCENARIOS[sub_scenario](config, rescue_amount) for sub_scenario in ['only agent 0 can rescue', 'only agent 1 can rescue']]
+        probabilities = [0.5 * normalize(log_probabilities) for _, _, log_probabilities in graphs]
+        return (
+            np.concatenate([positions for positions, _, _ in graphs]),
+            np.concatenate([adjacency_matrices for _, adjacency_matrices, _ in graphs]),
+            np.concatenate(probabilities),
+        )
+
+    assert scenario in SCENARIOS, f"Exact evaluation is not implemented for the scenario '{scenario}'"
+    positions, adjacency_matrices, log_probabilities = SCENARIOS[scenario](config, rescue_amount)
+
+    return positions, adjacency_matrices, normalize(log_probabilities)
+
+
+def normalize(
+    log_probabilities,
+    ):
+    """
+    Returns probabilities proportional to the given log probabilities, summing to one
+    """
+    probabilities = np.exp(log_probabilities - log_probabilities.max())
+    return probabilities / probabilities.sum()
+
+
+def graph_distribution(
+    config,
+    ):
+    """
+    Enumerates every graph the environment generates for the configured scenario
+    Rescue amounts are uniform over their range, which the environment cycles through and the
+    'uniformly mixed' scenario samples from; 'not in default' graphs have no rescue amount.
+    :output positions           (n_graphs, 3) positions
+    :output adjacency_matrices  (n_graphs, 3, 3) debts owed by the row to the column entity
+    :output rescue_amounts      (n_graphs,) rescue amounts
+    :output sub_scenarios       (n_graphs,) sub scenario of 'uniformly mixed' graphs; else "not applicable"
+    :output probabilities       (n_graphs,) probabilities of the graphs, summing to one
+    """
+    assert config['n_entities'] == 3 and config['n_agents'] == 2, "Exact evaluation is implemented for two agents and a distressed bank"
+
+    scenario        = config['scenario']
+    rescue_amounts  = range(config['minimum_rescue_amount'], config['maximum_rescue_amount'])
+
+    # (sub scenario, rescue amount, probability) of each kind of graph
+    if scenario == 'uniformly mixed':
+        kinds = [
+            (sub_scenario, rescue_amount, 1 / len(MIXED_SCENARIOS) / len(rescue_amounts))
+            for sub_scenario in MIXED_SCENARIOS if sub_scenario != 'not in default'
+            for rescue_amount in rescue_amounts
+        ]
+        kinds.append(('not in default', 0, 1 / len(MIXED_SCENARIOS)))
+    elif scenario == 'not in default':
+        kinds = [(scenario, 0, 1.0)]
+    else:
+        kinds = [(scenario, rescue_amount, 1 / len(rescue_amounts)) for rescue_amount in rescue_amounts]
+
+    positions, adjacency_matrices, kind_rescue_amounts, sub_scenarios, probabilities = [], [], [], [], []
+    for sub_scenario, rescue_amount, kind_probability in kinds:
+        kind_positions, kind_adjacency_matrices, kind_probabilities = scenario_distribution(config, sub_scenario, rescue_amount)
+        positions.append(kind_positions)
+        adjacency_matrices.append(kind_adjacency_matrices)
+        kind_rescue_amounts.append(np.full(len(kind_positions), rescue_amount))
+        probabilities.append(kind_probability * kind_probabilities)
+
+        # Every graph of a kind refers to the same string
+        sub_scenarios.append(np.full(len(kind_positions), sub_scenario if scenario == 'uniformly mixed' else "not applicable", dtype=object))
+
+    # Concatenated one at a time, releasing the parts, as sets of some scenarios hold millions of graphs
+    arrays = []
+    for parts in [positions, adjacency_matrices, kind_rescue_amounts, sub_scenarios, probabilities]:
+        arrays.append(np.concatenate(parts))
+        parts.clear()
+
+    return tuple(arrays)
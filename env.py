@@ -4,7 +4,69 @@ import numpy as np
 from copy import deepcopy
 from gym.spaces import Discrete, Box
 from generator import Generator
-
+from negotiation import NegotiationState
+from profiler import profiled, configure_profiler
+import kernels
+
+
+def make_generator(
+    config,
+    backend = 'numpy',
+    ):
+    """
+    Creates the graph generator of an env with a random stream of its own
+    The stream is keyed by the rollout worker and the env's index within the worker, which RLlib
+    passes as attributes of the env config; evaluation workers use separate streams.
+    """
+    return Generator(
+        backend = backend,
+        seed    = config.get('generator_seed'),
+        stream  = (
+            int(bool(config.get('in_evaluation'))),
+            getattr(config, 'worker_index', 0),
+            getattr(config, 'vector_index', 0),
+        ),
+    )
+
+
+def sample_pool_members(
+    config,
+    n_agents,
+    rng,
+    ):
+    """
+    Draws the pool member played by every agent when the whole pool shares a single policy
+    The members can be fixed through config['fixed_pool_members'], e.g. during evaluation
+    :args   rng     random generator of the episode
+    """
+    members = config.get('fixed_pool_members')
+    if members is None:
+        members = rng.choice(list(config['policies']), size=n_agents)
+
+    for agent_identifier, member in enumerate(members):
+        config[f'agent_{agent_identifier}_policy']  = member
+        config[f'agent_{agent_identifier}_beta']    = config['policies'][member]
+
+
+def mix_rewards(
+    config,
+    reward,
+    ):
+    """
+    Mixes each agent's change in value with the other agent's according to alpha and beta
+    Pooled agents are weighted by the beta of the pool member they play
+    :args   reward      (..., n_agents) change in value of each agent
+    :output rewards     (..., n_agents) reward of each agent
+    """
+    if not config['pooled_training']:
+        betas = config.get('beta')
+    else:
+        betas = np.array([config.get(f'agent_{i}_beta') for i in range(reward.shape[-1])])
+
+    # The change in value of the next agent
+    others = np.concatenate([reward[..., 1:], reward[..., :1]], axis=-1)
+
+    return config.get('alpha') * reward + betas * others
 
 
 class Volunteers_Dilemma(MultiAgentEnv):
@@ -17,9 +79,16 @@ class Volunteers_Dilemma(MultiAgentEnv):
 
         # Generalize the graph for any bank being in distress
         self.config = config
+        configure_profiler(self.config)
         self.distressed_node = 2
         self.iteration = 0
-        self.generator = Generator()
+
+        # Compiled kernels run the clearing, rewards and scenario sampling with the numba backend
+        self.backend = kernels.resolve_backend(self.config.get('backend'))
+        self.generator = make_generator(self.config, self.backend)
+
+        # Offers and system value of the negotiation rounds
+        self.negotiation = NegotiationState(self.config['number_of_negotiation_rounds'], self.config['n_agents'])
 
         # Placeholder to get observation size
         self.rescue_range = self.config['maximum_rescue_amount'] - self.config['minimum_rescue_amount']
@@ -109,6 +178,27 @@ class Volunteers_Dilemma(MultiAgentEnv):
                     shape=(1, )
                 )
 
+            # A policy shared by the pool is conditioned on the beta of the member it plays
+            if self.config.get('shared_pooled_policy'):
+                features['own_beta'] = Box(
+                    0, 
+                    100, 
+                    shape=(1, )
+                )
+
+            # Multi-round negotiations expose the offers of the previous rounds
+            if self.config['number_of_negotiation_rounds'] > 1:
+                features['offer_history'] = Box(
+                    0,
+                    self.config['max_system_value'],
+                    shape=(2 * self.config['number_of_negotiation_rounds'], )
+                )
+                features['negotiation_round'] = Box(
+                    0,
+                    self.config['number_of_negotiation_rounds'],
+                    shape=(1, )
+                )
+
             self.observation_space = gym.spaces.Dict(features)
 
 
@@ -121,6 +211,7 @@ class Volunteers_Dilemma(MultiAgentEnv):
         """
         # Reset the timestep counter for multiple-round scenarios
         self.timestep =0 
+        self.negotiation.reset()
 
         # NOTE: Uniform rescue amounts are generated to improve interpretability
         # as rescue amounts are not evenly distributed when randomly generated
@@ -132,6 +223,10 @@ class Volunteers_Dilemma(MultiAgentEnv):
         # Generate the position and adjacency matrix
         self.position, self.adjacency_matrix = self.generator.generate_scenario(self.config)
 
+        # Draw the pool members played in this episode from the episode's stream
+        if self.config.get('shared_pooled_policy'):
+            sample_pool_members(self.config, self.config['n_agents'], self.generator.rng)
+
         # Retrieve the observations of the resetted environment        
         observations = {}
         for agent_identifier in range(self.config['n_agents']):
@@ -159,7 +254,8 @@ class Volunteers_Dilemma(MultiAgentEnv):
         self.timestep += 1
 
         # Compute the value of the system before agents make a decision
-        starting_system_value = self.clear().sum()
+        # The positions only change once the final offers are executed, thus it is cleared once per episode
+        starting_system_value = self.negotiation.starting_system_value(self.clear)
 
         # If we decide to invert the actions, then the
         # decision of the agent is how much to retain
@@ -175,6 +271,8 @@ class Volunteers_Dilemma(MultiAgentEnv):
             # Update the actions to the inverted actions
             actions = inverted_actions
 
+        # Store the offers of this round
+        self.negotiation.record(actions)
                         
         # Retrieve the observations of the resetted environment
         rewards, ending_system_value = self.compute_reward(actions, round = self.timestep)
@@ -205,6 +303,7 @@ class Volunteers_Dilemma(MultiAgentEnv):
         return observations, rewards, done, info
 
 
+    @profiled('compute_reward')
     def compute_reward(
         self, 
         actions, 
@@ -219,9 +318,25 @@ class Volunteers_Dilemma(MultiAgentEnv):
         # All offers before is cheaptalk
         if not round == self.config['number_of_negotiation_rounds']:
             rewards = {}
-            system_value = self.clear().sum()
+            system_value = self.negotiation.starting_system_value(self.clear)
             for i in range(self.config['n_agents']):
                 rewards[i] = 0
+        elif self.backend == 'numba':
+
+            # Amount transferred by each agent
+            transfers = np.array([
+                actions[agent_identifier] if self.config['discrete'] else self.position[agent_identifier] * actions[agent_identifier]
+                for agent_identifier in range(self.config['n_agents'])
+            ], dtype=float)
+
+            change_in_position, system_value = kernels.final_round_changes(
+                np.asarray(self.position, dtype=float),
+                np.asarray(self.adjacency_matrix, dtype=float),
+                transfers,
+                self.distressed_node,
+                self.config['haircut_multiplier'],
+            )
+            rewards = self.get_rewards(change_in_position[:self.config['n_agents']])
         else:
 
             position_old = deepcopy(self.position)
@@ -250,18 +365,7 @@ class Volunteers_Dilemma(MultiAgentEnv):
             change_in_position = new_bank_value - bank_value
             reward =  change_in_position.reshape(-1,1)[:self.config['n_agents']]
 
-            rewards = {}
-            if not self.config['pooled_training']:
-                for i in range(self.config['n_agents']):
-                    rewards[i] = self.config.get('alpha') * reward.flatten()[i] + \
-                                self.config.get('beta') * reward.flatten()[(i+1)%self.config['n_agents']]
-            else:
-                rewards[0] = self.config.get('alpha') * reward.flatten()[0] + \
-                                self.config.get('agent_0_beta') * reward.flatten()[1]
-                rewards[1] = self.config.get('alpha') * reward.flatten()[1] + \
-                                self.config.get('agent_1_beta') * reward.flatten()[0]
-
-
+            rewards = self.get_rewards(reward)
 
             system_value = new_bank_value.sum()
             
@@ -270,12 +374,33 @@ class Volunteers_Dilemma(MultiAgentEnv):
         return rewards, system_value
 
 
+    def get_rewards(
+        self,
+        reward,
+        ):
+        """
+        Mixes each agent's change in value with the other agent's according to alpha and beta
+        :args   reward      change in value of each agent
+        """
+        rewards = mix_rewards(self.config, np.asarray(reward).flatten()[:self.config['n_agents']])
+
+        return {i: rewards[i] for i in range(self.config['n_agents'])}
+
+
+    @profiled('clear')
     def clear(
         self
         ):
         """
         Clear the system to see where everything stabilizes
         """
+        if self.backend == 'numba':
+            return kernels.clear(
+                np.asarray(self.position, dtype=float), 
+                np.asarray(self.adjacency_matrix, dtype=float), 
+                self.config['haircut_multiplier'],
+            )
+
         adjacency_matrix = deepcopy(self.adjacency_matrix)
         position = deepcopy(self.position)
         
@@ -302,6 +427,7 @@ class Volunteers_Dilemma(MultiAgentEnv):
         return position
 
 
+    @profiled('get_observation')
     def get_observation(
         self, 
         agent_identifier=None, 
@@ -315,7 +441,8 @@ class Volunteers_Dilemma(MultiAgentEnv):
         def get_obs_discrete(agent_identifier=None, reset=False, actions=None):
             observation_dict = {}
 
-            observation = self.position - np.sum(self.adjacency_matrix,axis=1) + np.sum(self.adjacency_matrix,axis=0)
+            liabilities = np.sum(self.adjacency_matrix,axis=1)
+            observation = self.position - liabilities + np.sum(self.adjacency_matrix,axis=0)
 
             # Alternative #1
             observation = np.hstack((observation, self.position, self.adjacency_matrix.flatten()))
@@ -323,7 +450,7 @@ class Volunteers_Dilemma(MultiAgentEnv):
             observation_dict['real_obs']    = observation
             observation_dict['action_mask'] = np.array([0.] * self.action_space.n)
             observation_dict['assets']      = np.array([self.position[agent_identifier]])
-            observation_dict['liabilities'] = np.array([np.sum(self.adjacency_matrix,axis=1)[agent_identifier]])
+            observation_dict['liabilities'] = np.array([liabilities[agent_identifier]])
             observation_dict['net_position']= np.array([observation[agent_identifier]])
             observation_dict['rescue_amount'] = np.array([abs(observation[self.distressed_node])])
 
@@ -340,6 +467,11 @@ class Volunteers_Dilemma(MultiAgentEnv):
             # Mask all actions outside of current position
             observation_dict.get('action_mask')[:int(self.position[agent_identifier])+1] = 1
 
+            # Offers of the previous rounds
+            if self.config['number_of_negotiation_rounds'] > 1:
+                observation_dict['offer_history']       = self.negotiation.offer_history()[agent_identifier]
+                observation_dict['negotiation_round']   = np.array([float(self.negotiation.round)])
+
             # If agents are given full information, reveal the other rescuing banks' assets and liabilities
             if self.config.get('full_information'):
                 observation_dict['other_agents_assets']=\
@@ -359,6 +491,11 @@ class Volunteers_Dilemma(MultiAgentEnv):
                 observation_dict['other_agents_beta']=\
                     np.array([float(other_agents_beta)])
 
+            # A policy shared by the pool observes the beta of the member it plays
+            if self.config.get('shared_pooled_policy'):
+                observation_dict['own_beta']=\
+                    np.array([float(self.config.get(f'agent_{agent_identifier}_beta')) * 100])
+
 
             return observation_dict
 
@@ -398,5 +535,430 @@ class Volunteers_Dilemma(MultiAgentEnv):
         """
         Computes the net position of each agent
         """
+        if self.backend == 'numba':
+            return kernels.net_positions(
+                np.asarray(self.position, dtype=float), 
+                np.asarray(self.adjacency_matrix, dtype=float),
+            )[agent]
+
         net_position = self.position[agent] - np.sum(self.adjacency_matrix[agent,:]) + np.sum(self.adjacency_matrix[:,agent])
-        return net_position
\ No newline at end of file
+        return net_position
+
+
+class Generalized_Volunteers_Dilemma(MultiAgentEnv):
+    """
+    Env of N rescuing agents in a sparse network of M banks
+
+    Liabilities are stored as a CSR matrix (row: debtor, column: creditor), thus clearing,
+    rewarding and observing cost O(edges) rather than O(banks^2).  Agents 0..N-1 are the
+    rescuers and transfer their allocations to the distressed bank (entity N).  Observations
+    aggregate over the other agents instead of indexing a single partner.
+    """
+
+    def __init__(
+        self, 
+        config
+        ):
+
+        self.config = config
+        configure_profiler(self.config)
+
+        self.n_agents           = self.config['n_agents']
+        self.distressed_node    = self.n_agents
+
+        assert not self.config.get('reveal_other_agents_identity'), "Identities cannot be aggregated over the other agents"
+        self.iteration          = 0
+        self.generator          = make_generator(self.config)
+        self.negotiation        = NegotiationState(self.config['number_of_negotiation_rounds'], self.n_agents)
+
+        # Placeholder to get observation size
+        self.rescue_range = self.config['maximum_rescue_amount'] - self.config['minimum_rescue_amount']
+        self.config['rescue_amount'] = (self.iteration % self.rescue_range) + self.config['minimum_rescue_amount']
+        self.set_network(*self.generator.generate_network(self.config))
+
+        # Placeholder for individualized betas which is set in the callback
+        for agent_identifier in range(self.n_agents):
+            self.config[f'agent_{agent_identifier}_beta']   = 1.0
+            self.config[f'agent_{agent_identifier}_policy'] = 'policy_0'
+
+        if self.config['discrete']:
+            self.action_space = Discrete(self.config['max_system_value'])
+
+            features = {
+                "action_mask": Box(
+                    0,
+                    1, 
+                    shape=(self.action_space.n, )
+                ),
+                "real_obs": Box(
+                    -self.config['max_system_value'],
+                    self.config['max_system_value'],
+                    shape=(self.get_observation_size(),)
+                ),
+            }
+
+            # Single valued features
+            single_valued_features = ['last_offer', 'final_round', 'net_position', 'rescue_amount', 'liabilities', 'assets']
+
+            if self.config.get('full_information'):
+                single_valued_features += ['other_agents_assets', 'other_agents_liabilities']
+
+            for feature in single_valued_features:
+                features[feature] = Box(
+                    0, 
+                    1 if feature == 'final_round' else self.config['max_system_value'], 
+                    shape=(1, )
+                )
+
+            if self.config.get('reveal_other_agents_beta'):
+                # NOTE: Pro-social betas are discretized in steps of 0.01
+                features['other_agents_beta'] = Box(
+                    0, 
+                    100, 
+                    shape=(1, )
+                )
+
+            # A policy shared by the pool is conditioned on the beta of the member it plays
+            if self.config.get('shared_pooled_policy'):
+                features['own_beta'] = Box(
+                    0, 
+                    100, 
+                    shape=(1, )
+                )
+
+            # Multi-round negotiations expose the offers of the previous rounds
+            if self.config['number_of_negotiation_rounds'] > 1:
+                features['offer_history'] = Box(
+                    0,
+                    self.config['max_system_value'],
+                    shape=(2 * self.config['number_of_negotiation_rounds'], )
+                )
+                features['negotiation_round'] = Box(
+                    0,
+                    self.config['number_of_negotiation_rounds'],
+                    shape=(1, )
+                )
+
+            self.observation_space = gym.spaces.Dict(features)
+
+
+    def set_network(
+        self,
+        position,
+        adjacency_matrix,
+        ):
+        """
+        Stores a network and the edge arrays reused by every clearing within the episode
+        """
+        self.position           = position
+        self.adjacency_matrix   = adjacency_matrix.tocsr()
+
+        # Debtor, creditor and amount of every edge
+        self.debtors            = np.repeat(
+            np.arange(self.adjacency_matrix.shape[0]), 
+            np.diff(self.adjacency_matrix.indptr)
+        )
+        self.creditors          = self.adjacency_matrix.indices
+        self.amounts            = self.adjacency_matrix.data
+
+        # Total liabilities and claims of every bank
+        n_entities              = self.adjacency_matrix.shape[0]
+        self.total_liabilities  = np.bincount(self.debtors,   self.amounts, minlength=n_entities)
+        self.total_claims       = np.bincount(self.creditors, self.amounts, minlength=n_entities)
+
+
+    def reset(
+        self
+        ):
+        """
+        Resets the environment
+        """
+        # Reset the timestep counter for multiple-round scenarios
+        self.timestep = 0
+        self.negotiation.reset()
+
+        # NOTE: Uniform rescue amounts are generated to improve interpretability
+        self.config['rescue_amount'] = (self.iteration % self.rescue_range) + self.config['minimum_rescue_amount']
+
+        # Generate the network
+        self.set_network(*self.generator.generate_network(self.config))
+
+        # Draw the pool members played in this episode from the episode's stream
+        if self.config.get('shared_pooled_policy'):
+            sample_pool_members(self.config, self.n_agents, self.generator.rng)
+
+        self.iteration += 1
+
+        return self.get_observations()
+
+
+    def step(
+        self, 
+        actions
+        ):
+        """
+        Takes one transition step in the environment
+        :args actions           dictionary containing the actions decided by each agent
+        :output observations    dictionary containing the next observations for each agent
+        :output rewards         dictionary containing the rewards for each agent
+        :output done            dictionary containing __all__ reflecting if the episode is finished
+        :output info            dictionary containing any additional episode information
+        """
+
+        # Increment the timestep counter
+        self.timestep += 1
+
+        # Compute the value of the system before agents make a decision
+        # The positions only change once the final offers are executed, thus it is cleared once per episode
+        starting_system_value = self.negotiation.starting_system_value(self.clear)
+
+        # If we decide to invert the actions, then the
+        # decision of the agent is how much to retain
+        if self.config.get('invert_actions'):
+            actions = {agent: self.position[agent] - actions[agent] for agent in actions.keys()}
+
+        # Store the offers of this round
+        self.negotiation.record(actions)
+
+        rewards, ending_system_value = self.compute_reward(actions, round = self.timestep)
+
+        observations = self.get_observations(actions)
+
+        info = {}
+        for agent_identifier in range(self.n_agents):
+            info[agent_identifier] = {  
+                'starting_system_value': starting_system_value,
+                'ending_system_value': ending_system_value,
+                'optimal_allocation': self.config.get('rescue_amount'),
+                'actual_allocation': actions[agent_identifier],
+                'agent_0_position': self.position[0],
+            }
+
+        # determine if the episode is completed
+        done = {"__all__" : self.timestep == self.config['number_of_negotiation_rounds']}
+
+        return observations, rewards, done, info
+
+
+    @profiled('compute_reward')
+    def compute_reward(
+        self, 
+        actions, 
+        round
+        ):
+        """
+        Returns a reward signal at the end of negotiations
+        For all other rounds, returns 0
+        Each agent is rewarded for its own change in value plus beta times the
+        mean change in value of the other agents
+        """
+
+        # No reward signal if it is not the final negotiation round
+        # All offers before is cheaptalk
+        if not round == self.config['number_of_negotiation_rounds']:
+            return {i: 0 for i in range(self.n_agents)}, self.negotiation.starting_system_value(self.clear)
+
+        position_old = self.position.copy()
+
+        # Consider the discounted value if the distressed bank is in default
+        inflows = self.total_claims
+        if self.get_net_positions()[self.distressed_node] < 0:
+            inflows = inflows * self.config['haircut_multiplier']
+
+        # Agents in general networks owe debts themselves, which are settled in either case
+        bank_value = self.position + inflows - self.total_liabilities
+
+        # Transfer the allocations of every agent to the distressed bank
+        allocations = np.array([actions[i] for i in range(self.n_agents)], dtype=float)
+        if not self.config['discrete']:
+            allocations = self.position[:self.n_agents] * allocations
+
+        self.position = self.position.copy()
+        self.position[:self.n_agents]       -= allocations
+        self.position[self.distressed_node] += allocations.sum()
+
+        new_bank_value = self.clear()
+        reward = (new_bank_value - bank_value)[:self.n_agents]
+
+        if self.config['pooled_training']:
+            betas = np.array([self.config.get(f'agent_{i}_beta') for i in range(self.n_agents)])
+        else:
+            betas = np.full(self.n_agents, self.config.get('beta'))
+
+        # Mean reward of the other agents
+        others_reward = (reward.sum() - reward) / max(self.n_agents - 1, 1)
+
+        reward = self.config.get('alpha') * reward + betas * others_reward
+
+        self.position = position_old
+
+        return {i: reward[i] for i in range(self.n_agents)}, new_bank_value.sum()
+
+
+    @profiled('clear')
+    def clear(
+        self
+        ):
+        """
+        Clears the system in one pass over the edges
+        Banks with a negative net position default: their discounted capital is paid out pro rata
+        to their creditors, debts owed to them are written off, and all other debts are settled.
+        This matches Volunteers_Dilemma.clear whenever no defaulted bank owes another defaulted bank.
+        """
+        n_entities  = len(self.position)
+        position    = self.position.copy()
+        defaulted   = self.get_net_positions() < 0
+
+        # Defaulted debtors pay their discounted capital pro rata to their solvent creditors
+        paying = defaulted[self.debtors] & ~defaulted[self.creditors]
+        payout = self.config['haircut_multiplier'] * position[self.debtors[paying]] *\
+                 self.amounts[paying] / self.total_liabilities[self.debtors[paying]]
+        position += np.bincount(self.creditors[paying], payout, minlength=n_entities)
+        position[defaulted] = 0
+
+        # Debts between solvent banks are settled in full
+        settled = ~defaulted[self.debtors] & ~defaulted[self.creditors]
+        position += np.bincount(self.creditors[settled], self.amounts[settled], minlength=n_entities)
+        position -= np.bincount(self.debtors[settled],   self.amounts[settled], minlength=n_entities)
+
+        return position
+
+
+    @profiled('get_observation')
+    def get_observations(
+        self, 
+        actions=None
+        ):
+        """
+        Generates the observations of every agent at once
+        """
+        agents          = np.arange(self.n_agents)
+        net_position    = self.get_net_positions()
+        assets          = self.position[:self.n_agents]
+        liabilities     = self.total_liabilities[:self.n_agents]
+        rescue_amount   = abs(net_position[self.distressed_node])
+
+        # Features of the other agents are aggregated
+        if actions is not None and self.n_agents > 1:
+            offers = np.array([actions[i] for i in agents], dtype=float)
+            other_agents_offers = offers.sum() - offers
+        else:
+            other_agents_offers = np.zeros(self.n_agents)
+
+        other_agents_assets = assets.sum() - assets
+
+        # Claims of each agent on the distressed bank
+        claims = self.adjacency_matrix[self.distressed_node].toarray()[0, :self.n_agents]
+        other_agents_claims = claims.sum() - claims
+
+        real_obs = np.stack([
+            net_position[:self.n_agents],
+            assets,
+            liabilities,
+            self.total_claims[:self.n_agents],
+            np.full(self.n_agents, net_position[self.distressed_node]),
+            other_agents_assets,
+        ], axis=1)
+
+        if not self.config.get('discrete'):
+            return {i: real_obs[i] for i in agents}
+
+        final_round = float(self.timestep == self.config['number_of_negotiation_rounds']) if hasattr(self, 'timestep') else 0.
+
+        # Totals grow with the degree of a bank in large networks, keep them within the embeddings
+        maximum             = self.config['max_system_value'] - 1
+        assets              = np.clip(assets, 0, maximum)
+        liabilities         = np.clip(liabilities, 0, maximum)
+        net_position        = np.clip(net_position, 0, maximum)
+        rescue_amount       = min(rescue_amount, maximum)
+        other_agents_offers = np.clip(other_agents_offers, 0, maximum)
+        other_agents_assets = np.clip(other_agents_assets, 0, maximum)
+        other_agents_claims = np.clip(other_agents_claims, 0, maximum)
+
+        # Mask all actions outside of current position
+        action_masks = (np.arange(self.action_space.n)[None, :] <= assets[:, None].astype(int)).astype(float)
+
+        if self.config.get('reveal_other_agents_beta'):
+            betas = np.array([self.config.get(f'agent_{i}_beta') for i in agents]) * 100
+            other_agents_betas = (betas.sum() - betas) / max(self.n_agents - 1, 1)
+
+        if self.config.get('shared_pooled_policy'):
+            own_betas = np.array([self.config.get(f'agent_{i}_beta') for i in agents], dtype=float) * 100
+
+        if self.config['number_of_negotiation_rounds'] > 1:
+            offer_history = np.clip(self.negotiation.offer_history(), 0, maximum)
+
+        observations = {}
+        for i in agents:
+            observation_dict = {
+                'real_obs':         real_obs[i],
+                'action_mask':      action_masks[i],
+                'assets':           assets[i:i+1],
+                'liabilities':      liabilities[i:i+1],
+                'net_position':     net_position[i:i+1],
+                'rescue_amount':    np.array([rescue_amount]),
+                'last_offer':       other_agents_offers[i:i+1],
+                'final_round':      np.array([final_round]),
+            }
+
+            # If agents are given full information, reveal the other rescuing banks' total assets and claims
+            if self.config.get('full_information'):
+                observation_dict['other_agents_assets']         = other_agents_assets[i:i+1]
+                observation_dict['other_agents_liabilities']    = other_agents_claims[i:i+1]
+
+            # If agents are given the other agents' betas, reveal their mean
+            if self.config.get('reveal_other_agents_beta'):
+                observation_dict['other_agents_beta'] = other_agents_betas[i:i+1]
+
+            # A policy shared by the pool observes the beta of the member it plays
+            if self.config.get('shared_pooled_policy'):
+                observation_dict['own_beta'] = own_betas[i:i+1]
+
+            # Offers of the previous rounds
+            if self.config['number_of_negotiation_rounds'] > 1:
+                observation_dict['offer_history']       = offer_history[i]
+                observation_dict['negotiation_round']   = np.array([float(self.negotiation.round)])
+
+            observations[i] = observation_dict
+
+        return observations
+
+
+    def get_observation(
+        self, 
+        agent_identifier=None, 
+        reset=False, 
+        actions=None
+        ):
+        """
+        Generates the observation displayed to a single agent
+        """
+        return self.get_observations(actions)[agent_identifier]
+
+
+    def get_observation_size(
+        self
+        ):
+        """
+        Returns the size of the real_obs vector
+        """
+        return 6
+
+
+    def get_net_positions(
+        self
+        ):
+        """
+        Computes the net position of every bank
+        """
+        return self.position - self.total_liabilities + self.total_claims
+
+
+    def get_net_position(
+        self, 
+        agent
+        ):
+        """
+        Computes the net position of a bank
+        """
+        return self.get_net_positions()[agent]
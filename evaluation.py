@@ -0,0 +1,672 @@
+import hashlib
+import os
+
+import numpy as np
+
+import kernels
+from env import Volunteers_Dilemma, mix_rewards
+from enumeration import graph_distribution
+
+
+# Directory holding the trials of every experiment, as referenced by the results index
+RESULTS_DIR = '/itet-stor/bryayu/net_scratch/results'
+
+
+# Outcomes cleared per batch, which bounds the memory taken by large graph sets
+CLEARING_BATCH_SIZE = 2**20
+
+
+def unsupported_configuration(
+    config,
+    ):
+    """
+    Returns why a configuration cannot be evaluated in batches by GraphSet, or None if it can
+    """
+    if not config.get('discrete'):
+        return "Batched evaluation requires discrete actions"
+    if config.get('number_of_negotiation_rounds', 1) != 1:
+        return "Batched evaluation requires a single negotiation round"
+    if config.get('n_agents') != 2:
+        return "Batched evaluation is implemented for two agents"
+    if config.get('sparse_network'):
+        return "Batched evaluation is implemented for the three bank network of Volunteers_Dilemma"
+    return None
+
+
+class GraphSet:
+    """
+    Fixed set of graphs shared by every policy being evaluated
+
+    The graphs are generated once, from a seeded stream, so all policies and pairings are compared
+    on exactly the same episodes.  Alternatively, the set holds every graph the generator can draw,
+    weighted by its probability, so that metrics are exact expectations.  Observations are built for
+    all graphs at once and the outcome of each (graph, joint action) is cleared once, in batches,
+    and memoized in a sorted table, so evaluating many pairings reduces to array lookups.
+    """
+
+    def __init__(
+        self,
+        config,
+        n_graphs    = None,
+        seed        = 0,
+        exact       = False,
+        ) -> None:
+        """
+        :args   config      environment configuration of the game played
+        :args   n_graphs    number of graphs
+        :args   seed        seed of the graph stream
+        :args   exact       enumerate every valid graph instead of sampling n_graphs graphs
+        """
+        self.config = dict(config, generator_seed=seed, in_evaluation=True)
+
+        unsupported = unsupported_configuration(self.config)
+        assert unsupported is None, unsupported
+
+        self.env        = Volunteers_Dilemma(self.config)
+        self.env_config = dict(self.env.config)
+        self.n_agents   = self.config['n_agents']
+        self.n_actions  = self.env.action_space.n
+        self.exact      = exact
+
+        if exact:
+            (
+                self.positions,
+                self.adjacency_matrices,
+                self.rescue_amounts,
+                sub_scenarios,
+                self.probabilities,
+            ) = graph_distribution(self.config)
+            self.n_graphs       = len(self.positions)
+            self.scenarios      = np.full(self.n_graphs, self.config['scenario'], dtype=object)
+            self.sub_scenarios  = sub_scenarios
+        else:
+            self.sample(n_graphs)
+
+        # Identifies the graphs, e.g. in the keys of cached actions
+        key = hashlib.sha1()
+        for array in [self.positions, self.adjacency_matrices, self.rescue_amounts]:
+            key.update(np.ascontiguousarray(array).data)
+        self.key = key.hexdigest()
+
+        # Outcomes of the (graph, joint action) pairs played so far, sorted by their key
+        # The agents' changes in value are stored, as their rewards depend on the betas of the pairing
+        self.outcome_keys       = np.zeros(0, dtype=np.int64)
+        self.outcome_changes    = np.zeros((0, self.n_agents))
+        self.outcome_values     = np.zeros(0)
+
+
+    def sample(
+        self,
+        n_graphs,
+        ):
+        """
+        Generates the graphs from the environment, which weighs them equally
+        """
+        self.n_graphs = n_graphs
+
+        n_entities = self.config['n_entities']
+        self.positions          = np.zeros((n_graphs, n_entities))
+        self.adjacency_matrices = np.zeros((n_graphs, n_entities, n_entities))
+        self.rescue_amounts     = np.zeros(n_graphs, dtype=int)
+        self.probabilities      = np.full(n_graphs, 1 / n_graphs)
+        self.scenarios          = []
+        self.sub_scenarios      = []
+
+        # Rescue amounts cycle through their range as they do in training
+        for graph in range(n_graphs):
+            self.env.reset()
+            self.positions[graph]           = self.env.position
+            self.adjacency_matrices[graph]  = self.env.adjacency_matrix
+            self.rescue_amounts[graph]      = self.env.config['rescue_amount']
+            self.scenarios.append(self.env.config['scenario'])
+
+            # Store the subenvironment; else None
+            if self.env.config['scenario'] == 'uniformly mixed':
+                self.sub_scenarios.append(self.env.generator.sub_scenario)
+            else:
+                self.sub_scenarios.append("not applicable")
+
+
+    def load(
+        self,
+        graph,
+        context = None,
+        ):
+        """
+        Sets the environment to the start of the episode on the given graph
+        :args   context     config entries of the pairing, e.g. the pool members and betas of the agents
+        """
+        self.env.config = dict(self.env_config, **(context or {}))
+        self.env.position           = self.positions[graph].copy()
+        self.env.adjacency_matrix   = self.adjacency_matrices[graph].copy()
+        self.env.config['rescue_amount'] = int(self.rescue_amounts[graph])
+        self.env.timestep           = 0
+        self.env.negotiation.reset()
+
+
+    def observations(
+        self,
+        seat,
+        context = None,
+        graphs  = None,
+        ):
+        """
+        Returns the observations of the agent in the given seat, as the environment's discrete
+        observations at the start of an episode, for a batch of graphs at once
+        :args   context         config entries of the pairing, see load
+        :args   graphs          indices of the graphs; defaults to every graph
+        :output observations    dictionary of (n_graphs, ...) arrays of each feature
+        """
+        config  = dict(self.env_config, **(context or {}))
+        graphs  = np.arange(self.n_graphs) if graphs is None else np.asarray(graphs)
+        other   = (seat + 1) % self.n_agents
+
+        positions           = self.positions[graphs]
+        adjacency_matrices  = self.adjacency_matrices[graphs]
+        liabilities         = adjacency_matrices.sum(axis=2)
+        net_positions       = positions - liabilities + adjacency_matrices.sum(axis=1)
+        n_graphs            = len(graphs)
+        distressed_node     = self.env.distressed_node
+
+        def feature(value):
+            return np.broadcast_to(np.asarray(value, dtype=float), (n_graphs,)).reshape(n_graphs, 1)
+
+        observations = {
+            'real_obs':         np.concatenate([net_positions, positions, adjacency_matrices.reshape(n_graphs, -1)], axis=1),
+            'action_mask':      (np.arange(self.n_actions) <= np.trunc(positions[:, seat:seat + 1])).astype(float),
+            'assets':           feature(positions[:, seat]),
+            'liabilities':      feature(liabilities[:, seat]),
+            'net_position':     feature(net_positions[:, seat]),
+            'rescue_amount':    feature(np.abs(net_positions[:, distressed_node])),
+            'last_offer':       feature(0.0),
+            'final_round':      feature(0.0),
+        }
+
+        if config.get('full_information'):
+            observations['other_agents_assets']         = feature(positions[:, other])
+            observations['other_agents_liabilities']    = feature(adjacency_matrices[:, 2, other])
+
+        if config.get('reveal_other_agents_identity'):
+            observations['other_agents_identity'] = feature(float(config.get(f'agent_{other}_policy').strip('policy_')))
+
+        if config.get('reveal_other_agents_beta'):
+            observations['other_agents_beta'] = feature(float(config.get(f'agent_{other}_beta') * 100))
+
+        if config.get('shared_pooled_policy'):
+            observations['own_beta'] = feature(float(config.get(f'agent_{seat}_beta')) * 100)
+
+        return observations
+
+
+    def mean(
+        self,
+        values,
+        graphs = None,
+        ):
+        """
+        Returns the mean of per graph values over the set, weighing each graph by its probability
+        :args   values  (..., n_graphs) values on each graph
+        :args   graphs  indices of the graphs the values were computed on; defaults to every graph
+        """
+        probabilities = self.probabilities if graphs is None else self.probabilities[graphs]
+        return np.asarray(values) @ probabilities / probabilities.sum()
+
+
+    def encode(
+        self,
+        graphs,
+        actions,
+        ):
+        """
+        Encodes (graph, joint action) pairs into integer keys
+        """
+        keys = np.asarray(graphs, dtype=np.int64)
+        for agent in range(self.n_agents):
+            keys = keys * self.n_actions + np.asarray(actions[..., agent], dtype=np.int64)
+        return keys
+
+
+    def decode(
+        self,
+        keys,
+        ):
+        actions = np.zeros((len(keys), self.n_agents), dtype=np.int64)
+        for agent in reversed(range(self.n_agents)):
+            actions[:, agent] = keys % self.n_actions
+            keys = keys // self.n_actions
+        return keys, actions
+
+
+    def play(
+        self,
+        graphs,
+        actions,
+        context = None,
+        ):
+        """
+        Returns the outcome of the joint actions on the given graphs
+        Outcomes which were not played before are cleared as the environment's final round does
+        :args   graphs          (...) graph indices
+        :args   actions         (..., n_agents) actions of every agent
+        :args   context         config entries of the pairing, see load
+        :output rewards         (..., n_agents) rewards of every agent
+        :output system_values   (...) value of the system after clearing
+        """
+        graphs, actions = np.broadcast_arrays(np.asarray(graphs)[..., None], np.asarray(actions))
+        keys = self.encode(graphs[..., 0], actions)
+
+        new_keys = np.unique(keys[~self.known(keys)])
+        if len(new_keys) > 0:
+            new_changes = np.zeros((len(new_keys), self.n_agents))
+            new_values  = np.zeros(len(new_keys))
+
+            # The final round of Volunteers_Dilemma.step, cleared for many new outcomes at once
+            for start in range(0, len(new_keys), CLEARING_BATCH_SIZE):
+                batch = slice(start, start + CLEARING_BATCH_SIZE)
+                new_graphs, new_actions = self.decode(new_keys[batch])
+
+                change_in_position, new_values[batch] = kernels.batched_final_round_changes(
+                    self.positions[new_graphs],
+                    self.adjacency_matrices[new_graphs],
+                    self.contributions(new_graphs, new_actions),
+                    self.env.distressed_node,
+                    self.config['haircut_multiplier'],
+                )
+                new_changes[batch] = change_in_position[:, :self.n_agents]
+
+            self.outcome_keys       = np.concatenate([self.outcome_keys, new_keys])
+            self.outcome_changes    = np.concatenate([self.outcome_changes, new_changes])
+            self.outcome_values     = np.concatenate([self.outcome_values, new_values])
+
+            order = np.argsort(self.outcome_keys)
+            self.outcome_keys       = self.outcome_keys[order]
+            self.outcome_changes    = self.outcome_changes[order]
+            self.outcome_values     = self.outcome_values[order]
+
+        index = np.searchsorted(self.outcome_keys, keys)
+        rewards = mix_rewards(dict(self.env_config, **(context or {})), self.outcome_changes[index])
+
+        return rewards, self.outcome_values[index]
+
+
+    def known(
+        self,
+        keys,
+        ):
+        """
+        Returns whether the outcomes of the given keys were played before
+        """
+        if len(self.outcome_keys) == 0:
+            return np.zeros(keys.shape, dtype=bool)
+
+        index = np.minimum(np.searchsorted(self.outcome_keys, keys), len(self.outcome_keys) - 1)
+        return self.outcome_keys[index] == keys
+
+
+    def contributions(
+        self,
+        graphs,
+        actions,
+        ):
+        """
+        Returns the amount contributed by every agent, undoing the inversion of the actions
+        :args   graphs      (...) graph indices
+        :args   actions     (..., n_agents) actions of every agent
+        """
+        actions = np.asarray(actions, dtype=float)
+        if self.config.get('invert_actions'):
+            return self.positions[np.asarray(graphs)][..., :self.n_agents] - actions
+        return actions
+
+
+    def saved(
+        self,
+        graphs,
+        actions,
+        ):
+        """
+        Returns whether the joint contributions meet the rescue amount of the graph
+        """
+        graphs = np.asarray(graphs)
+        return self.contributions(graphs, actions).sum(axis=-1) >= self.rescue_amounts[graphs]
+
+
+def inference_config(
+    config,
+    ):
+    """
+    Returns a copy of a training configuration for restoring policies in the driver and acting greedily
+    """
+    config = dict(config)
+
+    # Remove episode greedy so that the agent acts deterministically
+    config['explore'] = False
+
+    # Remove the seed used in training
+    config.pop('seed', None)
+
+    # Restored policies are only queried in the driver
+    config['num_workers'] = 0
+    for key in ['evaluation_num_workers', 'custom_eval_function', 'evaluation_interval', 'evaluation_num_episodes', 'evaluation_config']:
+        config.pop(key, None)
+
+    return config
+
+
+def checkpoint_path(
+    run,
+    checkpoint,
+    results_dir = RESULTS_DIR,
+    ):
+    """
+    Returns the path of a checkpoint of a trial
+    :args   run     path of the trial, relative to the results directory
+    """
+    path = f"{results_dir}/{run}"
+
+    # Naming convnention changed in latest version of Ray
+    if os.path.exists(f"{path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}"):
+        return f"{path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}"
+    return f"{path}/checkpoint_{str.zfill(str(checkpoint), 6)}/checkpoint-{checkpoint}"
+
+
+def greedy_actions(
+    trainer,
+    policy_id,
+    observations,
+    ):
+    """
+    Computes the greedy actions of a policy on a batch of observations in a single forward pass
+    The observations are flattened, as the dictionary preprocessor flattens each observation in the
+    order of its sorted keys, and filtered as Trainer.compute_action does
+    :args   observations    dictionary of (n_observations, ...) arrays of each feature, see GraphSet.observations
+    :output actions         (n_observations,) actions
+    """
+    worker          = trainer.workers.local_worker()
+    preprocessor    = worker.preprocessors[policy_id]
+    obs_filter      = worker.filters[policy_id]
+
+    n_observations = len(next(iter(observations.values())))
+    batch = np.concatenate(
+        [np.reshape(observations[feature], (n_observations, -1)) for feature in sorted(observations)],
+        axis=1,
+    ).astype(np.float32)
+    assert batch.shape[1:] == tuple(preprocessor.shape), "The observations do not match the policy's observation space"
+
+    actions, _, _ = trainer.get_policy(policy_id).compute_actions(obs_filter(batch, update=False), explore=False)
+
+    return np.asarray(actions)
+
+
+# Observations per forward pass, which bounds the memory taken by large graph sets
+BATCH_SIZE = 65536
+
+
+def policy_actions(
+    trainer,
+    policy_id,
+    graphs,
+    seat,
+    context     = None,
+    batch_size  = BATCH_SIZE,
+    ):
+    """
+    Computes the greedy actions of a policy in the given seat on every graph of a graph set
+    :args   trainer     trainer restoring the policy, or a dictionary mapping policy ids to their
+                        compiled tables, see policy_table.load_policy_tables
+    :args   context     config entries of the pairing, see GraphSet.load
+    :output actions     (n_graphs,) actions
+    """
+    return stacked_policy_actions(trainer, policy_id, graphs, seat, [context], batch_size)[0]
+
+
+def stacked_policy_actions(
+    trainer,
+    policy_id,
+    graphs,
+    seat,
+    contexts,
+    batch_size  = BATCH_SIZE,
+    ):
+    """
+    Computes the greedy actions of a policy in the given seat on every graph, in each of several pairings
+    The observations of all pairings are stacked and run in chunks of batch_size, so a chunk spans as
+    many pairings as fit in it rather than taking one forward pass per pairing.
+    :args   trainer     trainer restoring the policy, or a dictionary of tables, see policy_actions
+    :args   contexts    config entries of each pairing, see GraphSet.load
+    :output actions     (n_contexts, n_graphs) actions
+    """
+    actions = np.zeros(len(contexts) * graphs.n_graphs, dtype=np.int64)
+
+    for start in range(0, len(actions), batch_size):
+        batch = np.arange(start, min(start + batch_size, len(actions)))
+        pairings, graph_ids = np.divmod(batch, graphs.n_graphs)
+
+        # Observations of the chunk, in the order of the pairings they belong to
+        parts = [
+            graphs.observations(seat, contexts[pairing], graph_ids[pairings == pairing])
+            for pairing in np.unique(pairings)
+        ]
+        observations = {feature: np.concatenate([part[feature] for part in parts]) for feature in parts[0]}
+
+        if isinstance(trainer, dict):
+            actions[batch] = trainer[policy_id].lookup(observations)
+        else:
+            actions[batch] = greedy_actions(trainer, policy_id, observations)
+
+    return actions.reshape(len(contexts), graphs.n_graphs)
+
+
+def weighted_summary(
+    graphs,
+    actions,
+    rewards,
+    system_values,
+    ):
+    """
+    Aggregates the outcomes of joint actions on the graph set, weighing each graph by its probability
+    The statistics follow experiment_statistics.summarize; on an exact graph set they are the expected
+    values under the generator rather than estimates.
+    :args   actions         (n_graphs, 2) actions of both agents
+    :args   rewards         (n_graphs, 2) rewards of both agents
+    :args   system_values   (n_graphs,) value of the system after clearing
+    :output summaries       one dictionary per sub scenario and rescue amount, followed by one for all graphs
+    """
+    graph_ids       = np.arange(graphs.n_graphs)
+    contributions   = graphs.contributions(graph_ids, actions)
+    total           = contributions.sum(axis=1)
+    rescue_amounts  = graphs.rescue_amounts.astype(float)
+    sub_scenarios   = np.asarray(graphs.sub_scenarios)
+
+    # In 'not in default' the rescue amount is 0, thus a rescue only occurs if the agents allocate assets
+    not_in_default  = (np.asarray(graphs.scenarios) == 'not in default') | (sub_scenarios == 'not in default')
+    rescued         = np.where(not_in_default, total > rescue_amounts, total >= rescue_amounts)
+    saved           = (total >= rescue_amounts) & (rescue_amounts != 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage_of_rescue_amount = np.where(saved, total / rescue_amounts, 0.0)
+        dominant_contribution       = np.where(total == 0, 0.50, contributions.max(axis=1) / total)
+
+    masks = []
+    for sub_scenario in sorted(set(graphs.sub_scenarios)):
+        in_sub_scenario = sub_scenarios == sub_scenario
+        for rescue_amount in np.unique(graphs.rescue_amounts[in_sub_scenario]):
+            masks.append((sub_scenario, int(rescue_amount), in_sub_scenario & (graphs.rescue_amounts == rescue_amount)))
+    masks.append(('all', 'all', np.ones(graphs.n_graphs, dtype=bool)))
+
+    summaries = []
+    for sub_scenario, rescue_amount, mask in masks:
+        probabilities = graphs.probabilities[mask]
+        saved_mass = probabilities[saved[mask]].sum()
+
+        summaries.append({
+            'sub_scenarios':                        sub_scenario,
+            'rescue_amount':                        rescue_amount,
+            'number_of_graphs':                     int(mask.sum()),
+            'probability':                          probabilities.sum(),
+            'percentage_saved':                     graphs.mean(rescued[mask], graph_ids[mask]),
+            'average_percentage_of_rescue_amount':  percentage_of_rescue_amount[mask] @ probabilities / saved_mass if saved_mass > 0 else np.nan,
+            'average_dominant_contribution':        graphs.mean(dominant_contribution[mask], graph_ids[mask]),
+            'agent 0 contribution':                 graphs.mean(contributions[mask, 0], graph_ids[mask]),
+            'agent 1 contribution':                 graphs.mean(contributions[mask, 1], graph_ids[mask]),
+            'agent 0 reward':                       graphs.mean(rewards[mask, 0], graph_ids[mask]),
+            'agent 1 reward':                       graphs.mean(rewards[mask, 1], graph_ids[mask]),
+            'system value':                         graphs.mean(system_values[mask], graph_ids[mask]),
+        })
+
+    return summaries
+
+
+def best_response_gains(
+    graphs,
+    actions,
+    context = None,
+    ):
+    """
+    Returns how much each agent would gain by deviating alone from the joint actions
+    Every valid action of an agent is played against the other agent's action on each graph; the gains
+    of both agents are 0 where the joint action is a Nash equilibrium of the graph's one-shot game.
+    :args   actions     (n_graphs, n_agents) actions of every agent
+    :args   context     config entries of the pairing, see GraphSet.load
+    :output gains       (n_graphs, n_agents) reward of the best response minus the reward of the action
+    """
+    graph_ids   = np.arange(graphs.n_graphs)
+    deviations  = np.arange(graphs.n_actions)
+    rewards, _  = graphs.play(graph_ids, actions, context)
+
+    gains = np.zeros((graphs.n_graphs, graphs.n_agents))
+    for agent in range(graphs.n_agents):
+        deviated = np.repeat(np.asarray(actions)[:, None, :], graphs.n_actions, axis=1)
+        deviated[:, :, agent] = deviations
+
+        deviation_rewards, _ = graphs.play(graph_ids[:, None], deviated, context)
+
+        # The action mask of the agent, as in GraphSet.observations
+        valid = deviations <= np.trunc(graphs.positions[:, agent:agent + 1])
+        gains[:, agent] = np.where(valid, deviation_rewards[..., agent], -np.inf).max(axis=1) - rewards[:, agent]
+
+    return gains
+
+
+# Observation features revealing the opponent, which make an agent's observation depend on the pairing
+OPPONENT_FEATURES = ['reveal_other_agents_identity', 'reveal_other_agents_beta']
+
+
+def pairing_context(
+    members,
+    agent_0_member,
+    agent_1_member,
+    ):
+    """
+    Config entries of a pairing of pool members, as the callbacks set them during training
+    :args   members     dictionary mapping the pool members to their betas
+    """
+    return {
+        'agent_0_policy':   agent_0_member,
+        'agent_0_beta':     members[agent_0_member],
+        'agent_1_policy':   agent_1_member,
+        'agent_1_beta':     members[agent_1_member],
+    }
+
+
+def cross_play(
+    trainer,
+    graphs,
+    members,
+    shared_policy = None,
+    ):
+    """
+    Plays every ordered pairing of pool members, in both seats, on the graph set
+
+    Each member's policy is run once per seat over every graph (and every opponent, when observations
+    reveal the opponent), stacked in chunks of BATCH_SIZE observations.  The outcome of a pairing then
+    combines the cached actions of its two members.
+    :args   trainer         trainer restoring the policies, or a dictionary of their tables, see policy_actions
+    :args   members         dictionary mapping the pool members to their betas
+    :args   shared_policy   policy playing every member, for a shared pooled policy; by default each
+                            member plays its own policy
+    :output actions         (n_members, n_members, n_graphs, 2) actions with member i in seat 0 and member j in seat 1
+    :output rewards         (n_members, n_members, n_graphs, 2) rewards of the same pairings
+    :output system_values   (n_members, n_members, n_graphs) value of the system after clearing
+    """
+    names       = list(members)
+    n_members   = len(names)
+    graph_ids   = np.arange(graphs.n_graphs)
+
+    # The observations only differ between opponents if they reveal the opponent
+    opponent_dependent = any(graphs.config.get(feature) for feature in OPPONENT_FEATURES)
+    opponents = names if opponent_dependent else names[:1]
+
+    # Actions of member i in the given seat against member j, on every graph
+    seat_actions = np.zeros((2, n_members, n_members, graphs.n_graphs), dtype=np.int64)
+
+    for seat in range(2):
+        for i, member in enumerate(names):
+            contexts = [
+                pairing_context(members, *((member, opponent) if seat == 0 else (opponent, member)))
+                for opponent in opponents
+            ]
+            seat_actions[seat, i, :len(opponents)] = stacked_policy_actions(trainer, shared_policy or member, graphs, seat, contexts)
+
+            # Otherwise the same actions are played against every opponent
+            seat_actions[seat, i, len(opponents):] = seat_actions[seat, i, 0]
+
+    actions = np.stack([seat_actions[0], seat_actions[1].transpose(1, 0, 2)], axis=-1)
+
+    rewards         = np.zeros(actions.shape)
+    system_values   = np.zeros(actions.shape[:-1])
+    for i, agent_0_member in enumerate(names):
+        for j, agent_1_member in enumerate(names):
+            rewards[i, j], system_values[i, j] = graphs.play(
+                graph_ids,
+                actions[i, j],
+                pairing_context(members, agent_0_member, agent_1_member),
+            )
+
+    return actions, rewards, system_values
+
+
+class ActionCache:
+    """
+    Greedy actions of restored policies on a graph set, stored as .npy files
+
+    The actions of a policy are keyed by its trial, checkpoint and policy id and by the graph set,
+    so a policy only needs to be restored and run once however many evaluations it takes part in.
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        ) -> None:
+
+        self.cache_dir = cache_dir
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+
+    def path(
+        self,
+        *key,
+        ):
+        return f"{self.cache_dir}/{hashlib.sha1('|'.join(str(part) for part in key).encode()).hexdigest()}.npy"
+
+
+    def get(
+        self,
+        *key,
+        ):
+        """
+        Returns the cached actions, or None
+        """
+        path = self.path(*key)
+        if os.path.exists(path):
+            return np.load(path)
+        return None
+
+
+    def put(
+        self,
+        actions,
+        *key,
+        ):
+        np.save(self.path(*key), actions)
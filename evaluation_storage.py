@@ -0,0 +1,250 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    FILE_FORMAT = 'parquet'
+except ImportError:
+    pyarrow = None
+    FILE_FORMAT = 'csv'
+
+
+EVALUATIONS_ROOT = './data/evaluations'
+
+# Low cardinality strings are stored as dictionary encoded categoricals
+CATEGORICAL_COLUMNS = [
+    'scenario',
+    'sub_scenarios',
+    'agent_0_policies',
+    'agent_1_policies',
+    'run_identifiers',
+]
+
+# Every other known column is stored with a compact numeric type
+# Actions are floats, as continuous actions are fractions of the assets
+NUMERIC_DTYPES = {
+    'experiment_number':        'int32',
+    'trials':                   'int16',
+    'beta':                     'float32',
+    'rescue_amount':            'int16',
+    'agent 0 actions':          'float32',
+    'agent 1 actions':          'float32',
+    'agent 0 betas':            'float32',
+    'agent 1 betas':            'float32',
+    'agent 0 assets':           'float32',
+    'agent 1 assets':           'float32',
+    'distressed bank assets':   'float32',
+    'debt owed agent 0':        'float32',
+    'debt owed agent 1':        'float32',
+}
+
+
+def encode(
+    data
+    ):
+    """
+    Converts a dataset to the typed representation used on disk
+    """
+    data = data.copy()
+    for column in data.columns:
+        if column in CATEGORICAL_COLUMNS:
+            data[column] = data[column].astype(str).astype('category')
+        elif column in NUMERIC_DTYPES:
+            data[column] = data[column].astype(NUMERIC_DTYPES[column])
+    return data
+
+
+def partition_dir(
+    experiment_number,
+    run,
+    root = EVALUATIONS_ROOT,
+    ):
+    return f'{root}/experiment={experiment_number}/run={run}'
+
+
+def write_partition(
+    data,
+    experiment_number,
+    run,
+    part = 0,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Writes the evaluation data of one run of an experiment as a typed columnar file
+    :args   data                evaluation dataset of a single run
+    :args   experiment_number   experiment the run belongs to
+    :args   run                 index of the run (trial) within the experiment
+    :args   part                index of the file within the partition, for chunked writers
+    :output path                path of the written file
+    """
+    save_dir = partition_dir(experiment_number, run, root)
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    path = f'{save_dir}/part-{part:05d}.{FILE_FORMAT}'
+    data = encode(data)
+
+    if FILE_FORMAT == 'parquet':
+        data.to_parquet(path, index=False)
+    else:
+        data.to_csv(path, index=False)
+
+    return path
+
+
+def clear_partition(
+    experiment_number,
+    run,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Removes the files of a partition before it is rewritten
+    """
+    for path in glob.glob(f'{partition_dir(experiment_number, run, root)}/part-*'):
+        os.remove(path)
+
+
+def read_evaluations(
+    experiment_numbers,
+    columns = None,
+    runs = None,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Reads the evaluation data of the requested experiments, runs and columns only
+    Experiments without partitions fall back onto the legacy experimental_data.csv
+    :args   experiment_numbers  an experiment number or a list of experiment numbers
+    :args   columns             columns to load; None loads every column
+    :args   runs                runs to load; None loads every run
+    :output data                concatenated evaluation dataset
+    """
+    if np.isscalar(experiment_numbers):
+        experiment_numbers = [experiment_numbers]
+
+    datasets = []
+    for experiment_number in experiment_numbers:
+
+        paths = sorted(glob.glob(f'{root}/experiment={experiment_number}/run=*/part-*'))
+        if runs is not None:
+            paths = [path for path in paths if _run_of(path) in runs]
+
+        if len(paths) == 0:
+            datasets.append(_read_legacy(experiment_number, columns, runs))
+            continue
+
+        for path in paths:
+            datasets.append(_read_file(path, columns))
+
+    data = pd.concat(datasets, ignore_index=True)
+
+    # Concatenation drops categoricals whose categories differ across files
+    for column in data.columns:
+        if column in CATEGORICAL_COLUMNS and data[column].dtype != 'category':
+            data[column] = data[column].astype('category')
+
+    return data
+
+
+def evaluation_paths(
+    experiment_number,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Returns the files holding the evaluation data of an experiment
+    """
+    paths = sorted(glob.glob(f'{root}/experiment={experiment_number}/run=*/part-*'))
+    if len(paths) == 0:
+        paths = [f'./data/checkpoints/{experiment_number}/experimental_data.csv']
+    return paths
+
+
+def write_statistics(
+    summary,
+    experiment_number,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Stores the summary statistics of an experiment (as returned by experiment_statistics.summarize)
+    """
+    save_dir = f'{root}/statistics/experiment={experiment_number}'
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    path = f'{save_dir}/statistics.{FILE_FORMAT}'
+    summary = encode(summary)
+
+    if FILE_FORMAT == 'parquet':
+        summary.to_parquet(path, index=False)
+    else:
+        summary.to_csv(path, index=False)
+
+    return path
+
+
+def statistics_path(
+    experiment_number,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Returns the file holding the summary statistics of an experiment, or None
+    """
+    paths = glob.glob(f'{root}/statistics/experiment={experiment_number}/statistics.*')
+    return paths[0] if len(paths) > 0 else None
+
+
+def read_statistics(
+    experiment_number,
+    columns = None,
+    root = EVALUATIONS_ROOT,
+    ):
+    """
+    Reads the requested columns of the summary statistics of an experiment
+    Returns None if the experiment has no stored statistics
+    """
+    path = statistics_path(experiment_number, root)
+    if path is None:
+        return None
+    return _read_file(path, columns)
+
+
+def _run_of(
+    path
+    ):
+    return int(os.path.basename(os.path.dirname(path)).split('=')[-1])
+
+
+def _read_file(
+    path,
+    columns = None,
+    ):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+
+    dtypes = dict(NUMERIC_DTYPES)
+    dtypes.update({column: 'category' for column in CATEGORICAL_COLUMNS})
+    return pd.read_csv(path, usecols=columns, dtype=dtypes)
+
+
+def _read_legacy(
+    experiment_number,
+    columns = None,
+    runs = None,
+    ):
+    usecols = None
+    if columns is not None:
+        usecols = list(columns) + (['trials'] if runs is not None and 'trials' not in columns else [])
+
+    data = encode(pd.read_csv(
+        f'./data/checkpoints/{experiment_number}/experimental_data.csv',
+        usecols = usecols,
+    ))
+
+    if runs is not None and 'trials' in data.columns:
+        data = data[data['trials'].isin(runs)]
+        if columns is not None:
+            data = data[list(columns)]
+
+    return data
@@ -1,13 +1,83 @@
 import ray
-import json
+import numpy as np
 import pandas as pd
 import os
+import sys
 
 from utils import get_args
+from results_index import get_successful_trials
+from recorder import EvaluationRecorder
+from policy_table import load_policy_tables
+from evaluation import GraphSet, inference_config, checkpoint_path, policy_actions, weighted_summary
 from trainer import setup
 from ray.rllib.agents.dqn import DQNTrainer
 from env import Volunteers_Dilemma
 
+
+# Columns of the evaluation dataset
+EVALUATION_COLUMNS = [
+    'experiment_number',
+    'trials',
+    'beta',
+    'scenario',
+    'sub_scenarios',
+    'rescue_amount',
+    'agent 0 actions',
+    'agent 1 actions',
+    'agent 0 assets',
+    'agent 1 assets',
+    'distressed bank assets',
+    'debt owed agent 0',
+    'debt owed agent 1',
+    'run_identifiers',
+]
+
+
+def exact_evaluation(
+    args,
+    config,
+    checkpoint,
+    runs,
+    ):
+    """
+    Plays every graph the generator can draw once, instead of sampling episodes
+    Each policy takes batched forward passes over all graphs; the statistics are weighted by the
+    probability of each graph, which makes them exact expectations
+    :output summary     statistics per run, sub scenario and rescue amount
+    """
+    graphs = GraphSet(vars(args), exact=True)
+    graph_ids = np.arange(graphs.n_graphs)
+
+    if not args.policy_tables:
+        agent = DQNTrainer(config=inference_config(config), env=Volunteers_Dilemma)
+
+    summaries = []
+    for i, run in enumerate(runs):
+
+        # The compiled tables of the policies stand in for the restored networks
+        if args.policy_tables:
+            agent = load_policy_tables(run, checkpoint, [f'policy_{seat}' for seat in range(args.n_agents)])
+        else:
+            agent.restore(checkpoint_path(run, checkpoint))
+
+        actions = np.stack([policy_actions(agent, f'policy_{seat}', graphs, seat) for seat in range(args.n_agents)], axis=-1)
+        rewards, system_values = graphs.play(graph_ids, actions)
+
+        for summary in weighted_summary(graphs, actions, rewards, system_values):
+            summaries.append({
+                'experiment_number':    args.experiment_number,
+                'trials':               i,
+                'beta':                 args.beta,
+                'scenario':             args.scenario,
+                'run_identifiers':      run,
+                **summary,
+            })
+
+        print(f'{run}: {100 * summaries[-1]["percentage_saved"]:.2f}% saved over {graphs.n_graphs} graphs')
+
+    return pd.DataFrame.from_records(summaries)
+
+
 if __name__ == "__main__":
 
     # Retrieve the configurations used for the experiment
@@ -31,34 +101,28 @@ if __name__ == "__main__":
     else:
         n_rounds = 100
 
-    # Read the json file containing a dictionary
-    # specifying where the trained agent is stored
-    with open('results_dictionary.json') as f:
-        data = f.read()
-    dictionary = json.loads(data)
-    runs = dictionary[str(args.experiment_number)]
+    # Query the results index for where the trained agents are stored
+    runs = get_successful_trials(args.experiment_number)
     
     # Create directory to store evaluation results
     if not os.path.exists(f'./data/checkpoints/{args.experiment_number}'):
         os.makedirs(f'./data/checkpoints/{args.experiment_number}')
 
-    experiment_number           = []
-    betas                       = []
-    trials                      = []
-    run_identifiers             = []
-    agent_0_actions             = []
-    agent_1_actions             = []
-    inverted_agent_0_actions    = []
-    inverted_agent_1_actions    = []
-    agent_0_assets              = []
-    agent_1_assets              = []
-    distressed_bank_assets      = []
-    debt_owed_agent_0           = []
-    debt_owed_agent_1           = []
-    optimal_allocation          = []
-    scenarios                   = []
-    sub_scenarios               = []
-    rescue_amounts              = []
+    # Every valid graph is played once instead of sampling episodes
+    if args.exact_evaluation:
+        exact_evaluation(args, config, checkpoint, runs).to_csv(
+            f'./data/checkpoints/{args.experiment_number}/exact_evaluation.csv',
+            index=False,
+        )
+        ray.shutdown()
+        sys.exit()
+
+    # Rows are streamed to the run's partition and to experimental_data.csv in fixed-size chunks
+    recorder = EvaluationRecorder(
+        experiment_number   = args.experiment_number,
+        columns             = EVALUATION_COLUMNS,
+        legacy_path         = f'./data/checkpoints/{args.experiment_number}/experimental_data.csv',
+    )
 
 
     # Begin evaluations
@@ -67,31 +131,28 @@ if __name__ == "__main__":
         # Specify path to the stored agent
         path = f"/itet-stor/bryayu/net_scratch/results/{run}"
 
-        # Create directory for storing results
-        root_dir = f'./data/checkpoints/{args.experiment_number}'
+        # Store this run as a typed columnar partition
+        recorder.start_run(i)
 
-        # Initialize and load the agent
-        agent = DQNTrainer(config=config, env=Volunteers_Dilemma)
+        # Load the compiled tables of the policies, which act as the restored agent would
+        if args.policy_tables:
+            tables = load_policy_tables(run, checkpoint, [f'policy_{seat}' for seat in range(args.n_agents)])
 
-        # Naming convnention changed in latest version of Ray
-        if os.path.exists(f"{path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}"):
-            agent.restore(f"{path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}")
+        # Initialize and load the agent
         else:
-            agent.restore(f"{path}/checkpoint_{str.zfill(str(checkpoint), 6)}/checkpoint-{checkpoint}")
+            agent = DQNTrainer(config=config, env=Volunteers_Dilemma)
+
+            # Naming convnention changed in latest version of Ray
+            if os.path.exists(f"{path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}"):
+                agent.restore(f"{path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}")
+            else:
+                agent.restore(f"{path}/checkpoint_{str.zfill(str(checkpoint), 6)}/checkpoint-{checkpoint}")
 
-        # instantiate env class
-        env = Volunteers_Dilemma(vars(args))
+        # instantiate env class, drawing graphs from the evaluation stream rather than the training stream
+        env = Volunteers_Dilemma(dict(vars(args), in_evaluation=True))
 
         """ Main Loop """
         for _ in range(n_rounds):
-            # Placeholder for agents actions in this round
-            a_0     = []
-            a_1     = []
-            
-            # for inverted actions
-            if args.invert_actions:
-                inverted_a_0 = []
-                inverted_a_1 = []
 
             # Reset the environment
             obs = env.reset()
@@ -101,68 +162,55 @@ if __name__ == "__main__":
             actions = {}
             
             # Agent 0 decides an action
-            action_0 = agent.compute_action(
-                obs[0], 
-                policy_id='policy_0'
-            )
+            if args.policy_tables:
+                action_0 = tables['policy_0'].compute_action(obs[0])
+            else:
+                action_0 = agent.compute_action(
+                    obs[0], 
+                    policy_id='policy_0'
+                )
             actions[0] = action_0
             
             if args.n_agents == 2:
 
                 # Agent 1 decides an action
-                action_1 = agent.compute_action(
-                    obs[1], 
-                    policy_id='policy_1'
-                )
+                if args.policy_tables:
+                    action_1 = tables['policy_1'].compute_action(obs[1])
+                else:
+                    action_1 = agent.compute_action(
+                        obs[1], 
+                        policy_id='policy_1'
+                    )
                 actions[1] = action_1
 
             # Conduct a transition in the environment
             obs, _, _, info = env.step(actions)
 
-            # store the actions of each agent for statistics
-            experiment_number.append(args.experiment_number)
-            trials.append(i)
-            betas.append(args.beta)
-            run_identifiers.append(run)
-            agent_0_assets.append(env.position[0])
-            agent_1_assets.append(env.position[1])              
-            distressed_bank_assets.append(env.position[2])
-            debt_owed_agent_0.append(env.adjacency_matrix[2,0])
-            debt_owed_agent_1.append(env.adjacency_matrix[2,1])
-            agent_0_actions.append(action_0)
-            agent_1_actions.append(action_1)
-            scenarios.append(env.config.get('scenario'))
-            rescue_amounts.append(env.config.get('rescue_amount'))
-
             # Store the subenvironment; else None
             if env.config.get('scenario') == 'uniformly mixed':
-                sub_scenarios.append(env.generator.sub_scenario)
+                sub_scenario = env.generator.sub_scenario
             else:
-                sub_scenarios.append("not applicable")
-                
-
-        """ Store experimental data """
-        data = {
-            'experiment_number': experiment_number,
-            'trials':trials,
-            'beta': betas,
-            'scenario': scenarios,
-            'sub_scenarios': sub_scenarios,
-            'rescue_amount': rescue_amounts,
-            'agent 0 actions': agent_0_actions,
-            'agent 1 actions': agent_1_actions,
-            'agent 0 assets': agent_0_assets,
-            'agent 1 assets': agent_1_assets,
-            'distressed bank assets': distressed_bank_assets,
-            'debt owed agent 0': debt_owed_agent_0,
-            'debt owed agent 1': debt_owed_agent_1,
-            'run_identifiers' : run_identifiers,
-            }        
-        
-        df = pd.DataFrame(data=data)
-        df.to_csv(
-            f'{root_dir}/experimental_data.csv', 
-            index=False,
-        )  
+                sub_scenario = "not applicable"
+
+            # store the actions of each agent for statistics
+            recorder.record(**{
+                'experiment_number':        args.experiment_number,
+                'trials':                   i,
+                'beta':                     args.beta,
+                'scenario':                 env.config.get('scenario'),
+                'sub_scenarios':            sub_scenario,
+                'rescue_amount':            env.config.get('rescue_amount'),
+                'agent 0 actions':          action_0,
+                'agent 1 actions':          action_1,
+                'agent 0 assets':           env.position[0],
+                'agent 1 assets':           env.position[1],
+                'distressed bank assets':   env.position[2],
+                'debt owed agent 0':        env.adjacency_matrix[2,0],
+                'debt owed agent 1':        env.adjacency_matrix[2,1],
+                'run_identifiers':          run,
+            })
+
+    # Write the rows of the last run
+    recorder.flush()
 
     ray.shutdown()
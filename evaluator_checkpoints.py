@@ -0,0 +1,174 @@
+import ray
+from ray.util import ActorPool
+from ray.rllib.agents.dqn import DQNTrainer
+from utils import get_args
+from results_index import get_successful_trials, get_checkpoints
+from policy_table import load_policy_tables, table_path
+from evaluation import RESULTS_DIR, GraphSet, cross_play, inference_config, checkpoint_path, policy_actions, weighted_summary
+
+import numpy as np
+import pandas as pd
+import os
+
+
+# Graphs shared by every checkpoint, unless every graph is played with --exact-evaluation
+N_GRAPHS = 1000
+
+
+def evaluate_checkpoint(
+    agent,
+    graphs,
+    policy_ids,
+    members         = None,
+    shared_policy   = None,
+    ):
+    """
+    Plays the policies of a restored checkpoint on the graph set
+    Independent policies play each other, one per seat; pooled members play every ordered pairing.
+    :args   agent           trainer holding the checkpoint, or a dictionary of the policies' tables
+    :args   policy_ids      policies of the checkpoint
+    :args   members         dictionary mapping the pool members to their betas; None if not pooled
+    :args   shared_policy   policy playing every member, for a shared pooled policy
+    :output summaries       statistics per pairing, sub scenario and rescue amount, see weighted_summary
+    """
+    summaries = []
+
+    if members is None:
+        actions = np.stack([policy_actions(agent, policy_ids[seat], graphs, seat) for seat in range(graphs.n_agents)], axis=-1)
+        rewards, system_values = graphs.play(np.arange(graphs.n_graphs), actions)
+
+        for summary in weighted_summary(graphs, actions, rewards, system_values):
+            summaries.append({
+                'agent_0_policies': policy_ids[0],
+                'agent_1_policies': policy_ids[1],
+                **summary,
+            })
+
+        return summaries
+
+    actions, rewards, system_values = cross_play(agent, graphs, members, shared_policy)
+
+    names = list(members)
+    for m0, agent_0_policy in enumerate(names):
+        for m1, agent_1_policy in enumerate(names):
+            for summary in weighted_summary(graphs, actions[m0, m1], rewards[m0, m1], system_values[m0, m1]):
+                summaries.append({
+                    'agent_0_policies': agent_0_policy,
+                    'agent_1_policies': agent_1_policy,
+                    'agent 0 betas':    members[agent_0_policy],
+                    'agent 1 betas':    members[agent_1_policy],
+                    **summary,
+                })
+
+    return summaries
+
+
+@ray.remote
+class CheckpointEvaluator:
+    """
+    Restores checkpoints of an experiment, one at a time, and evaluates them on the shared graph set
+
+    The graph set is generated once by the driver and read from the object store, so every evaluator
+    plays the same graphs.  Each evaluator builds a single trainer which restores every checkpoint it
+    is given, and memoizes the outcomes of the graph set across checkpoints.  With --policy-tables,
+    checkpoints whose policies were compiled are looked up instead; the trainer is only built once a
+    checkpoint without tables is met.
+    """
+
+    def __init__(
+        self,
+        args,
+        config,
+        graphs,
+        members         = None,
+        shared_policy   = None,
+        ) -> None:
+
+        self.args           = args
+        self.graphs         = graphs
+        self.members        = members
+        self.shared_policy  = shared_policy
+        self.config         = config
+        self.policy_ids     = sorted(config['multiagent']['policies'])
+        self.trainer        = None
+
+
+    def evaluate(
+        self,
+        run,
+        checkpoint,
+        ):
+        """
+        Evaluates a checkpoint of a trial
+        :output summaries   statistics of the checkpoint, see evaluate_checkpoint
+        """
+        # Usually only the final checkpoint is compiled, see policy_table.py
+        compiled = all(os.path.exists(table_path(run, checkpoint, policy_id)) for policy_id in self.policy_ids)
+
+        if self.args.policy_tables and compiled:
+            agent = load_policy_tables(run, checkpoint, self.policy_ids)
+        else:
+            if self.trainer is None:
+                self.trainer = DQNTrainer(config=inference_config(self.config))
+            agent = self.trainer
+            agent.restore(checkpoint_path(run, checkpoint))
+
+        summaries = evaluate_checkpoint(agent, self.graphs, self.policy_ids, self.members, self.shared_policy)
+
+        return [
+            dict(run_identifiers=run, training_iteration=checkpoint, **summary)
+            for summary in summaries
+        ]
+
+
+if __name__ == "__main__":
+
+    # Retrieve the configurations used for the experiment
+    args = get_args()
+    ray.init(local_mode = args.local_mode)
+
+    if args.pooled_training:
+        from trainer_pooled import setup, SHARED_POLICY
+    else:
+        from trainer import setup
+
+    config, stop = setup(args)
+
+    # Every checkpoint stored by every completed trial
+    runs = get_successful_trials(args.experiment_number)
+    tasks = [(run, checkpoint) for run in runs for checkpoint in get_checkpoints(run, RESULTS_DIR)]
+
+    # Create directory to store evaluation results
+    if not os.path.exists(f'./data/checkpoints/{args.experiment_number}'):
+        os.makedirs(f'./data/checkpoints/{args.experiment_number}')
+
+    # The graph set is placed in the object store once and shared by the evaluators
+    graphs = GraphSet(vars(args), N_GRAPHS, seed=args.seed, exact=args.exact_evaluation)
+    graphs_reference = ray.put(graphs)
+
+    members         = args.policies if args.pooled_training else None
+    shared_policy   = SHARED_POLICY if args.pooled_training and args.shared_pooled_policy else None
+
+    # Checkpoints are evaluated concurrently, each evaluator taking the next one when it is done
+    evaluators = [
+        CheckpointEvaluator.remote(args, config, graphs_reference, members, shared_policy)
+        for _ in range(max(1, min(args.n_workers, len(tasks))))
+    ]
+    pool = ActorPool(evaluators)
+
+    summaries = []
+    for results in pool.map_unordered(lambda evaluator, task: evaluator.evaluate.remote(*task), tasks):
+        summaries += results
+
+        # Summaries over all graphs, one per pairing
+        saved = np.mean([result['percentage_saved'] for result in results if result['sub_scenarios'] == 'all'])
+        print(f'{results[0]["run_identifiers"]} iteration {results[0]["training_iteration"]}: {100 * saved:.2f}% saved over {graphs.n_graphs} graphs')
+
+    learning_curves = pd.DataFrame.from_records(summaries)
+    learning_curves.insert(0, 'experiment_number', args.experiment_number)
+    learning_curves.insert(1, 'scenario', args.scenario)
+    learning_curves = learning_curves.sort_values(['run_identifiers', 'training_iteration'], kind='stable')
+
+    learning_curves.to_csv(f'./data/checkpoints/{args.experiment_number}/learning_curves.csv', index=False)
+
+    ray.shutdown()
@@ -1,13 +1,83 @@
 import ray
-import json
 from utils import get_args
-from trainer_pooled import setup
+from results_index import get_successful_trials
+from recorder import EvaluationRecorder
+from policy_table import load_policy_tables
+from evaluation import GraphSet, cross_play, inference_config, checkpoint_path, weighted_summary
+from trainer_pooled import setup, SHARED_POLICY
 from ray.rllib.agents.dqn import DQNTrainer
-from env import Volunteers_Dilemma
-from itertools import combinations_with_replacement
 
+import numpy as np
 import pandas as pd
 import os
+import sys
+
+
+# Columns of the evaluation dataset
+EVALUATION_COLUMNS = [
+    'trials',
+    'scenario',
+    'sub_scenarios',
+    'rescue_amount',
+    'agent 0 actions',
+    'agent 1 actions',
+    'agent_0_policies',
+    'agent_1_policies',
+    'agent 0 betas',
+    'agent 1 betas',
+    'agent 0 assets',
+    'agent 1 assets',
+    'distressed bank assets',
+    'debt owed agent 0',
+    'debt owed agent 1',
+]
+
+
+def exact_evaluation(
+    args,
+    config,
+    checkpoint,
+    runs,
+    shared_policy = None,
+    ):
+    """
+    Plays every ordered pairing on every graph the generator can draw, instead of sampling episodes
+    The statistics of each pairing are weighted by the probability of each graph, which makes them
+    exact expectations
+    :output summary     statistics per run, pairing, sub scenario and rescue amount
+    """
+    graphs  = GraphSet(vars(args), exact=True)
+    members = args.policies
+    names   = list(members)
+
+    if not args.policy_tables:
+        agent = DQNTrainer(config=inference_config(config))
+
+    summaries = []
+    for i, run in enumerate(runs):
+
+        # The compiled tables of the policies stand in for the restored networks
+        if args.policy_tables:
+            agent = load_policy_tables(run, checkpoint, config['multiagent']['policies'])
+        else:
+            agent.restore(checkpoint_path(run, checkpoint))
+
+        actions, rewards, system_values = cross_play(agent, graphs, members, shared_policy)
+
+        for m0, agent_0_policy in enumerate(names):
+            for m1, agent_1_policy in enumerate(names):
+                for summary in weighted_summary(graphs, actions[m0, m1], rewards[m0, m1], system_values[m0, m1]):
+                    summaries.append({
+                        'trials':           i,
+                        'scenario':         args.scenario,
+                        'agent_0_policies': agent_0_policy,
+                        'agent_1_policies': agent_1_policy,
+                        'agent 0 betas':    members[agent_0_policy],
+                        'agent 1 betas':    members[agent_1_policy],
+                        **summary,
+                    })
+
+    return pd.DataFrame.from_records(summaries)
 
 
 if __name__ == "__main__":
@@ -17,156 +87,92 @@ if __name__ == "__main__":
     ray.init(local_mode = args.local_mode)
     config, stop = setup(args)
 
-    # Remove episode greedy so that the agent acts deterministically
-    config['explore'] = False
-
-    # Remove the seed used in training
-    if 'seed' in config.keys():
-        config.pop('seed')
-
     # Only consider the latest checkpoint in the directory
     checkpoint = stop.get('training_iteration')
 
-    # Conduct 100 episodes in the evaluation
+    # Conduct 100 episodes per pairing in the evaluation
     n_rounds = 100
 
-    # Read the json file containing a dictionary
-    # specifying where the trained agent is stored
-    with open('results_dictionary.json') as f:
-        data = f.read()
-    dictionary = json.loads(data)
-    runs = dictionary[str(args.experiment_number)]
-    
+    # Query the results index for where the trained agents are stored
+    runs = get_successful_trials(args.experiment_number)
+
     # Create directory to store evaluation results
     if not os.path.exists(f'./data/checkpoints/{args.experiment_number}'):
         os.makedirs(f'./data/checkpoints/{args.experiment_number}')
 
+    # The pool members; a shared pooled policy plays every member
+    members = args.policies
+    names = list(members)
+    betas = np.array([members[name] for name in names])
+    shared_policy = SHARED_POLICY if getattr(args, 'shared_pooled_policy', False) else None
+
+    # Every valid graph is played once instead of sampling episodes
+    if args.exact_evaluation:
+        exact_evaluation(args, config, checkpoint, runs, shared_policy).to_csv(
+            f'./data/checkpoints/{args.experiment_number}/exact_evaluation.csv',
+            index=False,
+        )
+        ray.shutdown()
+        sys.exit()
+
+    # Every run and every pairing plays the same graphs
+    graphs = GraphSet(vars(args), n_rounds, seed=args.seed)
+
+    # Rows are streamed to the run's partition and to experimental_data.csv in fixed-size chunks
+    recorder = EvaluationRecorder(
+        experiment_number   = args.experiment_number,
+        columns             = EVALUATION_COLUMNS,
+        legacy_path         = f'./data/checkpoints/{args.experiment_number}/experimental_data.csv',
+    )
+
+    # Initialize the agent, acting greedily; each run restores its weights or loads its compiled tables
+    if not args.policy_tables:
+        agent = DQNTrainer(config=inference_config(config))
+
+    # Index of the agent 0 member, agent 1 member and graph of each row, for every ordered pairing
+    agent_0_member, agent_1_member, graph = np.meshgrid(
+        np.arange(len(names)),
+        np.arange(len(names)),
+        np.arange(graphs.n_graphs),
+        indexing='ij',
+    )
+    agent_0_member, agent_1_member, graph = agent_0_member.ravel(), agent_1_member.ravel(), graph.ravel()
+
     # Begin evaluations
     for i, run in enumerate(runs):
 
-        # Specify path to the stored agent
-        path = f"/itet-stor/bryayu/net_scratch/results/{run}"
-
-        # Create placeholders for agent's decisions
-        # Used for generating statistics
-        agent_0_policies            = []
-        agent_1_policies            = []
-        agent_0_betas               = []
-        agent_1_betas               = []
-        agent_0_actions             = []
-        agent_1_actions             = []
-        agent_0_assets              = []
-        agent_1_assets              = []
-        distressed_bank_assets      = []
-        debt_owed_agent_0           = []
-        debt_owed_agent_1           = []
-        scenarios                   = []
-        sub_scenarios               = []
-        rescue_amounts              = []
-
-        # Create directory for storing results
-        root_dir = f'./data/checkpoints/{args.experiment_number}'
-
-        # Initialize and load the agent
-        agent = DQNTrainer(config=config, env=Volunteers_Dilemma)
-        agent.restore(f"{path}/checkpoint_{str.zfill(str(checkpoint), 6)}/checkpoint-{checkpoint}")
-
-        # instantiate env class
-        env = Volunteers_Dilemma(vars(args))
-
-        policies = config.get('multiagent').get('policies').keys()
-
-        # Iterate through the combination of policies
-        for agent_0_policy, agent_1_policy in combinations_with_replacement(policies, 2):
-
-            agent_0_beta = config\
-                .get('multiagent')\
-                .get('policies')\
-                .get(agent_0_policy)[3]\
-                .get('beta')
-
-            agent_1_beta = config\
-                .get('multiagent')\
-                .get('policies')\
-                .get(agent_1_policy)[3]\
-                .get('beta')
-
-            """ Main Loop """
-            for i in range(n_rounds):
-
-                # Reset the environment
-                obs = env.reset()
-
-                # Define the actions dictionary used
-                # to transition the environment
-                actions = {}
-                
-                # Agent 0 decides an action
-                action_0 = agent.compute_action(
-                    obs[0], 
-                    policy_id = agent_0_policy
-                )
-                actions[0] = action_0
-                
-
-                # Agent 1 decides an action
-                action_1 = agent.compute_action(
-                    obs[1], 
-                    policy_id = agent_1_policy
-                )
-                actions[1] = action_1
-
-                # Conduct a transition in the environment
-                obs, _, _, info = env.step(actions)
-
-                # Collect some statistics for logging
-                rescue_amount = env.config.get('rescue_amount')
-
-                # Logging
-                agent_0_policies.append(agent_0_policy)
-                agent_1_policies.append(agent_1_policy)
-                agent_0_betas.append(agent_0_beta)
-                agent_1_betas.append(agent_1_beta)
-                agent_0_assets.append(env.position[0])
-                agent_1_assets.append(env.position[1])              
-                agent_0_actions.append(actions[0])
-                agent_1_actions.append(actions[1])
-                rescue_amounts.append(rescue_amount)            
-                distressed_bank_assets.append(env.position[2])
-                debt_owed_agent_0.append(env.adjacency_matrix[2,0])
-                debt_owed_agent_1.append(env.adjacency_matrix[2,1])
-                scenarios.append(env.config.get('scenario'))
-
-                # Store the subenvironment; else None
-                if env.config.get('scenario') == 'uniformly mixed':
-                    sub_scenarios.append(env.generator.sub_scenario)
-                else:
-                    sub_scenarios.append("not applicable")
+        # Store this run as a typed columnar partition
+        recorder.start_run(i)
+
+        if args.policy_tables:
+            agent = load_policy_tables(run, checkpoint, config['multiagent']['policies'])
+        else:
+            agent.restore(checkpoint_path(run, checkpoint))
 
+        # Every member acts once per seat on the graphs; the pairings combine their actions
+        actions, rewards, system_values = cross_play(agent, graphs, members, shared_policy)
+        actions = actions.reshape(-1, 2)
 
         """ Store experimental data """
-        data = {
-            # 'experiment number': args.experiment_number,
-            'scenario': scenarios,
-            'sub_scenarios': sub_scenarios,
-            'rescue_amount': rescue_amounts,
-            'agent 0 actions': agent_0_actions,
-            'agent 1 actions': agent_1_actions,
-            'agent_0_policies': agent_0_policies,
-            'agent_1_policies': agent_1_policies,
-            'agent 0 betas': agent_0_betas,
-            'agent 1 betas': agent_1_betas,
-            'agent 0 assets': agent_0_assets,
-            'agent 1 assets': agent_1_assets,
-            'distressed bank assets': distressed_bank_assets,
-            'debt owed agent 0': debt_owed_agent_0,
-            'debt owed agent 1': debt_owed_agent_1,
-            }        
-        
-        df = pd.DataFrame(data=data)
-        df.to_csv(
-            f'{root_dir}/experimental_data.csv', 
-            index=False,
-        )  
+        recorder.record(**{
+            'trials':                   i,
+            'scenario':                 np.array(graphs.scenarios)[graph],
+            'sub_scenarios':            np.array(graphs.sub_scenarios)[graph],
+            'rescue_amount':            graphs.rescue_amounts[graph],
+            'agent 0 actions':          actions[:, 0],
+            'agent 1 actions':          actions[:, 1],
+            'agent_0_policies':         np.array(names)[agent_0_member],
+            'agent_1_policies':         np.array(names)[agent_1_member],
+            'agent 0 betas':            betas[agent_0_member],
+            'agent 1 betas':            betas[agent_1_member],
+            'agent 0 assets':           graphs.positions[graph, 0],
+            'agent 1 assets':           graphs.positions[graph, 1],
+            'distressed bank assets':   graphs.positions[graph, 2],
+            'debt owed agent 0':        graphs.adjacency_matrices[graph, 2, 0],
+            'debt owed agent 1':        graphs.adjacency_matrices[graph, 2, 1],
+        })
+
+    # Write the rows of the last run
+    recorder.flush()
 
     ray.shutdown()
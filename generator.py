@@ -1,23 +1,257 @@
+import time
+from collections import defaultdict
+from copy import deepcopy
+
 import numpy as np
 
+import kernels
+from profiler import profiled
+
 
 class Generator:
 
     def __init__(
-        self
+        self,
+        backend = 'numpy',
+        seed    = None,
+        stream  = (),
         ) -> None:
-        pass
+        """
+        :args   backend     numba samples positions with compiled kernels
+        :args   seed        entropy of the random streams; None draws fresh entropy
+        :args   stream      key of this generator's stream, e.g. its worker and env index
+        """
+        self.reset_statistics()
+
+        self.backend = kernels.resolve_backend(backend)
+
+        # Every graph is drawn from a stream of its own, keyed by this generator's stream and the
+        # number of graphs generated before.  Generation is thus independent of numpy's global state
+        # and of the other generators, and any graph can be regenerated from its key.
+        self.entropy    = np.random.SeedSequence(seed).entropy
+        self.stream     = tuple(int(key) for key in stream)
+        self.episode    = 0
+        self.rng        = self.episode_rng(0)
+
+
+    def episode_rng(
+        self,
+        episode,
+        ):
+        """
+        Returns the random generator of the given graph of this stream
+        """
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(
+            self.entropy, 
+            spawn_key = self.stream + (episode,),
+        )))
 
 
+    def start_episode(
+        self
+        ):
+        """
+        Switches to the stream of the next graph
+        """
+        self.rng = self.episode_rng(self.episode)
+        self.current_episode = self.episode
+        self.episode += 1
+
+        # The compiled kernels hold a random state of their own
+        if self.backend == 'numba':
+            kernels.seed(int(self.rng.integers(2**31 - 1)))
+
+
+    def replay(
+        self,
+        config,
+        episode,
+        ):
+        """
+        Regenerates a graph of this stream without advancing the stream
+        The state of the current episode and the instrumentation are restored afterwards, so the replayed
+        graph is neither counted in get_statistics nor reported as last_graph.
+        :args   config      environment configuration of the episode, i.e. holding its rescue amount
+        :args   episode     position of the graph in the stream, as reported in last_graph['episode']
+        """
+        state = {
+            'episode':          self.episode,
+            'rng':              self.rng,
+            'current_episode':  getattr(self, 'current_episode', None),
+            'sub_scenario':     getattr(self, 'sub_scenario', None),
+            'statistics':       deepcopy(self.statistics),
+            'last_graph':       self.last_graph,
+            'attempts':         self.attempts,
+            'rejections':       self.rejections,
+            'zero_debt_graphs': self.zero_debt_graphs,
+        }
+
+        self.episode = episode
+        try:
+            if config.get('sparse_network'):
+                return self.generate_network(dict(config))
+            return self.generate_scenario(dict(config))
+        finally:
+            for name, value in state.items():
+                setattr(self, name, value)
+
+
+    def reset_statistics(
+        self
+        ):
+        """
+        Clears the instrumentation counters
+        """
+        # Attempts, rejections and wall time per (scenario, rescue amount)
+        self.statistics = {}
+
+        # Instrumentation of the graph generated last
+        self.last_graph = None
+
+        # Counters of the graph currently being generated
+        self.attempts   = 0
+        self.rejections = defaultdict(int)
+
+        # Graphs whose distressed bank owes nothing
+        self.zero_debt_graphs = 0
+
+
+    @profiled('generate_scenario')
     def generate_scenario(
         self,
         config,
         ):
         """
-        Generates an graph meeting the scenario requirements
+        Generates an graph meeting the scenario requirements and records
+        the number of attempts, the rejection reasons and the wall time it took
         :arg    scenario        game theoretical setting desired
         :arg    config          environment configuration contains haircut multiplier, etc
         """
+        self.attempts   = 0
+        self.rejections = defaultdict(int)
+        start           = time.perf_counter()
+
+        self.start_episode()
+        position, adjacency_matrix = self.sample_scenario(config)
+
+        seconds = time.perf_counter() - start
+
+        # Mixed scenarios are recorded under the sub scenario which was generated
+        scenario = config.get('scenario')
+        if scenario == 'uniformly mixed':
+            scenario = self.sub_scenario
+
+        self.record_graph(scenario, config.get('rescue_amount', 0), seconds)
+
+        return position, adjacency_matrix
+
+
+    @profiled('generate_network')
+    def generate_network(
+        self,
+        config,
+        ):
+        """
+        Generates a sparse network of n_entities banks in which the n_agents rescuers
+        can save the distressed bank, and records the wall time it took
+        :arg    config              environment configuration containing the network type, rescue amount, etc
+        :output position            capital allocation to each entity
+        :output liabilities         CSR matrix of the debt owed by each entity (row) to each entity (column)
+        """
+        self.attempts   = 0
+        self.rejections = defaultdict(int)
+        start           = time.perf_counter()
+
+        self.start_episode()
+        network = config.get('network', 'star')
+
+        valid_networks = [
+            'star',
+            'erdos renyi',
+            'barabasi albert',
+            'core periphery',
+        ]
+        if network not in valid_networks:
+            assert False, f"Network must be in {valid_networks}"
+
+        if network == 'star':
+            position, liabilities = self.star_network(config)
+        elif network == 'erdos renyi':
+            position, liabilities = self.rescue_network(config, *self.erdos_renyi_edges(config))
+        elif network == 'barabasi albert':
+            position, liabilities = self.rescue_network(config, *self.barabasi_albert_edges(config))
+        elif network == 'core periphery':
+            position, liabilities = self.rescue_network(config, *self.core_periphery_edges(config))
+
+        self.record_graph(f'{network} network', config.get('rescue_amount', 0), time.perf_counter() - start)
+
+        return position, liabilities
+
+
+    def record_graph(
+        self,
+        scenario,
+        rescue_amount,
+        seconds,
+        ):
+        """
+        Adds the counters of the graph generated last to the statistics
+        """
+        key = (scenario, int(rescue_amount))
+        counters = self.statistics.setdefault(key, {
+            'graphs':       0,
+            'attempts':     0,
+            'seconds':      0.0,
+            'rejections':   defaultdict(int),
+        })
+        counters['graphs']   += 1
+        counters['attempts'] += self.attempts
+        counters['seconds']  += seconds
+        for reason, count in self.rejections.items():
+            counters['rejections'][reason] += count
+
+        self.last_graph = {
+            'episode':          self.current_episode,
+            'scenario':         scenario,
+            'rescue_amount':    key[1],
+            'attempts':         self.attempts,
+            'seconds':          seconds,
+            'rejections':       dict(self.rejections),
+        }
+
+
+    def get_statistics(
+        self
+        ):
+        """
+        Summarizes the instrumentation counters
+        :output statistics  dictionary mapping 'scenario|rescue_amount' to the number of graphs generated,
+                            the attempts per graph, the acceptance rate, the mean wall time and the
+                            number of rejections per reason
+        """
+        statistics = {}
+
+        for (scenario, rescue_amount), counters in sorted(self.statistics.items()):
+            statistics[f'{scenario}|{rescue_amount}'] = {
+                'graphs':               counters['graphs'],
+                'attempts_per_graph':   counters['attempts'] / counters['graphs'],
+                'acceptance_rate':      counters['graphs'] / counters['attempts'] if counters['attempts'] > 0 else 1.0,
+                'mean_milliseconds':    1e3 * counters['seconds'] / counters['graphs'],
+                'rejections':           dict(counters['rejections']),
+            }
+
+        statistics['zero_debt_graphs'] = self.zero_debt_graphs
+
+        return statistics
+
+
+    def sample_scenario(
+        self,
+        config,
+        ):
+        """
+        Dispatches to the generator of the requested scenario
+        """
 
         scenario = config.get('scenario')
         
@@ -148,10 +382,10 @@ class Generator:
             position = np.zeros(n_entities)
 
             # Sample an amount less than the rescue amount, but greater than 2
-            collective_capital = np.random.randint(2, rescue_amount)
+            collective_capital = self.rng.integers(2, rescue_amount)
 
             # Allocate the sampled amount across the agents
-            position[:n_agents] = np.random.multinomial(
+            position[:n_agents] = self.rng.multinomial(
                 collective_capital,
                 np.ones(n_agents)/(n_agents),
                 size=1
@@ -162,7 +396,7 @@ class Generator:
             
             # Sample an amount such that the sum capital across all agents
             # is less than the total system value
-            position[2] = np.random.randint(remaining_capital)
+            position[2] = self.rng.integers(remaining_capital)
 
 
             """ Generate adjacency matrix """
@@ -173,7 +407,7 @@ class Generator:
             debt = position[2]  + rescue_amount
             
             # Allocate the debt across solvent banks
-            adjacency_matrix[-1,:n_agents] = np.random.multinomial(
+            adjacency_matrix[-1,:n_agents] = self.rng.multinomial(
                 debt,
                 np.ones(n_agents)/(n_agents),
                 size=1
@@ -230,7 +464,7 @@ class Generator:
             """ Generate positions """
 
             # Sample a capitalization for each agent
-            position = np.random.multinomial(
+            position = self.rng.multinomial(
                 max_system_value,
                 np.ones(n_entities)/(n_entities),
                 size=1
@@ -241,10 +475,10 @@ class Generator:
             adjacency_matrix = np.zeros(shape=(n_entities, n_entities))
 
             # Compute the amount of debt owed (less than current capitalization)
-            debt = np.random.randint(position[2])
+            debt = self.rng.integers(position[2])
             
             # Allocate the debt across solvent banks
-            adjacency_matrix[-1,:n_agents] = np.random.multinomial(
+            adjacency_matrix[-1,:n_agents] = self.rng.multinomial(
                 debt,
                 np.ones(n_agents)/(n_agents),
                 size=1
@@ -300,12 +534,12 @@ class Generator:
             position = np.zeros(n_entities)
 
             # Sample agent 1's capitalization which has to be less than the rescue amount
-            agent_1_capitalization = np.random.randint(rescue_amount)
+            agent_1_capitalization = self.rng.integers(rescue_amount)
             position[1] = agent_1_capitalization
 
             # Distribute the remaining system value to agent 0 and the distressed bank
             remaining_capitalization = max_system_value - agent_1_capitalization
-            capitalization = np.random.multinomial(
+            capitalization = self.rng.multinomial(
                 remaining_capitalization,
                 np.ones(n_entities)/(n_entities),
                 size=1
@@ -322,7 +556,7 @@ class Generator:
             debt = position[2]  + rescue_amount
             
             # Allocate the debt across solvent banks
-            adjacency_matrix[2,:n_agents] = np.random.multinomial(
+            adjacency_matrix[2,:n_agents] = self.rng.multinomial(
                 debt,
                 np.ones(n_agents)/(n_agents),
                 size=1
@@ -411,12 +645,18 @@ class Generator:
             """ Generate positions """
             position_generated = False
 
+            # The compiled kernel runs the rejection loop below
+            if self.backend == 'numba':
+                position, rejections = kernels.sample_positions_above(max_system_value, n_entities, rescue_amount, n_agents)
+                self.record_attempt('position sampling', count=rejections)
+                position_generated = True
+
             while not position_generated:
                 # Same a system amount
-                total_capital = np.random.randint(max_system_value)
+                total_capital = self.rng.integers(max_system_value)
 
                 # Allocate the sampled amount across the agents
-                position = np.random.multinomial(
+                position = self.rng.multinomial(
                     total_capital,
                     np.ones(n_entities)/(n_entities),
                     size=1
@@ -425,6 +665,8 @@ class Generator:
                 if  position[0] >= rescue_amount and\
                     position[1] >= rescue_amount:
                     position_generated = True
+                else:
+                    self.record_attempt('position sampling')
 
             """ Generate adjacency matrix """
             # Allocate memory
@@ -434,7 +676,7 @@ class Generator:
             debt = position[2]  + rescue_amount
             
             # Allocate the debt across solvent banks
-            adjacency_matrix[-1,:n_agents] = np.random.multinomial(
+            adjacency_matrix[-1,:n_agents] = self.rng.multinomial(
                 debt,
                 np.ones(n_agents)/(n_agents),
                 size=1
@@ -494,17 +736,17 @@ class Generator:
             
             if commit_everything:
                 # Allocate the sampled amount across the agents
-                position[:n_agents] = np.random.multinomial(
+                position[:n_agents] = self.rng.multinomial(
                     rescue_amount,
                     np.ones(n_agents)/(n_agents),
                     size=1
                     )[0]
             else:
-                position[0] = np.random.randint(rescue_amount)
-                position[1] = np.random.randint(rescue_amount)
+                position[0] = self.rng.integers(rescue_amount)
+                position[1] = self.rng.integers(rescue_amount)
 
             # Set the system amount
-            total_capital = np.random.randint(
+            total_capital = self.rng.integers(
                 position[:2].sum(),
                 max_system_value
             )
@@ -520,10 +762,10 @@ class Generator:
             debt = position[2] + rescue_amount
 
             if debt == 0 :
-                print("Debt == 0 !")
+                self.zero_debt_graphs += 1
             
             # Allocate the debt across solvent banks
-            adjacency_matrix[-1,:n_agents] = np.random.multinomial(
+            adjacency_matrix[-1,:n_agents] = self.rng.multinomial(
                 debt,
                 np.ones(n_agents)/(n_agents),
                 size=1
@@ -566,7 +808,7 @@ class Generator:
         """
 
         # Randomly select which agent
-        scenario = np.random.randint(0,2)
+        scenario = self.rng.integers(0,2)
 
         # Return the appropriate scenario
         if scenario == 0:
@@ -601,12 +843,12 @@ class Generator:
         """
 
         # Select uniformly at random a scenario
-        scenario = np.random.randint(0,6)
+        scenario = self.rng.integers(0,6)
 
         #TODO: Save the sub scenario into the system and retrieve it in the environment
 
         # Select uniformly at random a rescue amount from 3-6
-        config['rescue_amount'] = np.random.randint(
+        config['rescue_amount'] = self.rng.integers(
             config['minimum_rescue_amount'],
             config['maximum_rescue_amount']
         )
@@ -633,6 +875,259 @@ class Generator:
             return self.coordination_game(config)
 
  
+    def star_network(
+        self,
+        config,
+        ):
+        """
+        Generator for the N agent volunteers dilemma on a star network
+        In this case, the graphs must satify the following conditions:
+            1.  the distressed bank (entity n_agents) owes debt to every other bank
+            2.  the distressed bank is short of the rescue amount
+            3.  each agent can complete the rescue alone
+            4.  the capital of the agents plus the debt stays below the maximum system value,
+                so that the aggregated observations remain within the embeddings
+
+        :args   config              config containing common settings for the environment (i.e. haircut)
+        :output positions           capital allocation to each entity
+        :output liabilities         CSR matrix of the debt owed by each entity
+        """
+
+        # retrieve commonly used variables for readability
+        rescue_amount       = config.get('rescue_amount')
+        n_agents            = config.get('n_agents')
+        n_entities          = config.get('n_entities')
+        max_system_value    = config.get('max_system_value')
+        distressed_node     = n_agents
+
+        # Half of the system value is reserved for the agents' capital, the other half for the debt
+        budget = max_system_value // 2
+        assert n_entities > n_agents, "The network requires a bank besides the agents"
+        assert n_agents * rescue_amount < budget, "The agents cannot all afford the rescue amount"
+
+        """ Generate positions """
+        position = np.zeros(n_entities)
+
+        # Each agent holds at least the rescue amount and the agents together hold less than the budget
+        position[:n_agents] = rescue_amount + self.rng.multinomial(
+            self.rng.integers(budget - n_agents * rescue_amount),
+            np.ones(n_agents)/(n_agents),
+        )
+
+        # The remaining banks hold capital which is not observed by the agents
+        position[n_agents + 1:] = self.rng.integers(budget, size=n_entities - n_agents - 1)
+
+        # The distressed bank's capital is short of its debt by the rescue amount
+        position[distressed_node] = self.rng.integers(budget - rescue_amount)
+
+        """ Generate liabilities """
+        # Allocate the debt across every other bank
+        debt = position[distressed_node] + rescue_amount
+        creditors = np.delete(np.arange(n_entities), distressed_node)
+        amounts = self.rng.multinomial(
+            debt,
+            np.ones(len(creditors))/len(creditors),
+        ).astype(float)
+
+        # scipy is only imported by the sparse network scenarios
+        import scipy.sparse as sparse
+
+        liabilities = sparse.csr_matrix(
+            (amounts, (np.full(len(creditors), distressed_node), creditors)),
+            shape = (n_entities, n_entities),
+        )
+        liabilities.eliminate_zeros()
+
+        self.record_attempt()
+
+        return position, liabilities
+
+
+    def erdos_renyi_edges(
+        self,
+        config,
+        ):
+        """
+        Samples the edges of a directed Erdos-Renyi graph
+        The number of edges is drawn from the binomial distribution and the edges are sampled
+        with replacement, thus the cost is O(edges) instead of O(banks^2); the few duplicates
+        and self loops which are dropped are negligible in sparse graphs
+
+        :args   config              contains n_entities and average_degree, the expected number of creditors per bank
+        :output debtors             debtor of every edge
+        :output creditors           creditor of every edge
+        """
+        n_entities          = config.get('n_entities')
+        average_degree      = config.get('average_degree', 4)
+
+        edge_probability    = min(average_degree / (n_entities - 1), 1.0)
+        n_edges             = self.rng.binomial(n_entities * (n_entities - 1), edge_probability)
+
+        edges   = np.unique(self.rng.integers(n_entities * n_entities, size=n_edges))
+        debtors, creditors = np.divmod(edges, n_entities)
+        loops   = debtors == creditors
+
+        return debtors[~loops], creditors[~loops]
+
+
+    def barabasi_albert_edges(
+        self,
+        config,
+        ):
+        """
+        Samples the edges of a Barabasi-Albert scale-free graph
+        Every new bank links to attachment_edges existing banks chosen proportionally to their degree,
+        by sampling uniformly from the list of edge endpoints.  The direction of every edge is random.
+        Attachment is sequential by nature, thus it runs on plain lists which are faster than
+        numpy for the handful of elements drawn per bank.
+        The oldest banks become the hubs, thus the agents and the distressed bank are well connected.
+
+        :args   config              contains n_entities and attachment_edges
+        :output debtors             debtor of every edge
+        :output creditors           creditor of every edge
+        """
+        n_entities          = config.get('n_entities')
+        attachment_edges    = min(config.get('attachment_edges', 2), n_entities - 1)
+
+        # The initial banks are fully connected
+        initial             = np.arange(attachment_edges + 1)
+        sources, targets    = np.meshgrid(initial, initial)
+        upper               = sources < targets
+        sources             = sources[upper].tolist()
+        targets             = targets[upper].tolist()
+
+        # Endpoints of every edge; a bank appears once per edge it has
+        endpoints           = sources + targets
+
+        # The attachment draws are vectorized, the sequential attachment runs on plain lists
+        uniforms            = self.rng.random((n_entities, attachment_edges)).tolist()
+
+        for bank in range(attachment_edges + 1, n_entities):
+            # Preferential attachment: pick uniformly among the endpoints
+            chosen = set(endpoints[int(uniform * len(endpoints))] for uniform in uniforms[bank])
+
+            for target in chosen:
+                sources.append(bank)
+                targets.append(target)
+                endpoints.append(bank)
+                endpoints.append(target)
+
+        sources = np.array(sources)
+        targets = np.array(targets)
+
+        # Orient every edge at random
+        flip = self.rng.integers(2, size=len(sources)).astype(bool)
+
+        return np.where(flip, targets, sources), np.where(flip, sources, targets)
+
+
+    def core_periphery_edges(
+        self,
+        config,
+        ):
+        """
+        Samples the edges of a core-periphery graph
+        The core banks (the first core_fraction of the banks, containing the agents and the
+        distressed bank) owe each other, and every periphery bank borrows from or lends to
+        periphery_edges randomly chosen core banks
+
+        :args   config              contains n_entities, core_fraction and periphery_edges
+        :output debtors             debtor of every edge
+        :output creditors           creditor of every edge
+        """
+        n_entities          = config.get('n_entities')
+        n_core              = max(int(config.get('core_fraction', 0.1) * n_entities), config.get('n_agents') + 1)
+        periphery_edges     = config.get('periphery_edges', 2)
+
+        # Fully connected core
+        core_debtors, core_creditors = np.meshgrid(np.arange(n_core), np.arange(n_core), indexing='ij')
+        off_diagonal        = core_debtors != core_creditors
+        core_debtors        = core_debtors[off_diagonal]
+        core_creditors      = core_creditors[off_diagonal]
+
+        # Periphery banks link to core banks, in either direction
+        periphery           = np.repeat(np.arange(n_core, n_entities), periphery_edges)
+        core                = self.rng.integers(n_core, size=len(periphery))
+        lends               = self.rng.integers(2, size=len(periphery)).astype(bool)
+
+        debtors             = np.concatenate([core_debtors,   np.where(lends, core, periphery)])
+        creditors           = np.concatenate([core_creditors, np.where(lends, periphery, core)])
+
+        return debtors, creditors
+
+
+    def rescue_network(
+        self,
+        config,
+        debtors,
+        creditors,
+        ):
+        """
+        Turns a sampled topology into a rescue scenario
+        In this case, the graphs must satify the following conditions:
+            1.  every bank besides the distressed bank is solvent, with equity equal to
+                capital_ratio times its interbank assets
+            2.  the distressed bank (entity n_agents) owes debt to every agent and is short of the rescue amount
+            3.  each agent can complete the rescue alone
+
+        :args   config              contains the rescue amount, max_liability and capital_ratio
+        :args   debtors             debtor of every edge of the topology
+        :args   creditors           creditor of every edge of the topology
+        :output positions           capital allocation to each entity
+        :output liabilities         CSR matrix of the debt owed by each entity
+        """
+        rescue_amount       = config.get('rescue_amount')
+        n_agents            = config.get('n_agents')
+        n_entities          = config.get('n_entities')
+        max_liability       = config.get('max_liability', 10)
+        capital_ratio       = config.get('capital_ratio', 0.10)
+        distressed_node     = n_agents
+
+        assert n_entities > n_agents, "The network requires a bank besides the agents"
+
+        """ Generate liabilities """
+        amounts             = self.rng.integers(1, max_liability + 1, size=len(debtors)).astype(float)
+        liabilities         = np.bincount(debtors,   amounts, minlength=n_entities)
+        claims              = np.bincount(creditors, amounts, minlength=n_entities)
+
+        # The distressed bank owes the agents enough to be short of the rescue amount with nonnegative capital
+        agents_debt = max(claims[distressed_node] - liabilities[distressed_node], 0) + rescue_amount +\
+            self.rng.integers(max_liability * n_agents + 1)
+        agents_amounts = self.rng.multinomial(
+            agents_debt,
+            np.ones(n_agents)/(n_agents),
+        ).astype(float)
+
+        debtors             = np.concatenate([debtors,   np.full(n_agents, distressed_node)])
+        creditors           = np.concatenate([creditors, np.arange(n_agents)])
+        amounts             = np.concatenate([amounts,   agents_amounts])
+        liabilities[distressed_node] += agents_debt
+        claims[:n_agents]   += agents_amounts
+
+        """ Generate positions """
+        # Equity is a fraction of the interbank assets on top of the capital required for solvency
+        position = np.ceil(capital_ratio * claims) + np.maximum(liabilities - claims, 0)
+
+        # Each agent holds at least the rescue amount
+        position[:n_agents] = np.maximum(position[:n_agents], rescue_amount)
+
+        # The distressed bank's net position is short by the rescue amount
+        position[distressed_node] = liabilities[distressed_node] - claims[distressed_node] - rescue_amount
+
+        # scipy is only imported by the sparse network scenarios
+        import scipy.sparse as sparse
+
+        liabilities = sparse.csr_matrix(
+            (amounts, (debtors, creditors)),
+            shape = (n_entities, n_entities),
+        )
+        liabilities.eliminate_zeros()
+
+        self.record_attempt()
+
+        return position, liabilities
+
+
     def verify(
         self,
         config,
@@ -726,9 +1221,25 @@ class Generator:
 
             # Return false if any validation fails
             if test_results == False:
+                self.record_attempt(test)
                 return False
+
+        self.record_attempt()
             
         return True    
+
+
+    def record_attempt(
+        self,
+        rejection_reason = None,
+        count = 1,
+        ):
+        """
+        Counts attempts at generating a graph and the reason they were rejected, if they were
+        """
+        self.attempts += count
+        if rejection_reason is not None and count > 0:
+            self.rejections[rejection_reason] += count
         
 
 
@@ -748,4 +1259,6 @@ if __name__ == "__main__":
 
         print(f'rescue amount: {i}')
         print(adjacency_matrix)
-        print(position)
\ No newline at end of file
+        print(position)
+
+    print(g.get_statistics())
\ No newline at end of file
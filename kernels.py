@@ -0,0 +1,258 @@
+import functools
+import importlib.util
+import warnings
+
+import numpy as np
+
+# numba is imported when a kernel is first called, as importing it takes about a second
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
+
+
+BACKENDS = ['numpy', 'numba']
+
+
+def resolve_backend(
+    backend
+    ):
+    """
+    Returns the backend to run, falling back to numpy when numba is not installed
+    :args   backend     requested backend, None defaults to numpy
+    """
+    backend = backend or 'numpy'
+    assert backend in BACKENDS, f'Backend must be in {BACKENDS}'
+
+    if backend == 'numba' and not NUMBA_AVAILABLE:
+        warnings.warn('numba is not installed, falling back to the numpy backend')
+        return 'numpy'
+
+    return backend
+
+
+# Interpreted kernels, compiled together as the kernels call each other
+KERNELS = {}
+
+
+def compile_kernels():
+    """
+    Replaces the kernels of the module by their compiled versions
+    """
+    import numba
+
+    for name, function in KERNELS.items():
+        # Divisions by zero return inf/nan as they do in numpy
+        globals()[name] = numba.njit(cache=True, error_model='numpy')(function)
+
+
+def jit(
+    function
+    ):
+    """
+    Compiles a kernel in nopython mode, on the first call of a kernel, when numba is installed
+    The interpreted kernel remains available as .py_func
+    """
+    function.py_func = function
+    if not NUMBA_AVAILABLE:
+        return function
+
+    KERNELS[function.__name__] = function
+
+    @functools.wraps(function)
+    def kernel(*args):
+        if globals()[function.__name__] is kernel:
+            compile_kernels()
+        return globals()[function.__name__](*args)
+
+    kernel.py_func = function
+    return kernel
+
+
+@jit
+def seed(
+    value
+    ):
+    """
+    Seeds the random state of the compiled kernels, which is separate from numpy's
+    """
+    np.random.seed(value)
+
+
+@jit
+def net_positions(
+    position,
+    adjacency_matrix,
+    ):
+    """
+    Computes the net position of every entity: its assets less its liabilities plus its claims
+    """
+    n_entities = position.shape[0]
+    net = position.copy()
+
+    for debtor in range(n_entities):
+        for creditor in range(n_entities):
+            net[debtor]     -= adjacency_matrix[debtor, creditor]
+            net[creditor]   += adjacency_matrix[debtor, creditor]
+
+    return net
+
+
+@jit
+def clear(
+    position,
+    adjacency_matrix,
+    haircut_multiplier,
+    ):
+    """
+    Clears the system as Volunteers_Dilemma.clear does
+    Entities in default (by their net position before clearing) are visited in order; their discounted
+    assets are redistributed to their creditors in proportion to the debt owed and their debts are cancelled.
+    """
+    n_entities  = position.shape[0]
+    net         = net_positions(position, adjacency_matrix)
+    cleared     = position.copy()
+    liabilities = adjacency_matrix.copy()
+
+    for entity in range(n_entities):
+        if net[entity] < 0:
+
+            total_liabilities = 0.
+            for creditor in range(n_entities):
+                total_liabilities += liabilities[entity, creditor]
+
+            # Redistribute the discounted assets to the creditors
+            discounted_position = cleared[entity] * haircut_multiplier
+            for creditor in range(n_entities):
+                cleared[creditor] += discounted_position * (liabilities[entity, creditor] / total_liabilities)
+
+            for other in range(n_entities):
+                liabilities[entity, other] = 0.
+                liabilities[other, entity] = 0.
+            cleared[entity] = 0.
+
+    # Settle the remaining debts
+    for debtor in range(n_entities):
+        for creditor in range(n_entities):
+            cleared[creditor]   += liabilities[debtor, creditor]
+            cleared[debtor]     -= liabilities[debtor, creditor]
+
+    return cleared
+
+
+@jit
+def final_round_changes(
+    position,
+    adjacency_matrix,
+    transfers,
+    distressed_node,
+    haircut_multiplier,
+    ):
+    """
+    Executes the agents' transfers to the distressed bank and clears the system
+    :args   transfers           amount transferred by each agent
+    :output change_in_position  value of every entity after clearing less its value before the transfers
+    :output system_value        value of the system after clearing
+    """
+    n_entities  = position.shape[0]
+    net         = net_positions(position, adjacency_matrix)
+
+    # Claims are discounted when the distressed bank is in default
+    multiplier = 1.
+    if net[distressed_node] < 0:
+        multiplier = haircut_multiplier
+
+    bank_value = position.copy()
+    for debtor in range(n_entities):
+        for creditor in range(n_entities):
+            bank_value[creditor] += adjacency_matrix[debtor, creditor] * multiplier
+
+    new_position = position.copy()
+    for agent in range(transfers.shape[0]):
+        new_position[distressed_node]   += transfers[agent]
+        new_position[agent]             -= transfers[agent]
+
+    new_bank_value = clear(new_position, adjacency_matrix, haircut_multiplier)
+
+    return new_bank_value - bank_value, new_bank_value.sum()
+
+
+@jit
+def sample_positions_above(
+    max_system_value,
+    n_entities,
+    rescue_amount,
+    n_rescuers,
+    ):
+    """
+    Samples capital allocations until each of the first n_rescuers entities holds at least the rescue amount
+    :output position    capital allocation to each entity
+    :output rejections  number of allocations rejected before
+    """
+    probabilities   = np.ones(n_entities) / n_entities
+    rejections      = 0
+
+    while True:
+        total_capital   = np.random.randint(0, max_system_value)
+        position        = np.random.multinomial(total_capital, probabilities).astype(np.float64)
+
+        accepted = True
+        for rescuer in range(n_rescuers):
+            if position[rescuer] < rescue_amount:
+                accepted = False
+
+        if accepted:
+            return position, rejections
+
+        rejections += 1
+
+
+def batched_final_round_changes(
+    positions,
+    adjacency_matrices,
+    transfers,
+    distressed_node,
+    haircut_multiplier,
+    ):
+    """
+    Vectorized final_round_changes over a batch of graphs, in numpy
+    :args   positions           (n_graphs, n_entities) value of every entity
+    :args   adjacency_matrices  (n_graphs, n_entities, n_entities) debts owed by the row to the column entity
+    :args   transfers           (n_graphs, n_agents) amount transferred by each agent
+    :output change_in_position  (n_graphs, n_entities) value of every entity after clearing less its value before the transfers
+    :output system_value        (n_graphs,) value of the system after clearing
+    """
+    positions           = np.asarray(positions, dtype=float)
+    adjacency_matrices  = np.asarray(adjacency_matrices, dtype=float)
+    transfers           = np.asarray(transfers, dtype=float)
+    n_graphs, n_entities = positions.shape
+
+    # Claims are discounted when the distressed bank is in default
+    net = positions - adjacency_matrices.sum(axis=2) + adjacency_matrices.sum(axis=1)
+    multiplier = np.where(net[:, distressed_node] < 0, haircut_multiplier, 1.)
+    bank_value = positions + adjacency_matrices.sum(axis=1) * multiplier[:, None]
+
+    new_position = positions.copy()
+    new_position[:, distressed_node] += transfers.sum(axis=1)
+    new_position[:, :transfers.shape[1]] -= transfers
+
+    # Clear the system; entities in default (by their net position before clearing) are visited in order
+    net         = new_position - adjacency_matrices.sum(axis=2) + adjacency_matrices.sum(axis=1)
+    cleared     = new_position.copy()
+    liabilities = adjacency_matrices.copy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for entity in range(n_entities):
+            default = net[:, entity] < 0
+
+            # Redistribute the discounted assets to the creditors
+            discounted_position = cleared[default, entity] * haircut_multiplier
+            owed = liabilities[default, entity, :]
+            cleared[default] += discounted_position[:, None] * (owed / owed.sum(axis=1, keepdims=True))
+
+            liabilities[default, entity, :] = 0
+            liabilities[default, :, entity] = 0
+            cleared[default, entity] = 0
+
+    # Settle the remaining debts
+    cleared += liabilities.sum(axis=1)
+    cleared -= liabilities.sum(axis=2)
+
+    return cleared - bank_value, cleared.sum(axis=1)
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+class NegotiationState:
+    """
+    Round state of a multi-round negotiation
+
+    The offers of every round are kept in a preallocated (rounds, n_agents) array.  As the
+    positions only change once the final offers are executed, the value of the system before
+    the agents decide is computed once per episode and reused by every round.
+    """
+
+    def __init__(
+        self,
+        number_of_rounds,
+        n_agents,
+        ) -> None:
+
+        self.number_of_rounds   = number_of_rounds
+        self.n_agents           = n_agents
+        self.offers             = np.zeros((number_of_rounds, n_agents))
+        self.round              = 0
+        self.system_value       = None
+
+        # Offer history of the current round, shared by the observations of every agent
+        self.history            = None
+
+
+    def reset(
+        self
+        ):
+        """
+        Starts a new negotiation
+        """
+        self.offers[:]      = 0
+        self.round          = 0
+        self.system_value   = None
+        self.history        = None
+
+
+    def starting_system_value(
+        self,
+        clear,
+        ):
+        """
+        Returns the value of the system before the agents' allocations, clearing only once per episode
+        :args   clear   function clearing the system and returning the value of each entity
+        """
+        if self.system_value is None:
+            self.system_value = clear().sum()
+        return self.system_value
+
+
+    def record(
+        self,
+        actions,
+        ):
+        """
+        Stores the offers of a round and advances to the next round
+        """
+        self.offers[self.round] = [actions[agent] for agent in range(self.n_agents)]
+        self.round += 1
+        self.history = None
+
+
+    def is_final_round(
+        self
+        ):
+        return self.round == self.number_of_rounds
+
+
+    def offer_history(
+        self
+        ):
+        """
+        Returns every agent's view of the offers made so far
+        :output history     (n_agents, rounds * 2) array of the agent's own offer and the
+                            sum of the other agents' offers in each round; future rounds are 0
+        """
+        if self.history is None:
+            own     = self.offers.T
+            others  = self.offers.sum(axis=1)[None, :] - own
+
+            self.history = np.stack([own, others], axis=-1).reshape(self.n_agents, -1)
+
+        return self.history
@@ -0,0 +1,336 @@
+import os
+import sys
+
+import numpy as np
+
+
+# Directory holding the compiled tables, mirroring the layout of the results directory
+TABLE_DIR = './data/policy_tables'
+
+# Tables spanning at most this many keys are stored densely, larger ones as sorted keys
+DENSE_TABLE_SIZE = 2**24
+
+# Observation features revealing the opponent or the member played, see evaluation.OPPONENT_FEATURES
+CONTEXT_FEATURES = ['reveal_other_agents_identity', 'reveal_other_agents_beta', 'shared_pooled_policy']
+
+
+def table_features(
+    config,
+    ):
+    """
+    Returns the observation features read by Generalized_model_with_masking, and the number of
+    values each takes, i.e. the size of its embedding
+    The action mask is not listed as it is a function of the assets.
+    :args   config      environment configuration, e.g. vars(args)
+    :output features    dictionary mapping the features to their number of values, in sorted order
+    """
+    assert not config.get('basic_model'), "The basic model reads the whole graph and cannot be tabulated"
+    assert config.get('number_of_negotiation_rounds', 1) == 1, "Tables are compiled for a single negotiation round"
+
+    number_of_embeddings = int(config['max_system_value'])
+
+    features = {
+        'assets':           number_of_embeddings,
+        'liabilities':      number_of_embeddings,
+        'net_position':     number_of_embeddings,
+        'rescue_amount':    number_of_embeddings,
+    }
+
+    if config.get('full_information'):
+        features['other_agents_assets']         = number_of_embeddings
+        features['other_agents_liabilities']    = number_of_embeddings
+
+    if config.get('reveal_other_agents_identity'):
+        features['other_agents_identity']   = int(config['pool_size'])
+
+    # NOTE: Betas are observed in steps of 0.01, i.e. in [0, 100]
+    if config.get('reveal_other_agents_beta'):
+        features['other_agents_beta']       = 101
+
+    if config.get('shared_pooled_policy'):
+        features['own_beta']                = 101
+
+    return dict(sorted(features.items()))
+
+
+class PolicyTable:
+    """
+    Greedy actions of a trained policy, tabulated over the integer observation features it reads
+
+    Acting greedily, Generalized_model_with_masking is a deterministic function of a handful of small
+    integers.  Each observation is encoded into a mixed radix key of these features; the action of every
+    reachable key is stored either densely, indexed by the key, or as sorted keys searched like the
+    outcome table of GraphSet.  Looking actions up only requires numpy.
+    """
+
+    def __init__(
+        self,
+        features,
+        keys,
+        actions,
+        ) -> None:
+        """
+        :args   features    dictionary mapping the features to their number of values, see table_features
+        :args   keys        (n_keys,) sorted keys of the tabulated observations
+        :args   actions     (n_keys,) greedy action of each key
+        """
+        self.features   = dict(features)
+        self.radices    = np.array(list(self.features.values()), dtype=np.int64)
+        self.size       = int(np.prod(self.radices))
+        self.keys       = np.asarray(keys, dtype=np.int64)
+        self.actions    = np.asarray(actions, dtype=np.int64)
+        self.dense      = self.size <= DENSE_TABLE_SIZE
+
+        if self.dense:
+            self.table = np.full(self.size, -1, dtype=np.int64)
+            self.table[self.keys] = self.actions
+
+
+    def __len__(
+        self
+        ):
+        return len(self.keys)
+
+
+    def encode(
+        self,
+        observations,
+        ):
+        """
+        Encodes a batch of observations into integer keys
+        Features are truncated as the embeddings of the model cast them to integers.
+        :args   observations    dictionary of (n_observations, ...) arrays of each feature, see GraphSet.observations
+        :output keys            (n_observations,) keys, -1 where a feature is out of range
+        """
+        n_observations = len(next(iter(observations.values())))
+
+        keys    = np.zeros(n_observations, dtype=np.int64)
+        valid   = np.ones(n_observations, dtype=bool)
+        for feature, radix in self.features.items():
+            values  = np.reshape(observations[feature], n_observations).astype(np.int64)
+            valid  &= (values >= 0) & (values < radix)
+            keys    = keys * radix + values
+
+        return np.where(valid, keys, -1)
+
+
+    def lookup(
+        self,
+        observations,
+        ):
+        """
+        Returns the greedy actions of a batch of observations
+        :args   observations    dictionary of (n_observations, ...) arrays of each feature
+        :output actions         (n_observations,) actions
+        """
+        keys = self.encode(observations)
+
+        if self.dense:
+            actions = np.where(keys >= 0, self.table[np.maximum(keys, 0)], -1)
+        elif len(self.keys) == 0:
+            actions = np.full(len(keys), -1, dtype=np.int64)
+        else:
+            index   = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            actions = np.where((keys >= 0) & (self.keys[index] == keys), self.actions[index], -1)
+
+        assert (actions >= 0).all(), f"{(actions < 0).sum()} observations were not compiled into the table"
+
+        return actions
+
+
+    def compute_action(
+        self,
+        observation,
+        ):
+        """
+        Returns the greedy action of a single observation of the environment, like Trainer.compute_action
+        """
+        return int(self.lookup({feature: np.reshape(observation[feature], (1, -1)) for feature in self.features})[0])
+
+
+    def save(
+        self,
+        path,
+        ):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        np.savez_compressed(
+            path,
+            features    = np.array(list(self.features)),
+            radices     = self.radices,
+            keys        = self.keys,
+            actions     = self.actions,
+        )
+
+
+    @classmethod
+    def load(
+        cls,
+        path,
+        ):
+        with np.load(path) as data:
+            features = dict(zip(data['features'].tolist(), data['radices'].tolist()))
+            return cls(features, data['keys'], data['actions'])
+
+
+def table_path(
+    run,
+    checkpoint,
+    policy_id,
+    table_dir = TABLE_DIR,
+    ):
+    """
+    Returns the path of the table of a policy of a checkpoint
+    :args   run     path of the trial, relative to the results directory
+    """
+    return f"{table_dir}/{run}/checkpoint_{checkpoint}/{policy_id}.npz"
+
+
+def load_policy_tables(
+    run,
+    checkpoint,
+    policy_ids,
+    table_dir = TABLE_DIR,
+    ):
+    """
+    Returns a dictionary mapping the policy ids to their tables, which stands in for a restored
+    trainer in evaluation.policy_actions and evaluation.cross_play
+    """
+    return {policy_id: PolicyTable.load(table_path(run, checkpoint, policy_id, table_dir)) for policy_id in policy_ids}
+
+
+def table_situations(
+    graphs,
+    policy_id,
+    members         = None,
+    shared_policy   = None,
+    ):
+    """
+    Lists the seats and pairings in which a policy is played, whose observations the table must cover
+    The policy is compiled for every seat, as tournaments play each policy in both seats.
+    :args   members         dictionary mapping the pool members to their betas; None if not pooled
+    :args   shared_policy   policy playing every member, for a shared pooled policy
+    :output situations      list of (seat, context) pairs, see GraphSet.observations
+    """
+    from evaluation import pairing_context
+
+    seats = range(graphs.n_agents)
+
+    # The observations only depend on the pairing if they reveal the opponent or the member played
+    if members is None or not any(graphs.config.get(feature) for feature in CONTEXT_FEATURES):
+        return [(seat, None) for seat in seats]
+
+    situations = []
+    for seat in seats:
+        for agent_0_member in members:
+            for agent_1_member in members:
+                if shared_policy is None and policy_id != [agent_0_member, agent_1_member][seat]:
+                    continue
+                situations.append((seat, pairing_context(members, agent_0_member, agent_1_member)))
+
+    return situations
+
+
+def compile_policy_table(
+    trainer,
+    policy_id,
+    graphs,
+    situations,
+    batch_size = 65536,
+    ):
+    """
+    Compiles the greedy actions of a restored policy into a table
+    The observations of every graph in every situation are encoded, and the network is only run on
+    one observation of each key which was not seen before, in a batched forward pass per chunk of graphs.
+    :args   graphs          graph set spanning the reachable observations, e.g. GraphSet(config, exact=True)
+    :args   situations      list of (seat, context) pairs, see table_situations
+    :output table           PolicyTable of the policy
+    """
+    from evaluation import greedy_actions
+
+    table = PolicyTable(table_features(graphs.config), [], [])
+
+    keys    = np.zeros(0, dtype=np.int64)
+    actions = np.zeros(0, dtype=np.int64)
+    for seat, context in situations:
+        for start in range(0, graphs.n_graphs, batch_size):
+            observations    = graphs.observations(seat, context, np.arange(start, min(start + batch_size, graphs.n_graphs)))
+            batch_keys      = table.encode(observations)
+            assert (batch_keys >= 0).all(), "Observations exceed the range of the model's embeddings"
+
+            # One observation per key which is not tabulated yet
+            new_keys, first = np.unique(batch_keys, return_index=True)
+            new = ~np.isin(new_keys, keys)
+            new_keys, first = new_keys[new], first[new]
+            if len(new_keys) == 0:
+                continue
+
+            new_actions = greedy_actions(trainer, policy_id, {feature: values[first] for feature, values in observations.items()})
+
+            keys    = np.concatenate([keys, new_keys])
+            actions = np.concatenate([actions, new_actions])
+
+    order = np.argsort(keys)
+
+    return PolicyTable(table.features, keys[order], actions[order])
+
+
+if __name__ == "__main__":
+
+    from utils import get_args
+    from results_index import get_successful_trials
+    from evaluation import GraphSet, inference_config, checkpoint_path, policy_actions
+
+    # Retrieve the configurations used for the experiment
+    args = get_args()
+
+    import ray
+    from ray.rllib.agents.dqn import DQNTrainer
+
+    if args.pooled_training:
+        from trainer_pooled import setup, SHARED_POLICY
+    else:
+        from trainer import setup
+
+    ray.init(local_mode = args.local_mode)
+    config, stop = setup(args)
+
+    # Only consider the latest checkpoint in the directory
+    checkpoint = stop.get('training_iteration')
+
+    members         = args.policies if args.pooled_training else None
+    shared_policy   = SHARED_POLICY if args.pooled_training and args.shared_pooled_policy else None
+    policy_ids      = sorted(config['multiagent']['policies'])
+
+    # Every graph the generator can draw, thus every observation the policies can be given
+    graphs = GraphSet(vars(args), exact=True)
+
+    # Graphs on which the tables are checked against the network
+    test_graphs = GraphSet(vars(args), 1000, seed=args.seed)
+
+    trainer = DQNTrainer(config=inference_config(config))
+
+    mismatches = 0
+    for run in get_successful_trials(args.experiment_number):
+        trainer.restore(checkpoint_path(run, checkpoint))
+
+        for policy_id in policy_ids:
+            situations  = table_situations(graphs, policy_id, members, shared_policy)
+            table       = compile_policy_table(trainer, policy_id, graphs, situations)
+            table.save(table_path(run, checkpoint, policy_id))
+
+            for seat, context in table_situations(test_graphs, policy_id, members, shared_policy):
+                mismatches += (
+                    policy_actions({policy_id: table}, policy_id, test_graphs, seat, context) !=
+                    policy_actions(trainer, policy_id, test_graphs, seat, context)
+                ).sum()
+
+            print(f'{run} {policy_id}: {len(table)} observations tabulated from {graphs.n_graphs} graphs')
+
+    trainer.stop()
+    ray.shutdown()
+
+    if mismatches > 0:
+        print(f'{mismatches} actions of the tables differ from the networks')
+        sys.exit(1)
@@ -1,14 +1,16 @@
 import argparse
 import json
-import os
-from collections import OrderedDict
+
+from results_index import ResultsIndex
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--results_dictionary_path",type=str,   default="./results_dictionary.json")
+    parser.add_argument("--results_index_path",     type=str,   default="./results_index.jsonl")
     parser.add_argument("--configs_path",           type=str,   default="./configs.json")
     parser.add_argument("--results_path",           type=str,   default="./data/results")
+    parser.add_argument("--compact",                action="store_true")
     args = parser.parse_args()
 
 
@@ -17,49 +19,18 @@ if __name__ == "__main__":
         configs = json.load(f)
         f.close()
 
-    # data stores path to all successful trials per experiment
-    data = OrderedDict()
-
-    # Retrieve experiments which are present in the results directory
-    experiment_ids = [int(id) for id in os.listdir(args.results_path)]
-
-    # For each experiment
-    for experiment_id in sorted(experiment_ids):
-
-        # Prepare some useful directories, variables, and allocate storage
-        experiment_id = str(experiment_id)
-        experiment_trials_dir = f'{args.results_path}/{experiment_id}/{configs.get(experiment_id).get("run")}'
-        completion_checkpoint = configs.get(experiment_id).get('stop_iters')
-        successful_trials = []
-
-        # TODO: Consider setting a check for latest experiment based on n_samples
-
-        # TODO: Check date on the experiments for latest sample
-
-        # Look into the trial directory
-        for trial_run in os.listdir(experiment_trials_dir):
+    # The index only rescans directories which changed since the last invocation
+    index = ResultsIndex(
+        index_path      = args.results_index_path,
+        results_path    = args.results_path,
+    )
+    n_records = index.update(configs)
+    print(f'Appended {n_records} records to {args.results_index_path}')
 
-            # Files containing "DQN_Volunteers_Dilemma" is where checkpoints are stored
-            if 'DQN_Volunteers_Dilemma' in trial_run:
+    # Drop superseded records from the manifest
+    if args.compact:
+        index.compact()
 
-                trial_results_dir = f'{experiment_trials_dir}/{trial_run}'
-
-                # For directories containing checkpoints
-                for trial_result in os.listdir(trial_results_dir):
-                    
-                    # If the ifnal checkpoint exists, the experiment completed successfuly.
-                    if f'checkpoint_{str.zfill(str(completion_checkpoint), 6)}' in trial_result:
-                        
-                        # Aggregate successful trials per experiment
-                        successful_trials.append(trial_results_dir.strip('./data/results'))
-
-        # Update dictionary to contain the list of successful trials per experiment
-        data[experiment_id] = successful_trials
-
-    # Save the results as a json file
+    # Save the results as a json file for tools which still read the dictionary
     with open(args.results_dictionary_path, 'w') as file:
-        json.dump(data, file, indent=4)
-
-
-
-
+        json.dump(index.to_dictionary(), file, indent=4)
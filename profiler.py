@@ -0,0 +1,175 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    Opt-in per-process timers for the phases of the rollout path
+
+    Every rollout worker is a separate process and thus aggregates its own timings.
+    Timings are inclusive: a phase calling another profiled phase (e.g. compute_reward calling clear)
+    also contains the time of the nested phase.
+    """
+
+    def __init__(
+        self
+        ) -> None:
+
+        self.enabled    = False
+        self.trace_dir  = None
+
+        # name -> [number of calls, total seconds] since the metrics were last drained
+        self.timings    = {}
+
+        # Chrome trace events which have not been written yet
+        self.events     = []
+
+        self.origin     = time.perf_counter()
+
+
+    def configure(
+        self,
+        enabled,
+        trace_dir = None,
+        ):
+        """
+        Enables or disables the profiler of the current process
+        :args   enabled     whether the timers record anything
+        :args   trace_dir   directory receiving a Chrome trace file per process; None disables tracing
+        """
+        self.enabled    = bool(enabled)
+        self.trace_dir  = trace_dir
+
+        if self.enabled and trace_dir is not None and not os.path.exists(trace_dir):
+            os.makedirs(trace_dir, exist_ok=True)
+
+
+    def record(
+        self,
+        name,
+        start,
+        end,
+        ):
+        """
+        Records one timed call of a phase
+        """
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = [0, 0.0]
+        timing[0] += 1
+        timing[1] += end - start
+
+        if self.trace_dir is not None:
+            self.events.append({
+                'name': name,
+                'ph':   'X',
+                'ts':   (start - self.origin) * 1e6,
+                'dur':  (end - start) * 1e6,
+                'pid':  os.getpid(),
+                'tid':  threading.get_ident(),
+            })
+
+
+    @contextmanager
+    def timer(
+        self,
+        name,
+        ):
+        """
+        Times the enclosed block
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+
+    def drain_metrics(
+        self
+        ):
+        """
+        Returns the timings recorded since the last call and resets them
+        :output metrics     dictionary of total milliseconds and number of calls per phase
+        """
+        metrics = {}
+        for name, (calls, seconds) in self.timings.items():
+            metrics[f'profile/{name}_ms']       = 1e3 * seconds
+            metrics[f'profile/{name}_calls']    = calls
+
+        self.timings = {}
+
+        return metrics
+
+
+    def dump_trace(
+        self
+        ):
+        """
+        Appends the buffered events to the Chrome trace file of this process
+        The file is a JSON array without the closing bracket, which chrome://tracing and Perfetto accept
+        """
+        if self.trace_dir is None or len(self.events) == 0:
+            return None
+
+        path = f'{self.trace_dir}/trace-{os.getpid()}.json'
+        new_file = not os.path.exists(path)
+
+        with open(path, 'a') as f:
+            if new_file:
+                f.write('[\n')
+            for event in self.events:
+                f.write(json.dumps(event))
+                f.write(',\n')
+
+        self.events = []
+
+        return path
+
+
+# Profiler of the current process
+PROFILER = Profiler()
+
+
+def configure_profiler(
+    config
+    ):
+    """
+    Configures the profiler of the current process from an environment config
+    """
+    PROFILER.configure(
+        enabled     = config.get('profile', False),
+        trace_dir   = config.get('profile_trace_dir'),
+    )
+
+
+def profiled(
+    name
+    ):
+    """
+    Decorator timing every call of a function under the given phase name
+    """
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.record(name, start, time.perf_counter())
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,166 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from evaluation_storage import EVALUATIONS_ROOT, CATEGORICAL_COLUMNS, NUMERIC_DTYPES, write_partition, clear_partition
+
+
+class EvaluationRecorder:
+    """
+    Streams evaluation rows to disk through a preallocated, typed buffer
+
+    Rows are stored in a structured array of chunk_size rows; categorical columns hold integer
+    codes into a list of categories.  Whenever the buffer is full, and at the end of every run, it
+    is flushed as one part file of the run's partition and appended to the legacy
+    experimental_data.csv, so memory stays bounded and every row is written exactly once.
+    """
+
+    def __init__(
+        self,
+        experiment_number,
+        columns,
+        chunk_size  = 65536,
+        legacy_path = None,
+        root        = EVALUATIONS_ROOT,
+        ) -> None:
+        """
+        :args   columns         names of the recorded columns, in the order they are written
+        :args   chunk_size      number of rows buffered before they are written
+        :args   legacy_path     csv file the rows are appended to, which is rewritten; None skips it
+        """
+        self.experiment_number  = experiment_number
+        self.columns            = list(columns)
+        self.chunk_size         = chunk_size
+        self.legacy_path        = legacy_path
+        self.root               = root
+
+        # Categories of each categorical column, and the code of each category
+        self.categories = {column: [] for column in self.columns if column in CATEGORICAL_COLUMNS}
+        self.codes      = {column: {} for column in self.categories}
+
+        self.rows = np.zeros(chunk_size, dtype=[
+            (column, np.int32 if column in self.categories else NUMERIC_DTYPES.get(column, np.float64))
+            for column in self.columns
+        ])
+        self.size   = 0
+        self.run    = None
+        self.part   = 0
+
+        if legacy_path is not None:
+            if not os.path.exists(os.path.dirname(legacy_path)):
+                os.makedirs(os.path.dirname(legacy_path))
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+
+    def __enter__(
+        self
+        ):
+        return self
+
+
+    def __exit__(
+        self,
+        *exception,
+        ):
+        self.flush()
+
+
+    def start_run(
+        self,
+        run,
+        ):
+        """
+        Starts the partition of a run, removing the files of a previous evaluation
+        """
+        self.flush()
+        clear_partition(self.experiment_number, run, self.root)
+        self.run    = run
+        self.part   = 0
+
+
+    def encode(
+        self,
+        column,
+        values,
+        ):
+        """
+        Returns the codes of the values of a categorical column, adding new categories
+        """
+        values = np.asarray(values).astype(str)
+        unique, inverse = np.unique(values, return_inverse=True)
+
+        codes = self.codes[column]
+        for value in unique:
+            if value not in codes:
+                codes[value] = len(self.categories[column])
+                self.categories[column].append(value)
+
+        return np.array([codes[value] for value in unique], dtype=np.int32)[inverse.reshape(-1)]
+
+
+    def record(
+        self,
+        **values,
+        ):
+        """
+        Records rows; every column takes either an array of one value per row or a single value
+        """
+        assert self.run is not None, "start_run must be called before recording"
+        assert set(values) == set(self.columns), f"Expected the columns {self.columns}"
+
+        n_rows = max(np.size(value) if not isinstance(value, str) else 1 for value in values.values())
+
+        values = {
+            column: np.broadcast_to(self.encode(column, np.atleast_1d(value)) if column in self.categories else value, (n_rows,))
+            for column, value in values.items()
+        }
+
+        offset = 0
+        while offset < n_rows:
+            n_copied = min(n_rows - offset, self.chunk_size - self.size)
+
+            for column in self.columns:
+                self.rows[column][self.size:self.size + n_copied] = values[column][offset:offset + n_copied]
+
+            self.size   += n_copied
+            offset      += n_copied
+
+            if self.size == self.chunk_size:
+                self.flush()
+
+
+    def flush(
+        self
+        ):
+        """
+        Writes the buffered rows as the next part of the run's partition
+        """
+        if self.size == 0:
+            return
+
+        rows = self.rows[:self.size]
+        data = pd.DataFrame({
+            column: pd.Categorical.from_codes(rows[column], self.categories[column]) if column in self.categories else rows[column]
+            for column in self.columns
+        })
+
+        write_partition(
+            data                = data,
+            experiment_number   = self.experiment_number,
+            run                 = self.run,
+            part                = self.part,
+            root                = self.root,
+        )
+
+        if self.legacy_path is not None:
+            data.to_csv(
+                self.legacy_path,
+                mode    = 'a',
+                header  = not os.path.exists(self.legacy_path),
+                index   = False,
+            )
+
+        self.part   += 1
+        self.size   = 0
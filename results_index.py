@@ -0,0 +1,266 @@
+import json
+import os
+
+
+class ResultsIndex:
+    """
+    Append-only JSONL manifest of the trials stored in the results directory.
+
+    Each line of the manifest is a record describing either a directory which
+    has been listed (keyed by its modification time) or a trial (its checkpoints
+    and whether the final checkpoint exists).  Later records supersede earlier
+    records for the same path, so updating the index only appends the records
+    which changed since the last scan.
+    """
+
+    def __init__(
+        self,
+        index_path      = './results_index.jsonl',
+        results_path    = './data/results',
+        ) -> None:
+
+        self.index_path     = index_path
+        self.results_path   = results_path
+        self.directories    = {}
+        self.trials         = {}
+
+        self.load()
+
+
+    def load(
+        self
+        ):
+        """
+        Replays the manifest into the in-memory directory and trial tables
+        """
+        if not os.path.exists(self.index_path):
+            return
+
+        with open(self.index_path) as f:
+            for line in f:
+
+                # Ignore a partially written trailing line
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if record.get('type') == 'directory':
+                    self.directories[record['path']] = record
+                elif record.get('type') == 'trial':
+                    self.trials[record['path']] = record
+
+
+    def update(
+        self,
+        configs,
+        ):
+        """
+        Incrementally updates the index from the results directory
+        Only directories whose modification time changed since the last scan are listed again
+        :args   configs     experiment configurations, needed for the run type and the final checkpoint
+        :output records     number of records appended to the manifest
+        """
+        records = []
+
+        # Retrieve experiments which are present in the results directory
+        with os.scandir(self.results_path) as entries:
+            experiment_ids = [entry.name for entry in entries if entry.is_dir() and entry.name.isdigit()]
+
+        for experiment_id in sorted(experiment_ids, key=int):
+
+            # Experiments without a configuration cannot be resolved to a run directory
+            if configs.get(experiment_id) is None:
+                continue
+
+            experiment_trials_dir   = f'{self.results_path}/{experiment_id}/{configs.get(experiment_id).get("run")}'
+            completion_checkpoint   = configs.get(experiment_id).get('stop_iters')
+
+            if not os.path.isdir(experiment_trials_dir):
+                continue
+
+            # A new trial directory changes the modification time of its parent
+            trial_dirs = self._list_if_modified(experiment_trials_dir, records)
+            if trial_dirs is None:
+                trial_dirs = [
+                    os.path.basename(path) for path, trial in self.trials.items()
+                    if trial['experiment_id'] == experiment_id
+                ]
+
+            for trial_run in trial_dirs:
+
+                # Files containing "Volunteers_Dilemma" is where checkpoints are stored
+                if 'Volunteers_Dilemma' not in trial_run:
+                    continue
+
+                trial_results_dir   = f'{experiment_trials_dir}/{trial_run}'
+                path                = os.path.relpath(trial_results_dir, self.results_path)
+                trial               = self.trials.get(path)
+
+                # A completed trial only needs to be revisited if the completion criteria changed
+                if  trial is not None and\
+                    trial['completed'] and\
+                    trial['completion_checkpoint'] == completion_checkpoint:
+                    continue
+
+                # A new checkpoint changes the modification time of the trial directory
+                checkpoint_dirs = self._list_if_modified(trial_results_dir, records)
+                if  checkpoint_dirs is None and\
+                    trial is not None and\
+                    trial['completion_checkpoint'] == completion_checkpoint:
+                    continue
+                if checkpoint_dirs is None:
+                    checkpoint_dirs = os.listdir(trial_results_dir)
+
+                checkpoints = checkpoint_iterations(checkpoint_dirs)
+
+                # If the final checkpoint exists, the experiment completed successfully.
+                record = {
+                    'type':                     'trial',
+                    'path':                     path,
+                    'experiment_id':            experiment_id,
+                    'checkpoints':              checkpoints,
+                    'completion_checkpoint':    completion_checkpoint,
+                    'completed':                completion_checkpoint in checkpoints,
+                }
+                self.trials[path] = record
+                records.append(record)
+
+        self._append(records)
+
+        return len(records)
+
+
+    def successful_trials(
+        self,
+        experiment_id,
+        ):
+        """
+        Returns the paths, relative to the results directory, of the completed trials of an experiment
+        """
+        experiment_id = str(experiment_id)
+        return sorted(
+            path for path, trial in self.trials.items()
+            if trial['experiment_id'] == experiment_id and trial['completed']
+        )
+
+
+    def checkpoints(
+        self,
+        trial_path,
+        ):
+        """
+        Returns the checkpoint iterations stored for a trial
+        """
+        return self.trials.get(trial_path, {}).get('checkpoints', [])
+
+
+    def to_dictionary(
+        self
+        ):
+        """
+        Returns the successful trials per experiment in the format of results_dictionary.json
+        """
+        experiment_ids = sorted({trial['experiment_id'] for trial in self.trials.values()}, key=int)
+        return {
+            experiment_id: self.successful_trials(experiment_id)
+            for experiment_id in experiment_ids
+        }
+
+
+    def compact(
+        self
+        ):
+        """
+        Rewrites the manifest keeping only the latest record per path
+        """
+        temporary_path = f'{self.index_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            for record in list(self.directories.values()) + list(self.trials.values()):
+                f.write(json.dumps(record) + '\n')
+        os.replace(temporary_path, self.index_path)
+
+
+    def _list_if_modified(
+        self,
+        directory,
+        records,
+        ):
+        """
+        Lists a directory if its modification time changed since the last scan; otherwise returns None
+        """
+        path    = os.path.relpath(directory, self.results_path)
+        mtime   = os.stat(directory).st_mtime
+        known   = self.directories.get(path)
+
+        if known is not None and known['mtime'] == mtime:
+            return None
+
+        record = {
+            'type':     'directory',
+            'path':     path,
+            'mtime':    mtime,
+        }
+        self.directories[path] = record
+        records.append(record)
+
+        return os.listdir(directory)
+
+
+    def _append(
+        self,
+        records,
+        ):
+        if len(records) == 0:
+            return
+
+        with open(self.index_path, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+
+def checkpoint_iterations(
+    names,
+    ):
+    """
+    Returns the sorted training iterations of the checkpoint directories among the names of a trial directory
+    """
+    return sorted(
+        int(name.split('_')[-1]) for name in names
+        if name.startswith('checkpoint_') and name.split('_')[-1].isdigit()
+    )
+
+
+def get_successful_trials(
+    experiment_number,
+    index_path = './results_index.jsonl',
+    ):
+    """
+    Returns the successful trials of an experiment, as used by the evaluators
+    Falls back onto results_dictionary.json for indices which have not been built
+    """
+    if os.path.exists(index_path):
+        return ResultsIndex(index_path).successful_trials(experiment_number)
+
+    with open('results_dictionary.json') as f:
+        dictionary = json.load(f)
+    return dictionary[str(experiment_number)]
+
+
+def get_checkpoints(
+    run,
+    results_dir,
+    index_path = './results_index.jsonl',
+    ):
+    """
+    Returns the checkpoint iterations of a trial, as recorded in the results index
+    Falls back onto listing the trial directory for trials which have not been indexed
+    :args   run             path of the trial, relative to the results directory
+    :args   results_dir     results directory, listed when the index holds no checkpoints
+    """
+    if os.path.exists(index_path):
+        checkpoints = ResultsIndex(index_path).checkpoints(run)
+        if len(checkpoints) > 0:
+            return checkpoints
+
+    return checkpoint_iterations(os.listdir(f'{results_dir}/{run}'))
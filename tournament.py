@@ -1,278 +1,316 @@
-import ray
 import json
-from utils import get_args
-from trainer import setup
-from ray.rllib.agents.dqn import DQNTrainer
-from env import Volunteers_Dilemma
+import os
+import time
 
 import numpy as np
-import seaborn as sn
 import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-import os
-from evaluator import plot_equality_table, plot_table, plot
+
+from utils import get_args
+from results_index import get_successful_trials, get_checkpoints
+from evaluation import RESULTS_DIR, GraphSet, ActionCache, inference_config, checkpoint_path, policy_actions
+from policy_table import PolicyTable, table_path
+
+
+# Tournaments are defined in tournament_configs.json by their number, e.g.
+#   "1": {
+#       "experiments":  [185, 158],     experiments whose completed trials take part
+#       "checkpoints":  "all",          "all", a list of iterations, or omitted for the final checkpoint
+#       "n_graphs":     500,            size of the shared graph set
+#       "seed":         0               seed of the graph set
+#   }
+# Every policy of every checkpoint is a player.  The game is the one of --experiment-number,
+# which defaults to the first experiment of the tournament.
+TOURNAMENT_CONFIGS = 'tournament_configs.json'
+TOURNAMENT_DIR = './data/tournaments'
+
+
+def experiment_setup(
+    experiment_number,
+    ):
+    """
+    Returns the arguments and the training configuration of an experiment
+    """
+    args = get_args(['--experiment-number', str(experiment_number)])
+
+    if args.pooled_training:
+        from trainer_pooled import setup
+    else:
+        from trainer import setup
+
+    config, stop = setup(args)
+
+    return args, config, stop
+
+
+def get_players(
+    tournament,
+    index_path = './results_index.jsonl',
+    ):
+    """
+    Lists the players of a tournament: every policy of the requested checkpoints of every completed trial
+    :output players     list of dictionaries describing each player
+    """
+    players = []
+
+    for experiment_number in tournament['experiments']:
+        args, config, stop = experiment_setup(experiment_number)
+
+        for run in get_successful_trials(experiment_number, index_path):
+
+            checkpoints = tournament.get('checkpoints')
+            if checkpoints == 'all':
+                checkpoints = get_checkpoints(run, RESULTS_DIR, index_path)
+            elif checkpoints is None:
+                checkpoints = [stop.get('training_iteration')]
+
+            for checkpoint in checkpoints:
+                for policy_id in sorted(config['multiagent']['policies']):
+                    players.append({
+                        'player':       f'{experiment_number}/{os.path.basename(run)}/{checkpoint}/{policy_id}',
+                        'experiment':   experiment_number,
+                        'run':          run,
+                        'checkpoint':   checkpoint,
+                        'policy':       policy_id,
+                    })
+
+    return players
+
+
+def compute_actions(
+    players,
+    graphs,
+    cache,
+    ):
+    """
+    Computes the greedy actions of every player in every seat on the graph set
+    A trainer is built once per experiment and restored once per checkpoint; each policy is then run
+    in batches over the graphs of each seat.  Actions are read from the cache when available, and
+    looked up in the policy's compiled table, see policy_table.py, before restoring it.
+    :output actions     (n_players, n_agents, n_graphs) actions
+    """
+    actions = np.zeros((len(players), graphs.n_agents, graphs.n_graphs), dtype=np.int64)
+
+    missing = []
+    for i, player in enumerate(players):
+        cached  = cache.get(player['run'], player['checkpoint'], player['policy'], graphs.key)
+        path    = table_path(player['run'], player['checkpoint'], player['policy'])
+
+        if cached is not None:
+            actions[i] = cached
+        elif os.path.exists(path):
+            tables = {player['policy']: PolicyTable.load(path)}
+            for seat in range(graphs.n_agents):
+                actions[i, seat] = policy_actions(tables, player['policy'], graphs, seat)
+            cache.put(actions[i], player['run'], player['checkpoint'], player['policy'], graphs.key)
+        else:
+            missing.append(i)
+
+    for experiment_number in sorted({players[i]['experiment'] for i in missing}):
+
+        from ray.rllib.agents.dqn import DQNTrainer
+
+        _, config, _ = experiment_setup(experiment_number)
+        trainer = DQNTrainer(config=inference_config(config))
+
+        checkpoints = sorted({
+            (players[i]['run'], players[i]['checkpoint']) for i in missing
+            if players[i]['experiment'] == experiment_number
+        })
+
+        for run, checkpoint in checkpoints:
+            trainer.restore(checkpoint_path(run, checkpoint))
+
+            for i in missing:
+                player = players[i]
+                if (player['experiment'], player['run'], player['checkpoint']) != (experiment_number, run, checkpoint):
+                    continue
+
+                for seat in range(graphs.n_agents):
+                    actions[i, seat] = policy_actions(trainer, player['policy'], graphs, seat)
+
+                cache.put(actions[i], player['run'], player['checkpoint'], player['policy'], graphs.key)
+
+        trainer.stop()
+
+    return actions
+
+
+def round_robin(
+    graphs,
+    actions,
+    ):
+    """
+    Plays every ordered pairing of players on every graph of the graph set
+    :args   actions         (n_players, 2, n_graphs) actions of every player in every seat
+    :output payoffs         (n_players, n_players, 2) mean reward of player i against player j, in each seat
+    :output match_rewards   (n_players, n_players, 2) mean rewards of the match with i in seat 0 and j in seat 1
+    :output contributions   (n_players, n_players, 2) mean contributions of the same matches
+    :output saved           (n_players, n_players) fraction of graphs rescued in the same matches
+    :output wins            (n_players, n_players) head to head wins of player i over player j
+    """
+    n_players   = actions.shape[0]
+    graph_ids   = np.arange(graphs.n_graphs)
+
+    payoffs         = np.zeros((n_players, n_players, 2))
+    match_rewards   = np.zeros((n_players, n_players, 2))
+    contributions   = np.zeros((n_players, n_players, 2))
+    saved           = np.zeros((n_players, n_players))
+    wins            = np.zeros((n_players, n_players))
+
+    seat_0, seat_1 = actions[:, 0], actions[:, 1]
+
+    for i in range(n_players):
+
+        # Player i in seat 0 against every player j in seat 1, and the reverse seating
+        forward = np.stack([np.broadcast_to(seat_0[i], seat_1.shape), seat_1], axis=-1)
+        reverse = np.stack([seat_0, np.broadcast_to(seat_1[i], seat_0.shape)], axis=-1)
+
+        forward_rewards, _ = graphs.play(graph_ids, forward)
+        reverse_rewards, _ = graphs.play(graph_ids, reverse)
+
+        payoffs[i, :, 0]    = forward_rewards[..., 0].mean(axis=1)
+        payoffs[i, :, 1]    = reverse_rewards[..., 1].mean(axis=1)
+        match_rewards[i]    = forward_rewards.mean(axis=1)
+        contributions[i]    = graphs.contributions(graph_ids, forward).mean(axis=1)
+        saved[i]            = graphs.saved(graph_ids, forward).mean(axis=1)
+
+        # On each graph and in each seat, player i wins if it earns more than player j in the same seat
+        # against the other; ties count half
+        for mine, theirs in [(forward_rewards[..., 0], reverse_rewards[..., 0]), (reverse_rewards[..., 1], forward_rewards[..., 1])]:
+            wins[i] += (mine > theirs).sum(axis=1) + 0.5 * (mine == theirs).sum(axis=1)
+
+    np.fill_diagonal(wins, 0)
+
+    return payoffs, match_rewards, contributions, saved, wins
+
+
+def bradley_terry(
+    wins,
+    prior       = 1.0,
+    iterations  = 10000,
+    tolerance   = 1e-10,
+    ):
+    """
+    Fits Bradley-Terry strengths to head to head results with the MM algorithm (Hunter, 2004)
+    :args   wins        (n_players, n_players) wins of player i over player j
+    :args   prior       virtual games drawn between every pair of players, which keeps the strengths
+                        of players who never (or always) win finite
+    :output strengths   (n_players,) strengths, with a geometric mean of 1
+    """
+    n_players = wins.shape[0]
+
+    wins = wins + prior / 2 * (1 - np.eye(n_players))
+    games = wins + wins.T
+    total_wins = wins.sum(axis=1)
+
+    strengths = np.ones(n_players)
+    for _ in range(iterations):
+        denominator = games / (strengths[:, None] + strengths[None, :])
+        np.fill_diagonal(denominator, 0)
+
+        updated = total_wins / denominator.sum(axis=1)
+        updated /= np.exp(np.log(updated).mean())
+
+        converged = np.abs(np.log(updated) - np.log(strengths)).max() < tolerance
+        strengths = updated
+        if converged:
+            break
+
+    return strengths
+
+
+def elo_ratings(
+    strengths,
+    base = 1500,
+    ):
+    """
+    Expresses Bradley-Terry strengths on the Elo scale, where 400 points are 10:1 odds
+    """
+    return base + 400 * np.log10(strengths / np.exp(np.log(strengths).mean()))
+
 
 if __name__ == "__main__":
 
-    # Retrieve the configurations used for the experiment
     args = get_args()
-    ray.init(local_mode = args.local_mode)
-    config, env_config, stop = setup(args)
-
-    # Remove episode greedy so that the agent acts deterministically
-    config['explore'] = False
-
-    # Remove the seed used in training
-    if 'seed' in config.keys():
-        config.pop('seed')
-
-    # Only consider the latest checkpoint in the directory
-    checkpoints = [200]
-
-    # Conduct 100 episodes in the evaluation
-    n_rounds = 100
-    
-    # Read the json file containing a dictionary
-    # specifying where the trained agent is stored
-    with open('tournament_configs.json') as f:
-        data = f.read()
-    dictionary = json.loads(data)
-    runs = dictionary[str(args.tournament_number)]
-
-    # Specify path to the stored agent
-    agent_0_path = f"/itet-stor/bryayu/net_scratch/results/{runs['agent 0']}"
-    agent_1_path = f"/itet-stor/bryayu/net_scratch/results/{runs['agent 1']}"
-    
-    # Create directory to store evaluation results
-    if not os.path.exists(f'./data/checkpoints/{args.experiment_number}'):
-        os.makedirs(f'./data/checkpoints/{args.experiment_number}')
-
-    average_agent_0_contributions = []
-    average_agent_1_contributions = []
-
-
-    # For each agent training checkpoint to evaluate
-    for checkpoint in checkpoints:
-
-        # Define placeholders for statistics
-        saved_rounds = 0
-        percentage_of_optimal_if_saved = []
-
-        # Create placeholders for agent's decisions
-        # Used for generating statistics
-        agent_0_actions             = []
-        agent_1_actions             = []
-        inverted_agent_0_actions    = []
-        inverted_agent_1_actions    = []
-        agent_0_assets              = []
-        agent_1_assets              = []
-        distressed_bank_assets      = []
-        debt_owed_agent_0           = []
-        debt_owed_agent_1           = []
-        optimal_allocation          = []
-        scenarios                   = []
-        rescue_amounts              = []
-
-        # Create directory for storing results
-        root_dir = f'./data/checkpoints/{args.experiment_number}'
-        save_dir = f'./data/checkpoints/{args.experiment_number}/{checkpoint}'
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir)
-
-        # Initialize and load the agent
-        agent_0 = DQNTrainer(config=config, env=Volunteers_Dilemma)
-        agent_0.restore(f"{agent_0_path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}")
-
-        agent_1 = DQNTrainer(config=config, env=Volunteers_Dilemma)
-        agent_1.restore(f"{agent_1_path}/checkpoint_{checkpoint}/checkpoint-{checkpoint}")
-
-        # instantiate env class
-        env = Volunteers_Dilemma(env_config)
-
-        """ Main Loop """
-        for i in range(n_rounds):
-            # Placeholder for agents actions in this round
-            a_0     = []
-            a_1     = []
-            
-            # for inverted actions
-            if args.invert_actions:
-                inverted_a_0 = []
-                inverted_a_1 = []
-
-            # Reset the environment
-            obs = env.reset()
-
-            # Log the setting
-            agent_0_assets.append(env.position[0])
-            agent_1_assets.append(env.position[1])              
-            distressed_bank_assets.append(env.position[2])
-            debt_owed_agent_0.append(env.adjacency_matrix[2,0])
-            debt_owed_agent_1.append(env.adjacency_matrix[2,1])
-
-            # For each round in the episode
-            for round in range(env_config.get('number_of_negotiation_rounds')):
-
-                # Define the actions dictionary used
-                # to transition the environment
-                actions = {}
-                
-                # Agent 0 decides an action
-                action_0_action = agent_0.compute_action(
-                    obs[0], 
-                    policy_id='policy_0'
-                )
-                actions[0] = action_0_action
-            
-                # Agent 1 decides an action
-                action_1_action = agent_1.compute_action(
-                    obs[1], 
-                    policy_id='policy_0'
-                )
-                actions[1] = action_1_action
-
-                # Conduct a transition in the environment
-                obs, _, _, info = env.step(actions)
-
-                # Collect some statistics for logging
-                rescue_amount = env.config.get('rescue_amount')
-
-                # If we are inverting the actions
-                if args.invert_actions:
-                    inverted_actions = actions.copy()
-                    for i in range(args.n_agents):
-                        actions[i] = env.position[i] - actions[i]
-                    actual_allocation = sum(actions.values())
-                else:
-                    actual_allocation = sum(actions.values())
-
-                # Post inversion
-                a_0.append(actions[0])
-                a_1.append(actions[1]) if env_config.get('n_agents') == 2 else None
-
-                if args.invert_actions:
-                    inverted_a_0.append(inverted_actions[0])
-                    inverted_a_1.append(inverted_actions[1]) if env_config.get('n_agents') == 2 else None
-
-                # Log statistics
-                if actual_allocation >= rescue_amount:
-                    saved_rounds += 1
-                    percentage_of_optimal_if_saved.append(actual_allocation/rescue_amount)
-
-            # store the actions of each agent for statistics
-            agent_0_actions.append(a_0)
-            agent_1_actions.append(a_1)
-            optimal_allocation.append(-obs[0]['real_obs'][2])
-            scenarios.append(env.config.get('scenario'))
-            rescue_amounts.append(rescue_amount)
-            if args.invert_actions:
-                inverted_agent_0_actions.append(inverted_a_0)
-                inverted_agent_1_actions.append(inverted_a_1)
-        
-
-        """ Generate plots and tables """
-        agent_0_actions = np.array(agent_0_actions)
-        agent_1_actions = np.array(agent_1_actions)
-        optimal_allocations = np.array(optimal_allocation)
-
-        for round in range(env_config.get('number_of_negotiation_rounds')):
-            a0_actions = agent_0_actions[:,round]
-
-            if args.invert_actions:
-
-                inverted_a0_actions = np.array(inverted_agent_0_actions)[:,round]
-                inverted_confusion_matrix_0 = plot(
-                    inverted_a0_actions, 
-                    optimal_allocation, 
-                    save_dir=save_dir, 
-                    title=f"Inverted actions - checkpoint {checkpoint}, Agent 0, Round {round}"
-                )
-            confusion_matrix_0 = plot(
-                a0_actions, 
-                optimal_allocation, 
-                save_dir=save_dir, 
-                title=f"Checkpoint {checkpoint}, Agent 0, Round {round}"
-            )
-
-            if env_config.get('n_agents') == 2 :
-                a1_actions = agent_1_actions[:,round]
-
-                if args.invert_actions:
-                    inverted_a1_actions = np.array(inverted_agent_1_actions)[:,round]
-                    inverted_confusion_matrix_1 = plot(
-                        inverted_a1_actions, 
-                        optimal_allocation, 
-                        save_dir=save_dir, 
-                        title=f"Inverted actions - checkpoint {checkpoint}, Agent 1, Round {round}"
-                    )
-
-                confusion_matrix_1 = plot(
-                    a1_actions, 
-                    optimal_allocation, 
-                    save_dir= save_dir, 
-                    title=f"Checkpoint {checkpoint}, Agent 1, Round {round}"
-                )
-
-                contribution_0, contribution_1 = plot_equality_table(
-                    confusion_matrix_0,
-                    confusion_matrix_1,
-                    save_dir=save_dir
-                )
-                
-                average_agent_0_contributions.append(contribution_0)
-                average_agent_1_contributions.append(contribution_1)
-
-        
-        plot_table(
-            title=f'Checkpoint {checkpoint} Statistics',
-            data=[["Percentage Saved", f'{saved_rounds/n_rounds * 100} %'],
-            ["Percentage of optimal allocation if saved", f'{np.mean(percentage_of_optimal_if_saved) * 100} %']],
-            save_dir = save_dir
+
+    if not os.path.exists(TOURNAMENT_CONFIGS):
+        raise FileNotFoundError(
+            f"{TOURNAMENT_CONFIGS} not found; create it with an entry per tournament number, e.g. "
+            f'{{"{args.tournament_number}": {{"experiments": [185, 158], "checkpoints": "all", "n_graphs": 500, "seed": 0}}}}, '
+            f"as described at the top of tournament.py"
         )
 
-        
-
-    """ Store experimental data """
-    data = {
-        'experiment number': args.experiment_number,
-        'round number': np.arange(n_rounds),
-        'scenario': scenarios,
-        'rescue_amount': rescue_amounts,
-        'agent 0 actions': list(agent_0_actions.flatten()),
-        'agent 1 actions': list(agent_1_actions.flatten()),
-        'agent 0 assets': agent_0_assets,
-        'agent 1 assets': agent_1_assets,
-        'distressed bank assets': distressed_bank_assets,
-        'debt owed agent 0': debt_owed_agent_0,
-        'debt owed agent 1': debt_owed_agent_1,
-        }        
-    
-    df = pd.DataFrame(data=data)
-    df.to_csv(
-        f'{save_dir}/experimental_data.csv', 
-        index=False,
-    )  
-
-    # This table displays the allocation between dominant and non-dominant contributions across
-    # trained with varied seeds
-    dominant_contributions      = []
-    non_dominant_contributions  = []
-
-    for agent_0_contribution, agent_1_contribution in zip(average_agent_0_contributions, average_agent_1_contributions):
-        if agent_0_contribution >= agent_1_contribution:
-            dominant_contributions.append(agent_0_contribution)
-            non_dominant_contributions.append(agent_1_contribution)
-        else:
-            dominant_contributions.append(agent_1_contribution)
-            non_dominant_contributions.append(agent_0_contribution)
-    
-    plot_table(
-        title='Dominant vs Non Dominant Contributions',
-        data=[["average dominant contributions", f'{np.mean(dominant_contributions)} %'],
-            ["average non-dominant contributions", f'{np.mean(non_dominant_contributions)} %']],
-        save_dir = root_dir
-    )        
-
-            
+    with open(TOURNAMENT_CONFIGS) as f:
+        tournaments = json.load(f)
+
+    if str(args.tournament_number) not in tournaments:
+        raise KeyError(f"Tournament {args.tournament_number} is not defined in {TOURNAMENT_CONFIGS}; pass --tournament-number")
+    tournament = tournaments[str(args.tournament_number)]
+
+    # The game played defaults to the one of the first experiment; the options of the tournament are kept
+    game_args = args
+    if str(args.experiment_number) not in map(str, tournament['experiments']):
+        game_args = get_args(['--experiment-number', str(tournament['experiments'][0])])
+
+    # Observations revealing the opponent differ between pairings and cannot be shared
+    if any(getattr(game_args, flag, False) for flag in ['reveal_other_agents_identity', 'reveal_other_agents_beta', 'shared_pooled_policy']):
+        raise ValueError("Tournaments require observations which do not depend on the opponent")
+
+    save_dir = f'{TOURNAMENT_DIR}/{args.tournament_number}'
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    start = time.perf_counter()
+
+    graphs = GraphSet(vars(game_args), tournament.get('n_graphs', 500), seed=tournament.get('seed', 0))
+    players = get_players(tournament)
+    print(f'{len(players)} players, {graphs.n_graphs} graphs ({time.perf_counter() - start:.1f} s)')
+
+    # Every policy is restored and run once; its actions are shared by all of its pairings
+    import ray
+    ray.init(local_mode = args.local_mode)
+    actions = compute_actions(players, graphs, ActionCache(f'{TOURNAMENT_DIR}/cache'))
     ray.shutdown()
+    print(f'Actions computed ({time.perf_counter() - start:.1f} s)')
+
+    payoffs, match_rewards, contributions, saved, wins = round_robin(graphs, actions)
+    print(f'{len(players)**2} pairings played, {len(graphs.outcome_keys)} distinct outcomes ({time.perf_counter() - start:.1f} s)')
+
+    strengths = bradley_terry(wins)
+    labels = [player['player'] for player in players]
+    opponents = ~np.eye(len(players), dtype=bool)
+
+    """ Store tournament data """
+    standings = pd.DataFrame.from_records(players)
+    standings['rating']         = elo_ratings(strengths)
+    standings['strength']       = strengths
+    standings['mean payoff']    = [payoffs[i][opponents[i]].mean() for i in range(len(players))]
+    standings['win rate']       = wins.sum(axis=1) / (2 * graphs.n_graphs * max(1, len(players) - 1))
+    standings = standings.sort_values('rating', ascending=False)
+    standings.to_csv(f'{save_dir}/players.csv', index=False)
+
+    # Mean payoff of the row player against the column player, over both seats
+    pd.DataFrame(payoffs.mean(axis=-1), index=labels, columns=labels).to_csv(f'{save_dir}/payoffs.csv')
+
+    player_0, player_1 = np.meshgrid(np.arange(len(players)), np.arange(len(players)), indexing='ij')
+    pd.DataFrame({
+        'agent 0 player':       np.array(labels)[player_0.ravel()],
+        'agent 1 player':       np.array(labels)[player_1.ravel()],
+        'agent 0 reward':       match_rewards[..., 0].ravel(),
+        'agent 1 reward':       match_rewards[..., 1].ravel(),
+        'agent 0 contribution': contributions[..., 0].ravel(),
+        'agent 1 contribution': contributions[..., 1].ravel(),
+        'percentage saved':     saved.ravel() * 100,
+    }).to_csv(f'{save_dir}/matches.csv', index=False)
+
+    np.savez(
+        f'{save_dir}/tournament.npz',
+        players         = np.array(labels),
+        payoffs         = payoffs,
+        match_rewards   = match_rewards,
+        contributions   = contributions,
+        saved           = saved,
+        wins            = wins,
+    )
+
+    print(standings[['player', 'rating', 'mean payoff', 'win rate']].to_string(index=False))
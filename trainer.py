@@ -3,27 +3,51 @@ from ray import tune
 from ray.rllib.utils.test_utils import check_learning_achieved
 from ray.rllib.models import ModelCatalog
 
-from custom_model import basic_model_with_masking, Generalized_model_with_masking
-from env import Volunteers_Dilemma
-from utils import MyCallbacks, get_args, custom_eval_function
+from custom_model import basic_model_with_masking, Generalized_model_with_masking, Negotiation_history_model
+from env import Volunteers_Dilemma, Generalized_Volunteers_Dilemma
+from callbacks import MyCallbacks, custom_eval_function
+from evaluation import unsupported_configuration
+from utils import get_args
+
+
+def get_env_class(args):
+    """
+    Returns the environment of the experiment; sparse networks support N agents and M banks
+    """
+    if getattr(args, 'sparse_network', False):
+        return Generalized_Volunteers_Dilemma
+    return Volunteers_Dilemma
+
+
+def get_trainable(args):
+    """
+    Returns the trainable run by tune; DQN may replay from compact buffers
+    """
+    if getattr(args, 'compact_replay_buffer', False):
+        assert args.run == "DQN", "The compact replay buffer is implemented for DQN"
+        from compact_replay import CompactDQNTrainer
+        return CompactDQNTrainer
+    return args.run
 
 
 def setup(args):
 
-    env = Volunteers_Dilemma(vars(args))
+    env_class = get_env_class(args)
+    env = env_class(vars(args))
     obs_space = env.observation_space
     action_space = env.action_space
     
     ModelCatalog.register_custom_model("basic_model", basic_model_with_masking)
     ModelCatalog.register_custom_model("generalized_model_with_masking", Generalized_model_with_masking)
+    ModelCatalog.register_custom_model("negotiation_history_model", Negotiation_history_model)
 
     config = {
-        "env": Volunteers_Dilemma,  
+        "env": env_class,  
         "env_config": vars(args),
         "multiagent": {
             "policies": {
-                "policy_0": (None, obs_space, action_space, {"framework": "torch"}),
-                "policy_1": (None, obs_space, action_space, {"framework": "torch"}),
+                f"policy_{agent_id}": (None, obs_space, action_space, {"framework": "torch"})
+                for agent_id in range(max(2, args.n_agents))
             },
             "policy_mapping_fn": (lambda agent_id: f"policy_{agent_id}"),
         },
@@ -34,24 +58,35 @@ def setup(args):
         "callbacks": MyCallbacks,  
     }
 
+    # Sampling layout, RLlib's defaults are kept unless requested
+    if getattr(args, 'n_envs_per_worker', None) is not None:
+        config['num_envs_per_worker'] = args.n_envs_per_worker
+
+    if getattr(args, 'rollout_fragment_length', None) is not None:
+        config['rollout_fragment_length'] = args.rollout_fragment_length
+
+    if getattr(args, 'batch_mode', None) is not None:
+        config['batch_mode'] = args.batch_mode
+
     # Conduct evaluation and custom metrics during training
     if args.evaluate_during_training:
-        
-        # Evaluation
-        config["evaluation_num_workers"] = 1
 
-        # Optional custom eval function.
+        # Fail before training rather than at the first evaluation
+        unsupported = unsupported_configuration(vars(args))
+        assert unsupported is None, f"--evaluate-during-training cannot be used: {unsupported}"
+
+        # The evaluation runs in the driver, on the learner's policies; no worker samples episodes
+        config["evaluation_num_workers"] = 0
+
+        # Plays a fixed batch of graphs with one batched forward pass per policy and seat
         config["custom_eval_function"] = custom_eval_function
 
         # Enable evaluation, once per training iteration.
         config["evaluation_interval"] = 1
 
-        # Run 10 episodes each time evaluation runs.
-        config["evaluation_num_episodes"] = 100,
-
         # Override the env config for evaluation.
         config["evaluation_config"] = {
-            "env_config": vars(args),
+            "env_config": dict(vars(args), in_evaluation=True),
             "explore": False
         }
 
@@ -74,7 +109,7 @@ def setup(args):
             }
         else:
             config['model'] = {  
-                "custom_model": "generalized_model_with_masking",
+                "custom_model": "negotiation_history_model" if getattr(args, 'history_encoder', None) else "generalized_model_with_masking",
                 "custom_model_config": {
                     'args':                     args,
                     'num_embeddings':           args.max_system_value,
@@ -101,7 +136,7 @@ if __name__ == "__main__":
 
     config, stop = setup(args)
 
-    results = tune.run( args.run, 
+    results = tune.run( get_trainable(args), 
                         config=config, 
                         stop=stop, 
                         local_dir=args.log_dir, 
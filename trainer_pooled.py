@@ -3,29 +3,41 @@ from ray import tune
 from ray.rllib.utils.test_utils import check_learning_achieved
 from ray.rllib.models import ModelCatalog
 
-from custom_model import basic_model_with_masking, Generalized_model_with_masking
-from env import Volunteers_Dilemma
-from utils import custom_eval_function, MyCallbacks, get_args
+from custom_model import basic_model_with_masking, Generalized_model_with_masking, Negotiation_history_model, Pooled_model_with_film
+from trainer import get_env_class, get_trainable
+from callbacks import MyCallbacks, custom_eval_function
+from evaluation import unsupported_configuration
+from utils import get_args
 
 import numpy as np
 
 POLICIES = ['policy_0','policy_1','policy_2','policy_3','policy_4','policy_5']
 
 
+# Policy shared by every pool member with --shared-pooled-policy
+SHARED_POLICY = 'pooled_policy'
+
+
 def policy_mapping_fn(agent_id):
     return np.random.choice(POLICIES)
 
+def shared_policy_mapping_fn(agent_id):
+    return SHARED_POLICY
+
 def setup(args):
 
-    env = Volunteers_Dilemma(vars(args))
+    env_class = get_env_class(args)
+    env = env_class(vars(args))
     obs_space = env.observation_space
     action_space = env.action_space
     
     ModelCatalog.register_custom_model("basic_model", basic_model_with_masking)
     ModelCatalog.register_custom_model("generalized_model_with_masking", Generalized_model_with_masking)
+    ModelCatalog.register_custom_model("negotiation_history_model", Negotiation_history_model)
+    ModelCatalog.register_custom_model("pooled_model_with_film", Pooled_model_with_film)
 
     config = {
-        "env": Volunteers_Dilemma,  
+        "env": env_class,  
         "env_config": vars(args),
         "num_workers": args.n_workers,  
         "framework": "torch",
@@ -34,36 +46,55 @@ def setup(args):
         "callbacks": MyCallbacks,  
     }
 
-    policies = {}
-    for policy in args.policies:
-        policies[policy] = (None, obs_space, action_space, {"framework":"torch", "beta":args.policies[policy]})
+    # Sampling layout, RLlib's defaults are kept unless requested
+    if getattr(args, 'n_envs_per_worker', None) is not None:
+        config['num_envs_per_worker'] = args.n_envs_per_worker
 
-    policies_to_train = [policy for policy in args.policies]
+    if getattr(args, 'rollout_fragment_length', None) is not None:
+        config['rollout_fragment_length'] = args.rollout_fragment_length
+
+    if getattr(args, 'batch_mode', None) is not None:
+        config['batch_mode'] = args.batch_mode
+
+    if getattr(args, 'shared_pooled_policy', False):
+        # A single policy plays every pool member; the env draws the members and their betas
+        policies = {
+            SHARED_POLICY: (None, obs_space, action_space, {"framework":"torch"})
+        }
+        mapping_fn = shared_policy_mapping_fn
+    else:
+        policies = {}
+        for policy in args.policies:
+            policies[policy] = (None, obs_space, action_space, {"framework":"torch", "beta":args.policies[policy]})
+        mapping_fn = policy_mapping_fn
+
+    policies_to_train = [policy for policy in policies]
     
     config["multiagent"] =  {
             "policies": policies,
-            "policy_mapping_fn": policy_mapping_fn,
+            "policy_mapping_fn": mapping_fn,
             "policies_to_train": policies_to_train
     }
 
     # Conduct evaluation and custom metrics during training
     if args.evaluate_during_training:
-        
-        # Evaluation
-        config["evaluation_num_workers"] = 1
 
-        # Optional custom eval function.
+        # Fail before training rather than at the first evaluation
+        unsupported = unsupported_configuration(vars(args))
+        assert unsupported is None, f"--evaluate-during-training cannot be used: {unsupported}"
+
+        # The evaluation runs in the driver, on the learner's policies; no worker samples episodes
+        config["evaluation_num_workers"] = 0
+
+        # Plays a fixed batch of graphs with one batched forward pass per policy and seat
         config["custom_eval_function"] = custom_eval_function
 
         # Enable evaluation, once per training iteration.
         config["evaluation_interval"] = 1
 
-        # Run 10 episodes each time evaluation runs.
-        config["evaluation_num_episodes"] = 100,
-
         # Override the env config for evaluation.
         config["evaluation_config"] = {
-            "env_config": vars(args),
+            "env_config": dict(vars(args), in_evaluation=True),
             "explore": False
         }
 
@@ -91,6 +122,15 @@ def setup(args):
                     'num_embeddings':           args.max_system_value,
                 },
             }
+            # The FiLM model does not encode the offer history
+            assert not (getattr(args, 'shared_pooled_policy', False) and getattr(args, 'history_encoder', None)), \
+                "--shared-pooled-policy and --history-encoder cannot be combined"
+
+            if getattr(args, 'shared_pooled_policy', False):
+                config['model']['custom_model'] = "pooled_model_with_film"
+            elif getattr(args, 'history_encoder', None):
+                config['model']['custom_model'] = "negotiation_history_model"
+
             if hasattr(args, 'reveal_other_agents_identity'):
                 config['model']['custom_model_config']['full_information'] = args.full_information
 
@@ -120,7 +160,7 @@ if __name__ == "__main__":
 
     config, stop = setup(args)
 
-    results = tune.run( args.run, 
+    results = tune.run( get_trainable(args), 
                         config=config, 
                         stop=stop, 
                         local_dir=args.log_dir, 